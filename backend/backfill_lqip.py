@@ -0,0 +1,80 @@
+"""
+Backfill LQIP placeholders for photos and gallery entries uploaded before
+placeholders were generated at ingest.
+- Processes documents without an "lqip" field in batches
+- Renders placeholders in the image process pool (reusing blob-cached ones)
+- Writes each batch with a single bulk_write
+
+Usage: python backfill_lqip.py [--batch-size 200] [--collection photos|gallery]
+"""
+import argparse
+import asyncio
+import logging
+import os
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+
+from storage import UPLOAD_DIR, upload_path_from_url
+from image_pipeline import get_lqip
+from workers import run_io, shutdown_workers
+
+logger = logging.getLogger(__name__)
+
+MONGO_URL = os.environ.get("MONGO_URL", "mongodb://localhost:27017")
+DB_NAME = os.environ.get("DB_NAME", "spotters_cxj")
+DEFAULT_BATCH_SIZE = 200
+COLLECTIONS = ["photos", "gallery"]
+
+async def placeholder_for(db, doc: dict):
+    """LQIP for one document, or None when its file is missing/unreadable"""
+    path = upload_path_from_url(doc.get("url"))
+    if not path or not await run_io(os.path.exists, path):
+        return None
+    blob = await db.blobs.find_one(
+        {"filename": os.path.relpath(path, UPLOAD_DIR)}, {"_id": 0, "lqip": 1}
+    )
+    try:
+        return await get_lqip(db, path, blob)
+    except Exception as e:
+        logger.warning(f"Failed to build placeholder for {doc.get('photo_id', doc['_id'])}: {e}")
+        return None
+
+async def backfill_collection(db, collection: str, batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+    """Fill missing placeholders in one collection; returns documents processed"""
+    processed = 0
+    while True:
+        docs = await db[collection].find(
+            {"lqip": {"$exists": False}},
+            {"_id": 1, "photo_id": 1, "url": 1}
+        ).to_list(batch_size)
+        if not docs:
+            break
+
+        placeholders = await asyncio.gather(*(placeholder_for(db, doc) for doc in docs))
+        # None marks unreadable files as processed so the job always terminates
+        await db[collection].bulk_write([
+            UpdateOne({"_id": doc["_id"]}, {"$set": {"lqip": lqip}})
+            for doc, lqip in zip(docs, placeholders)
+        ], ordered=False)
+
+        processed += len(docs)
+        logger.info(f"{collection}: processed {processed} documents")
+    return processed
+
+async def main():
+    parser = argparse.ArgumentParser(description="Backfill LQIP placeholders")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--collection", choices=COLLECTIONS, help="Only this collection")
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(MONGO_URL)
+    try:
+        for collection in [args.collection] if args.collection else COLLECTIONS:
+            await backfill_collection(client[DB_NAME], collection, args.batch_size)
+    finally:
+        client.close()
+        shutdown_workers()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
@@ -0,0 +1,86 @@
+"""
+Backup ZIP shared by the backup routes and the automatic backup scheduler
+- Each collection is streamed into its own ZIP entry as its cursor is read
+  (one batch in memory at a time)
+- Serializing batches and zipping the stored files (originals and their
+  variants) runs in the I/O thread pool, so a backup never blocks other requests
+"""
+import json
+import os
+import zipfile
+from datetime import datetime
+from storage import iter_stored_files
+from workers import run_io
+
+BACKUP_TMP_DIR = "/tmp"
+EXPORT_LIMIT = 10000  # Documents per collection
+EXPORT_BATCH_SIZE = 500
+
+def _write_documents(entry, documents: list, first: bool):
+    """Append documents to an open JSON array entry. Blocking: call via run_io"""
+    chunk = ",\n".join(
+        "  " + json.dumps(document, default=str, ensure_ascii=False, indent=2).replace("\n", "\n  ")
+        for document in documents
+    )
+    entry.write((("\n" if first else ",\n") + chunk).encode("utf-8"))
+
+def _write_stored_files(zipf: zipfile.ZipFile):
+    """Add every stored file under uploads/. Blocking: call via run_io"""
+    for file_path, arcname in iter_stored_files():
+        zipf.write(file_path, f"uploads/{arcname}")
+
+def _close_quietly(closeable):
+    try:
+        closeable.close()
+    except Exception:
+        pass
+
+def _remove_quietly(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+async def _write_collection(db, zipf: zipfile.ZipFile, col_name: str):
+    """Stream one collection into database/<name>.json"""
+    entry = await run_io(zipf.open, f"database/{col_name}.json", "w")
+    try:
+        await run_io(entry.write, b"[")
+        written, batch = 0, []
+        async for document in db[col_name].find({}, {"_id": 0}).limit(EXPORT_LIMIT):
+            batch.append(document)
+            if len(batch) == EXPORT_BATCH_SIZE:
+                await run_io(_write_documents, entry, batch, written == 0)
+                written += len(batch)
+                batch = []
+        if batch:
+            await run_io(_write_documents, entry, batch, written == 0)
+            written += len(batch)
+        await run_io(entry.write, b"\n]" if written else b"]")
+    finally:
+        await run_io(entry.close)
+
+async def create_backup_zip(db, prefix: str = "spotters_backup") -> tuple:
+    """Create a complete backup ZIP in BACKUP_TMP_DIR; returns (path, filename)"""
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    backup_name = f"{prefix}_{timestamp}.zip"
+    backup_path = os.path.join(BACKUP_TMP_DIR, backup_name)
+
+    zipf = None
+    try:
+        zipf = await run_io(zipfile.ZipFile, backup_path, 'w', zipfile.ZIP_DEFLATED)
+        for col_name in await db.list_collection_names():
+            await _write_collection(db, zipf, col_name)
+        await run_io(_write_stored_files, zipf)
+        await run_io(zipf.close)
+    except BaseException:
+        if zipf is not None:
+            await run_io(_close_quietly, zipf)
+        await discard_backup(backup_path)
+        raise
+    return backup_path, backup_name
+
+async def discard_backup(backup_path: str):
+    """Remove a temporary backup ZIP"""
+    if backup_path:
+        await run_io(_remove_quietly, backup_path)
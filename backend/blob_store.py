@@ -0,0 +1,188 @@
+"""
+Content-addressed blob store for uploaded files
+- One file per SHA-256, shared by every document that uses the same bytes
+- Reference counts from photos.url, gallery.url, news.image, leaders.photo_url
+  and memories.image_url
+- Files (and their variants) are unlinked only when the refcount reaches zero
+"""
+import glob
+import logging
+import os
+from datetime import datetime, timezone, timedelta
+from typing import Optional
+from pymongo import ReturnDocument
+from workers import run_io
+
+from storage import content_filename, upload_url, upload_path_from_url, commit_upload, discard_upload
+
+logger = logging.getLogger(__name__)
+
+# (collection, field) pairs that hold /api/uploads URLs
+BLOB_REFERENCES = [
+    ("photos", "url"),
+    ("gallery", "url"),
+    ("news", "image"),
+    ("leaders", "photo_url"),
+    ("memories", "image_url"),
+]
+
+ORPHAN_GRACE_HOURS = 24
+
+def _unlink_with_variants(file_path: str):
+    """Remove a stored file and any derivatives written next to it"""
+    stem = os.path.splitext(file_path)[0]
+    for path in [file_path] + glob.glob(f"{glob.escape(stem)}_w*"):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Failed to delete file {path}: {e}")
+
+async def register_blob(db, sha256: str, size: int, ext: str, refs: int = 0) -> dict:
+    """Upsert the blob document for a content hash and add `refs` references"""
+    now = datetime.now(timezone.utc)
+    filename = content_filename(sha256, ext)
+    return await db.blobs.find_one_and_update(
+        {"sha256": sha256},
+        {
+            "$setOnInsert": {
+                "sha256": sha256,
+                "filename": filename,
+                "url": upload_url(filename),
+                "size": size,
+                "created_at": now
+            },
+            "$inc": {"refcount": refs},
+            "$set": {"updated_at": now}
+        },
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+        projection={"_id": 0}
+    )
+
+async def store_blob(db, staged: dict, ext: str, refs: int = 1) -> dict:
+    """
+    Store a received upload as a blob and add `refs` references to it.
+    Identical bytes reuse the existing blob (and its filename/extension).
+    Returns staged with "filename", "path" and "url" set.
+    """
+    blob = await register_blob(db, staged["sha256"], staged["size"], ext, refs)
+
+    # Always (re)write the bytes: harmless for an existing blob and it
+    # restores a file that a concurrent sweep may have just removed
+    try:
+        await commit_upload(staged, blob["filename"].rsplit(".", 1)[-1])
+    except BaseException:
+        # Take the references back: no blob may count a file that was never written
+        await take_back_blob_refs(db, blob["url"], refs)
+        await discard_upload(staged)
+        raise
+    return staged
+
+async def take_back_blob_refs(db, url: str, refs: int = 1):
+    """
+    Undo references added by store_blob when the upload fails later on. The file
+    is left to collect_orphan_blobs, which only removes it once nothing points to it
+    """
+    await db.blobs.update_one(
+        {"url": url},
+        {"$inc": {"refcount": -refs}, "$set": {"updated_at": datetime.now(timezone.utc)}}
+    )
+
+async def add_blob_ref(db, url: Optional[str]):
+    """Add one reference to the blob behind url (no-op for external/legacy URLs)"""
+    if not url:
+        return
+    await db.blobs.update_one(
+        {"url": url},
+        {"$inc": {"refcount": 1}, "$set": {"updated_at": datetime.now(timezone.utc)}}
+    )
+
+async def _count_references(db, url: str) -> int:
+    total = 0
+    for collection, field in BLOB_REFERENCES:
+        total += await db[collection].count_documents({field: url}, limit=1)
+    return total
+
+async def release_blob_ref(db, url: Optional[str]) -> bool:
+    """
+    Drop one reference to the file behind url, unlinking it when no longer used.
+    Call after the referencing document has been deleted/updated.
+    Returns True when the file was removed.
+    """
+    file_path = upload_path_from_url(url)
+    if not file_path:
+        return False
+
+    blob = await db.blobs.find_one_and_update(
+        {"url": url},
+        {"$inc": {"refcount": -1}, "$set": {"updated_at": datetime.now(timezone.utc)}},
+        return_document=ReturnDocument.AFTER,
+        projection={"_id": 0}
+    )
+
+    if blob is None:
+        # Legacy file stored before the blob store: only remove it if nothing points to it
+        if await _count_references(db, url):
+            return False
+    else:
+        if blob["refcount"] > 0:
+            return False
+        result = await db.blobs.delete_one({"url": url, "refcount": {"$lte": 0}})
+        if result.deleted_count == 0:
+            return False  # Re-referenced concurrently
+
+    await run_io(_unlink_with_variants, file_path)
+    return True
+
+async def replace_blob_ref(db, old_url: Optional[str], new_url: Optional[str]):
+    """Move one reference from old_url to new_url (e.g. when an image field changes)"""
+    if old_url == new_url:
+        return
+    await add_blob_ref(db, new_url)
+    await release_blob_ref(db, old_url)
+
+async def collect_orphan_blobs(db, grace_hours: int = ORPHAN_GRACE_HOURS) -> int:
+    """Remove blobs that were uploaded but never (or no longer) referenced"""
+    cutoff = datetime.now(timezone.utc) - timedelta(hours=grace_hours)
+    orphans = await db.blobs.find(
+        {"refcount": {"$lte": 0}, "updated_at": {"$lt": cutoff}},
+        {"_id": 0, "url": 1}
+    ).to_list(1000)
+
+    removed = 0
+    for blob in orphans:
+        # Never remove a file that some document still points to (refcount drift)
+        if await _count_references(db, blob["url"]):
+            continue
+        result = await db.blobs.delete_one({"url": blob["url"], "refcount": {"$lte": 0}})
+        if result.deleted_count:
+            await run_io(_unlink_with_variants, upload_path_from_url(blob["url"]))
+            removed += 1
+
+    if removed:
+        logger.info(f"Removed {removed} orphan blobs")
+    return removed
+
+async def rebuild_blob_refcounts(db) -> int:
+    """Recompute every blob refcount from the referencing collections (drift correction)"""
+    counts = {}
+    for collection, field in BLOB_REFERENCES:
+        pipeline = [
+            {"$match": {field: {"$regex": "^/api/uploads/"}}},
+            {"$group": {"_id": f"${field}", "count": {"$sum": 1}}}
+        ]
+        async for doc in db[collection].aggregate(pipeline):
+            counts[doc["_id"]] = counts.get(doc["_id"], 0) + doc["count"]
+
+    updated = 0
+    async for blob in db.blobs.find({}, {"_id": 0, "url": 1, "refcount": 1}):
+        refcount = counts.get(blob["url"], 0)
+        if blob.get("refcount") != refcount:
+            await db.blobs.update_one(
+                {"url": blob["url"]},
+                {"$set": {"refcount": refcount, "updated_at": datetime.now(timezone.utc)}}
+            )
+            updated += 1
+    return updated
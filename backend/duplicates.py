@@ -0,0 +1,240 @@
+"""
+Near-duplicate photo detection
+- 64-bit difference hash (dHash) computed in the image process pool
+- In-memory BK-tree over approved/pending photos for Hamming-distance queries
+- The tree is per process: it is rebuilt from MongoDB every DUPLICATE_INDEX_TTL
+  seconds, and photos created since the last rebuild (possibly by another
+  worker) are compared directly, so no upload is missed between rebuilds
+- Candidates are confirmed against the database, so deletes and status changes
+  made by other workers never produce stale matches
+"""
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timezone, timedelta
+from typing import Optional
+
+from workers import run_image
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+DUPLICATE_MAX_DISTANCE = int(os.environ.get("DUPLICATE_MAX_DISTANCE", "10"))  # Bits out of 64
+INDEXED_STATUSES = ["approved", "pending"]
+DUPLICATE_INDEX_TTL = int(os.environ.get("DUPLICATE_INDEX_TTL", "300"))  # Seconds between rebuilds
+RECENT_OVERLAP = timedelta(seconds=60)  # Uploads in flight while a rebuild reads
+BACKFILL_BATCH_SIZE = 200
+
+def compute_dhash(path: str) -> str:
+    """64-bit dHash of an image as 16 hex chars. Runs inside a worker process."""
+    from PIL import Image, ImageOps
+
+    with Image.open(path) as img:
+        img.draft("L", (64, 64))
+        img = ImageOps.exif_transpose(img)
+        small = img.convert("L").resize((9, 8), Image.LANCZOS)
+        pixels = list(small.getdata())
+
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            left = pixels[row * 9 + col]
+            right = pixels[row * 9 + col + 1]
+            value = (value << 1) | (left > right)
+    return f"{value:016x}"
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+class BKTree:
+    """BK-tree keyed by 64-bit hashes; each node holds every photo with that exact hash"""
+
+    def __init__(self):
+        self._root = None  # [hash, {photo_id, ...}, {distance: child}]
+
+    def add(self, value: int, photo_id: str):
+        if self._root is None:
+            self._root = [value, {photo_id}, {}]
+            return
+        node = self._root
+        while True:
+            distance = hamming(value, node[0])
+            if distance == 0:
+                node[1].add(photo_id)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [value, {photo_id}, {}]
+                return
+            node = child
+
+    def discard(self, value: int, photo_id: str):
+        node = self._root
+        while node is not None:
+            distance = hamming(value, node[0])
+            if distance == 0:
+                node[1].discard(photo_id)
+                return
+            node = node[2].get(distance)
+
+    def search(self, value: int, max_distance: int) -> list:
+        """Return [(distance, photo_id)] within max_distance"""
+        results = []
+        stack = [self._root] if self._root is not None else []
+        while stack:
+            node = stack.pop()
+            distance = hamming(value, node[0])
+            if distance <= max_distance:
+                results.extend((distance, photo_id) for photo_id in node[1])
+            for edge, child in node[2].items():
+                if distance - max_distance <= edge <= distance + max_distance:
+                    stack.append(child)
+        return results
+
+class DuplicateIndex:
+    """Per-process index of photo hashes, rebuilt from MongoDB every DUPLICATE_INDEX_TTL seconds"""
+
+    def __init__(self):
+        self._tree = BKTree()
+        self._hashes = {}
+        self._loaded_at = None  # time.monotonic() of the last rebuild
+        self.synced_at = None  # Photos created after this may be missing from the tree
+        self._lock = asyncio.Lock()
+
+    def _fresh(self) -> bool:
+        return self._loaded_at is not None and time.monotonic() - self._loaded_at < DUPLICATE_INDEX_TTL
+
+    async def ensure_loaded(self, db):
+        if self._fresh():
+            return
+        async with self._lock:
+            if self._fresh():
+                return
+            started = datetime.now(timezone.utc)
+            tree, hashes = BKTree(), {}
+            cursor = db.photos.find(
+                {"status": {"$in": INDEXED_STATUSES}, "dhash": {"$ne": None}},
+                {"_id": 0, "photo_id": 1, "dhash": 1}
+            )
+            async for photo in cursor:
+                value = int(photo["dhash"], 16)
+                hashes[photo["photo_id"]] = value
+                tree.add(value, photo["photo_id"])
+            # Swap in one step: deleted/rejected photos drop out here
+            self._tree, self._hashes = tree, hashes
+            self.synced_at = started - RECENT_OVERLAP
+            self._loaded_at = time.monotonic()
+            logger.info(f"Duplicate index loaded with {len(hashes)} photos")
+
+    def add(self, photo_id: str, dhash: Optional[str]):
+        if not dhash:
+            return
+        self.remove(photo_id)
+        value = int(dhash, 16)
+        self._hashes[photo_id] = value
+        self._tree.add(value, photo_id)
+
+    def remove(self, photo_id: str):
+        value = self._hashes.pop(photo_id, None)
+        if value is not None:
+            self._tree.discard(value, photo_id)
+
+    def similar(self, dhash: str, max_distance: int = DUPLICATE_MAX_DISTANCE, exclude: str = None) -> list:
+        """[(distance, photo_id)] closest first"""
+        matches = self._tree.search(int(dhash, 16), max_distance)
+        return sorted(m for m in matches if m[1] != exclude)
+
+    def items(self):
+        return list(self._hashes.items())
+
+duplicate_index = DuplicateIndex()
+
+async def get_dhash(db, stored: dict) -> Optional[str]:
+    """dHash for a stored upload, reusing the value cached on its blob"""
+    blob = await db.blobs.find_one({"sha256": stored["sha256"]}, {"_id": 0, "dhash": 1})
+    if blob and blob.get("dhash"):
+        return blob["dhash"]
+    try:
+        dhash = await run_image(compute_dhash, stored["path"])
+    except Exception as e:
+        logger.warning(f"Could not hash {stored['path']}: {e}")
+        return None
+    await db.blobs.update_one({"sha256": stored["sha256"]}, {"$set": {"dhash": dhash}})
+    return dhash
+
+async def find_near_duplicates(db, dhash: Optional[str], exclude: str = None) -> list:
+    """Approved/pending photos visually similar to dhash, closest first"""
+    if not dhash:
+        return []
+    await duplicate_index.ensure_loaded(db)
+    distances = {photo_id: distance for distance, photo_id in duplicate_index.similar(dhash, exclude=exclude)}
+
+    # Uploads since the last rebuild, including those handled by other workers
+    value = int(dhash, 16)
+    recent = await db.photos.find(
+        {"created_at": {"$gte": duplicate_index.synced_at}, "status": {"$in": INDEXED_STATUSES}, "dhash": {"$ne": None}},
+        {"_id": 0, "photo_id": 1, "dhash": 1}
+    ).to_list(None)
+    for photo in recent:
+        distance = hamming(value, int(photo["dhash"], 16))
+        if distance <= DUPLICATE_MAX_DISTANCE and photo["photo_id"] != exclude:
+            distances[photo["photo_id"]] = distance
+    if not distances:
+        return []
+
+    photos = await db.photos.find(
+        {"photo_id": {"$in": list(distances)}, "status": {"$in": INDEXED_STATUSES}},
+        {"_id": 0, "photo_id": 1, "title": 1, "status": 1, "registration": 1, "author_name": 1}
+    ).to_list(len(distances))
+    for photo in photos:
+        photo["distance"] = distances[photo["photo_id"]]
+    return sorted(photos, key=lambda p: p["distance"])
+
+async def find_duplicate_clusters(db, max_distance: int = DUPLICATE_MAX_DISTANCE) -> list:
+    """Group indexed photos into clusters of near-duplicates (lists of photo_ids)"""
+    await duplicate_index.ensure_loaded(db)
+    parent = {}
+
+    def find(photo_id):
+        while parent.get(photo_id, photo_id) != photo_id:
+            photo_id = parent[photo_id]
+        return photo_id
+
+    for photo_id, value in duplicate_index.items():
+        for _, other_id in duplicate_index.similar(f"{value:016x}", max_distance, exclude=photo_id):
+            root_a, root_b = find(photo_id), find(other_id)
+            if root_a != root_b:
+                parent[root_b] = root_a
+
+    clusters = {}
+    for photo_id in parent:
+        clusters.setdefault(find(photo_id), set()).add(photo_id)
+    for root in list(clusters):
+        clusters[root].add(root)
+    return [sorted(members) for members in clusters.values()]
+
+async def backfill_dhashes(db, batch_size: int = BACKFILL_BATCH_SIZE) -> int:
+    """Hash photos uploaded before duplicate detection existed"""
+    from storage import upload_path_from_url
+
+    photos = await db.photos.find(
+        {"dhash": {"$exists": False}},
+        {"_id": 0, "photo_id": 1, "url": 1, "status": 1}
+    ).to_list(batch_size)
+
+    done = 0
+    for photo in photos:
+        path = upload_path_from_url(photo.get("url"))
+        dhash = None
+        if path:
+            try:
+                dhash = await run_image(compute_dhash, path)
+            except Exception as e:
+                logger.warning(f"Could not hash photo {photo['photo_id']}: {e}")
+        # None marks the photo as processed so it is not retried every run
+        await db.photos.update_one({"photo_id": photo["photo_id"]}, {"$set": {"dhash": dhash}})
+        if dhash and photo.get("status") in INDEXED_STATUSES:
+            duplicate_index.add(photo["photo_id"], dhash)
+        done += 1
+    return done
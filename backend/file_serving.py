@@ -0,0 +1,149 @@
+"""
+HTTP serving for uploaded files
+- Strong ETag and Last-Modified validators
+- Conditional requests (If-None-Match / If-Modified-Since) answered with 304
+- Single byte-range requests answered with 206
+- Long-lived immutable caching headers
+- Optional offload to the front proxy (X-Accel-Redirect / X-Sendfile)
+
+Offload modes (UPLOAD_SERVE_MODE):
+- "app" (default): the file is streamed by the Python worker
+- "nginx": X-Accel-Redirect to UPLOAD_ACCEL_PREFIX, e.g.
+      location /protected-uploads/ { internal; alias /app/backend/uploads/; }
+- "sendfile": X-Sendfile with the absolute path (Apache mod_xsendfile, lighttpd)
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+from email.utils import formatdate, parsedate_to_datetime
+from fastapi import Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from workers import run_io
+
+UPLOAD_CACHE_CONTROL = "public, max-age=31536000, immutable"
+RANGE_CHUNK_SIZE = 64 * 1024
+
+UPLOAD_SERVE_MODE = os.environ.get("UPLOAD_SERVE_MODE", "app").lower()
+UPLOAD_ACCEL_PREFIX = os.environ.get("UPLOAD_ACCEL_PREFIX", "/protected-uploads/")
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+def make_etag(stat_result: os.stat_result) -> str:
+    """Strong ETag derived from inode, size and modification time"""
+    return f'"{stat_result.st_ino:x}-{stat_result.st_size:x}-{stat_result.st_mtime_ns:x}"'
+
+def _etag_matches(header: str, etag: str) -> bool:
+    candidates = [tag.strip() for tag in header.split(",")]
+    return "*" in candidates or etag in candidates
+
+def _not_modified_since(header: str, stat_result: os.stat_result) -> bool:
+    try:
+        since = parsedate_to_datetime(header).timestamp()
+    except (TypeError, ValueError):
+        return False
+    return int(stat_result.st_mtime) <= since
+
+def _parse_range(header: str, size: int):
+    """
+    Parse a single "bytes=start-end" range.
+    Returns (start, end) inclusive, None when the header should be ignored,
+    or "unsatisfiable" when no byte of the file is covered.
+    """
+    match = _RANGE_RE.match(header.strip())
+    if not match:
+        return None  # Malformed or multi-range: serve the full file
+
+    start_str, end_str = match.groups()
+    if not start_str and not end_str:
+        return None
+
+    if not start_str:
+        # Suffix range: last N bytes
+        length = int(end_str)
+        if length == 0:
+            return "unsatisfiable"
+        return max(0, size - length), size - 1
+
+    start = int(start_str)
+    end = int(end_str) if end_str else size - 1
+    if start >= size or start > end:
+        return "unsatisfiable"
+    return start, min(end, size - 1)
+
+def _iter_file_range(path: str, start: int, end: int):
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(RANGE_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+def offloaded_file_response(filename: str, path: str) -> Response:
+    """
+    Let the front proxy stream the file with sendfile.
+    The proxy handles ETag/Range; caching policy is still set here.
+    """
+    headers = {"Cache-Control": UPLOAD_CACHE_CONTROL}
+    if UPLOAD_SERVE_MODE == "nginx":
+        headers["X-Accel-Redirect"] = UPLOAD_ACCEL_PREFIX.rstrip("/") + "/" + quote(filename)
+    else:
+        headers["X-Sendfile"] = path
+    # Empty body; the proxy replaces it and sets Content-Length/Content-Type
+    return Response(headers=headers, media_type=mimetypes.guess_type(path)[0])
+
+async def serve_file(request: Request, filename: str, path: str) -> Response:
+    """Serve a stored file in the configured mode"""
+    if UPLOAD_SERVE_MODE in ("nginx", "sendfile"):
+        return offloaded_file_response(filename, path)
+    return await cached_file_response(request, path)
+
+async def cached_file_response(request: Request, path: str, stat_result: os.stat_result = None) -> Response:
+    """Build a cacheable response for a file on disk, honouring validators and Range"""
+    if stat_result is None:
+        stat_result = await run_io(os.stat, path)
+
+    etag = make_etag(stat_result)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(stat_result.st_mtime, usegmt=True),
+        "Cache-Control": UPLOAD_CACHE_CONTROL,
+        "Accept-Ranges": "bytes",
+    }
+
+    # Conditional GET: If-None-Match takes precedence over If-Modified-Since
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if _etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers=headers)
+    else:
+        if_modified_since = request.headers.get("if-modified-since")
+        if if_modified_since and _not_modified_since(if_modified_since, stat_result):
+            return Response(status_code=304, headers=headers)
+
+    size = stat_result.st_size
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (not if_range or if_range.strip() == etag):
+        byte_range = _parse_range(range_header, size)
+        if byte_range == "unsatisfiable":
+            headers["Content-Range"] = f"bytes */{size}"
+            return Response(status_code=416, headers=headers)
+        if byte_range is not None:
+            start, end = byte_range
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+            headers["Content-Length"] = str(end - start + 1)
+            media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+            if request.method == "HEAD":
+                return Response(status_code=206, headers=headers, media_type=media_type)
+            return StreamingResponse(
+                _iter_file_range(path, start, end),
+                status_code=206,
+                headers=headers,
+                media_type=media_type
+            )
+
+    return FileResponse(path, headers=headers, stat_result=stat_result, method=request.method)
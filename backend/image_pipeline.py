@@ -0,0 +1,346 @@
+"""
+Image derivative pipeline for Spotters CXJ
+- Generates fixed-width variants (WebP + JPEG fallback) in the image process pool
+- Applies EXIF orientation and strips metadata from derivatives
+- Records variant URLs on the photo document
+- Extracts EXIF metadata (capture time, dimensions, camera/lens, GPS)
+- Builds a tiny base64 placeholder (LQIP) that list responses can inline
+"""
+import asyncio
+import base64
+import io
+import logging
+import os
+from datetime import datetime, timezone, timedelta
+from typing import Optional
+
+from storage import UPLOAD_DIR, upload_url
+from workers import run_image
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+VARIANT_WIDTHS = [320, 800, 1600]
+VARIANT_FORMATS = {"webp": "WEBP", "jpg": "JPEG"}
+VARIANT_QUALITY = {"webp": 80, "jpg": 85}
+
+# Named sizes accepted by list endpoints
+VARIANT_SIZES = {"small": 320, "medium": 800, "large": 1600}
+
+# Low-quality image placeholder, inlined as a data URI (~200-400 bytes)
+LQIP_WIDTH = 16
+LQIP_QUALITY = 40
+
+# EXIF tags
+EXIF_IFD = 0x8769
+GPS_IFD = 0x8825
+TAG_ORIENTATION = 0x0112
+TAG_MAKE = 0x010F
+TAG_MODEL = 0x0110
+TAG_DATETIME = 0x0132
+TAG_DATETIME_ORIGINAL = 0x9003
+TAG_OFFSET_TIME_ORIGINAL = 0x9011
+TAG_LENS_MODEL = 0xA434
+TAG_FOCAL_LENGTH = 0x920A
+TAG_FNUMBER = 0x829D
+TAG_EXPOSURE_TIME = 0x829A
+TAG_ISO = 0x8827
+
+_pending_tasks = set()
+
+def verify_image(path: str):
+    """Raise if the file at path is not a readable image. Runs inside a worker process."""
+    from PIL import Image
+
+    with Image.open(path) as img:
+        img.verify()
+
+def generate_variants(src_path: str, out_dir: str, stem: str) -> dict:
+    """
+    Build all variants for one image. Runs inside a worker process.
+    `stem` may contain sub-directories (relative to out_dir).
+    Returns {"<width>": {"webp": filename, "jpg": filename, "width": w, "height": h}}
+    """
+    from PIL import Image, ImageOps
+
+    variants = {}
+    with Image.open(src_path) as img:
+        # Let the JPEG decoder downscale while decoding when possible
+        img.draft("RGB", (max(VARIANT_WIDTHS), max(VARIANT_WIDTHS)))
+        img = ImageOps.exif_transpose(img)
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+
+        current = img
+        for width in sorted(VARIANT_WIDTHS, reverse=True):
+            if current.width > width:
+                height = max(1, round(current.height * width / current.width))
+                current = current.resize((width, height), Image.LANCZOS)
+
+            entry = {"width": current.width, "height": current.height}
+            for ext, pil_format in VARIANT_FORMATS.items():
+                filename = f"{stem}_w{width}.{ext}"
+                final_path = os.path.join(out_dir, filename)
+                tmp_path = f"{final_path}.{os.getpid()}.part"
+                # No exif/icc arguments: derivatives are saved without metadata
+                current.save(
+                    tmp_path, pil_format,
+                    quality=VARIANT_QUALITY[ext],
+                    optimize=True,
+                    **({"progressive": True} if pil_format == "JPEG" else {"method": 4})
+                )
+                os.replace(tmp_path, final_path)
+                entry[ext] = filename
+            variants[str(width)] = entry
+
+    return variants
+
+def resize_image(src_path: str, dst_path: str, width: int, ext: str) -> dict:
+    """
+    Resize one image to `width` (never upscaling) and save it without metadata.
+    Runs inside a worker process. Returns {"width": w, "height": h}.
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(src_path) as img:
+        img.draft("RGB", (width, width))
+        img = ImageOps.exif_transpose(img)
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        if img.width > width:
+            height = max(1, round(img.height * width / img.width))
+            img = img.resize((width, height), Image.LANCZOS)
+
+        pil_format = VARIANT_FORMATS[ext]
+        tmp_path = f"{dst_path}.{os.getpid()}.part"
+        img.save(
+            tmp_path, pil_format,
+            quality=VARIANT_QUALITY[ext],
+            optimize=True,
+            **({"progressive": True} if pil_format == "JPEG" else {"method": 4})
+        )
+        os.replace(tmp_path, dst_path)
+        return {"width": img.width, "height": img.height}
+
+def generate_lqip(src_path: str) -> str:
+    """16px-wide WebP of the image as a data URI. Runs inside a worker process."""
+    from PIL import Image, ImageOps
+
+    with Image.open(src_path) as img:
+        img.draft("RGB", (LQIP_WIDTH * 4, LQIP_WIDTH * 4))
+        img = ImageOps.exif_transpose(img)
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        height = max(1, round(img.height * LQIP_WIDTH / img.width))
+        small = img.resize((LQIP_WIDTH, height), Image.BILINEAR)
+
+    buffer = io.BytesIO()
+    small.save(buffer, "WEBP", quality=LQIP_QUALITY, method=6)
+    return "data:image/webp;base64," + base64.b64encode(buffer.getvalue()).decode("ascii")
+
+def _exif_text(value) -> Optional[str]:
+    if value is None:
+        return None
+    if isinstance(value, bytes):
+        value = value.decode("utf-8", "ignore")
+    value = str(value).strip("\x00 ").strip()
+    return value or None
+
+def _exif_number(value) -> Optional[float]:
+    if isinstance(value, (tuple, list)):
+        value = value[0] if value else None
+    try:
+        number = float(value)
+    except (TypeError, ValueError, ZeroDivisionError):
+        return None
+    return round(number, 6) if number == number else None  # Drop NaN
+
+def _exif_datetime(value, offset) -> Optional[datetime]:
+    """EXIF "YYYY:MM:DD HH:MM:SS" to UTC; without an offset the wall-clock time is kept as UTC"""
+    value = _exif_text(value)
+    if not value:
+        return None
+    try:
+        captured = datetime.strptime(value[:19], "%Y:%m:%d %H:%M:%S")
+    except ValueError:
+        return None
+    tz = timezone.utc
+    offset = _exif_text(offset)
+    if offset and len(offset) == 6 and offset[0] in "+-":
+        try:
+            delta = timedelta(hours=int(offset[1:3]), minutes=int(offset[4:6]))
+            tz = timezone(delta if offset[0] == "+" else -delta)
+        except ValueError:
+            pass
+    return captured.replace(tzinfo=tz).astimezone(timezone.utc)
+
+def _gps_coordinate(dms, ref) -> Optional[float]:
+    try:
+        degrees, minutes, seconds = (float(v) for v in dms)
+    except (TypeError, ValueError, ZeroDivisionError):
+        return None
+    value = degrees + minutes / 60 + seconds / 3600
+    return -value if _exif_text(ref) in ("S", "W") else value
+
+def extract_metadata(src_path: str) -> dict:
+    """
+    Read dimensions and EXIF from an image without decoding pixels.
+    Runs inside a worker process. Returns {"width", "height", "aspect_ratio",
+    "captured_at", "exif": {...}, "gps": GeoJSON point or None}.
+    """
+    from PIL import Image
+
+    with Image.open(src_path) as img:
+        width, height = img.size
+        exif = img.getexif()
+        exif_ifd = exif.get_ifd(EXIF_IFD)
+        gps_ifd = exif.get_ifd(GPS_IFD)
+
+    # Orientations 5-8 are rotated by 90 degrees when displayed
+    if exif.get(TAG_ORIENTATION) in (5, 6, 7, 8):
+        width, height = height, width
+
+    camera = {
+        "camera_make": _exif_text(exif.get(TAG_MAKE)),
+        "camera_model": _exif_text(exif.get(TAG_MODEL)),
+        "lens_model": _exif_text(exif_ifd.get(TAG_LENS_MODEL)),
+        "focal_length": _exif_number(exif_ifd.get(TAG_FOCAL_LENGTH)),
+        "aperture": _exif_number(exif_ifd.get(TAG_FNUMBER)),
+        "exposure_time": _exif_number(exif_ifd.get(TAG_EXPOSURE_TIME)),
+        "iso": _exif_number(exif_ifd.get(TAG_ISO)),
+    }
+    if camera["iso"] is not None:
+        camera["iso"] = int(camera["iso"])
+
+    gps = None
+    if 2 in gps_ifd and 4 in gps_ifd:
+        lat = _gps_coordinate(gps_ifd[2], gps_ifd.get(1))
+        lng = _gps_coordinate(gps_ifd[4], gps_ifd.get(3))
+        if lat is not None and lng is not None and -90 <= lat <= 90 and -180 <= lng <= 180 and (lat or lng):
+            gps = {"type": "Point", "coordinates": [round(lng, 6), round(lat, 6)]}
+
+    return {
+        "width": width,
+        "height": height,
+        "aspect_ratio": round(width / height, 4) if height else None,
+        "captured_at": _exif_datetime(
+            exif_ifd.get(TAG_DATETIME_ORIGINAL) or exif.get(TAG_DATETIME),
+            exif_ifd.get(TAG_OFFSET_TIME_ORIGINAL)
+        ),
+        "exif": {key: value for key, value in camera.items() if value is not None},
+        "gps": gps
+    }
+
+def variant_urls(variants: dict) -> dict:
+    """Convert variant filenames to /api/uploads URLs"""
+    return {
+        width: {
+            key: (upload_url(value) if key in VARIANT_FORMATS else value)
+            for key, value in entry.items()
+        }
+        for width, entry in variants.items()
+    }
+
+async def process_photo_metadata(db, collection: str, photo_id: str, file_path: str, blob: dict = None):
+    """Extract EXIF metadata for a stored file and record normalized fields on the photo"""
+    filename = os.path.relpath(file_path, UPLOAD_DIR)
+    try:
+        if blob and blob.get("metadata"):
+            metadata = blob["metadata"]
+        else:
+            metadata = await run_image(extract_metadata, file_path)
+            await db.blobs.update_one({"filename": filename}, {"$set": {"metadata": metadata}})
+    except Exception as e:
+        logger.warning(f"Failed to extract metadata for {photo_id}: {e}")
+        await db[collection].update_one({"photo_id": photo_id}, {"$set": {"metadata_status": "error"}})
+        return
+
+    fields = {key: value for key, value in metadata.items() if value is not None}
+    await db[collection].update_one(
+        {"photo_id": photo_id},
+        {"$set": {**fields, "metadata_status": "ready"}}
+    )
+
+    # Fill the typed date from the camera when the user left it empty
+    if metadata.get("captured_at"):
+        date_field = "photo_date" if collection == "photos" else "date"
+        await db[collection].update_one(
+            {"photo_id": photo_id, date_field: {"$in": [None, ""]}},
+            {"$set": {date_field: metadata["captured_at"].strftime("%Y-%m-%d")}}
+        )
+
+async def get_lqip(db, file_path: str, blob: dict = None) -> str:
+    """Placeholder for a stored file, reusing the one cached on its blob"""
+    if blob and blob.get("lqip"):
+        return blob["lqip"]
+    lqip = await run_image(generate_lqip, file_path)
+    await db.blobs.update_one(
+        {"filename": os.path.relpath(file_path, UPLOAD_DIR)},
+        {"$set": {"lqip": lqip}}
+    )
+    return lqip
+
+async def process_photo_placeholder(db, collection: str, photo_id: str, file_path: str, blob: dict = None):
+    """Compute the LQIP placeholder for a stored file and record it on the photo"""
+    try:
+        lqip = await get_lqip(db, file_path, blob)
+    except Exception as e:
+        logger.warning(f"Failed to build placeholder for {photo_id}: {e}")
+        return
+    await db[collection].update_one({"photo_id": photo_id}, {"$set": {"lqip": lqip}})
+
+async def process_photo_derivatives(db, collection: str, photo_id: str, file_path: str):
+    """Extract metadata, build the placeholder and generate variants for a stored file"""
+    # Variants live next to the (content-addressed) original
+    filename = os.path.relpath(file_path, UPLOAD_DIR)
+    stem = os.path.splitext(filename)[0]
+
+    # Deduplicated blobs already have their variants and metadata
+    blob = await db.blobs.find_one({"filename": filename}, {"_id": 0, "variants": 1, "metadata": 1, "lqip": 1})
+    await process_photo_metadata(db, collection, photo_id, file_path, blob)
+    await process_photo_placeholder(db, collection, photo_id, file_path, blob)
+    try:
+        if blob and blob.get("variants"):
+            variants = blob["variants"]
+        else:
+            variants = await run_image(generate_variants, file_path, UPLOAD_DIR, stem)
+            await db.blobs.update_one({"filename": filename}, {"$set": {"variants": variants}})
+    except Exception as e:
+        logger.error(f"Failed to generate variants for {photo_id}: {e}")
+        await db[collection].update_one(
+            {"photo_id": photo_id},
+            {"$set": {"variants_status": "error"}}
+        )
+        return
+
+    urls = variant_urls(variants)
+    smallest = urls[str(min(VARIANT_WIDTHS))]
+    await db[collection].update_one(
+        {"photo_id": photo_id},
+        {"$set": {
+            "variants": urls,
+            "thumbnail_url": smallest["webp"],
+            "variants_status": "ready"
+        }}
+    )
+    logger.info(f"Generated {len(urls)} variants for {photo_id}")
+
+def schedule_derivatives(db, collection: str, photo_id: str, file_path: str):
+    """Run derivative generation in the background without blocking the request"""
+    task = asyncio.create_task(process_photo_derivatives(db, collection, photo_id, file_path))
+    _pending_tasks.add(task)
+    task.add_done_callback(_pending_tasks.discard)
+    return task
+
+def apply_variant(photo: dict, size: Optional[str] = "small", fmt: str = "webp") -> dict:
+    """
+    Point photo["url"] at the requested variant for list responses.
+    The original stays available as photo["original_url"].
+    """
+    width = VARIANT_SIZES.get(size or "")
+    variants = photo.get("variants") or {}
+    entry = variants.get(str(width)) if width else None
+    if entry and entry.get(fmt):
+        photo["original_url"] = photo.get("url")
+        photo["url"] = entry[fmt]
+    return photo
@@ -0,0 +1,110 @@
+"""
+MongoDB indexes for Spotters CXJ
+Created on startup; create_index is a no-op when the index already exists.
+Unique indexes over legacy data are preceded by a one-off dedupe pass (see
+dedupe_for_unique_index), which only runs while the index is missing.
+"""
+import logging
+
+logger = logging.getLogger(__name__)
+
+async def dedupe_for_unique_index(db, collection: str, keys: list, keep_first: list) -> list:
+    """
+    Delete documents that would break a unique index on `keys`, keeping the first
+    document of each group in `keep_first` sort order. Does nothing once the index
+    exists. Returns the key values ({key: value}) of the groups that had duplicates.
+    """
+    index_name = "_".join(f"{key}_1" for key in keys)
+    if index_name in await db[collection].index_information():
+        return []
+
+    groups = await db[collection].aggregate([
+        {"$sort": dict(keep_first)},
+        {"$group": {"_id": {key: f"${key}" for key in keys}, "ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}}
+    ], allowDiskUse=True).to_list(None)
+    if not groups:
+        return []
+
+    extra = [doc_id for group in groups for doc_id in group["ids"][1:]]
+    await db[collection].delete_many({"_id": {"$in": extra}})
+    duplicated = [group["_id"] for group in groups]
+    logger.warning(
+        f"{collection}: removed {len(extra)} duplicate documents before creating the unique index "
+        f"on {keys} ({len(duplicated)} keys, e.g. {duplicated[:10]})"
+    )
+    return duplicated
+
+async def ensure_indexes(db):
+    """Create the indexes the API relies on"""
+    # Blob store: dedup by content hash, refcount lookups by URL, orphan sweep
+    await db.blobs.create_index("sha256", unique=True)
+    await db.blobs.create_index("url", unique=True)
+    await db.blobs.create_index([("refcount", 1), ("updated_at", 1)])
+
+    # Upload preflight tickets expire on their own (TTL)
+    await db.upload_tickets.create_index("ticket_id", unique=True)
+    await db.upload_tickets.create_index("expires_at", expireAfterSeconds=0)
+
+    # Resumable upload sessions
+    await db.upload_sessions.create_index("upload_id", unique=True)
+    await db.upload_sessions.create_index("expires_at")
+
+    # EXIF metadata: gallery sorting by capture date, camera filters, map queries
+    await db.photos.create_index([("status", 1), ("captured_at", -1)])
+    await db.gallery.create_index([("approved", 1), ("captured_at", -1)])
+    await db.photos.create_index("exif.camera_model", sparse=True)
+    await db.photos.create_index([("gps", "2dsphere")])
+
+    # Evaluation queue order, live positions and the per-evaluator anti-join
+    await db.photos.create_index([("status", 1), ("queue_class", 1), ("queue_seq", 1)])
+    # The old find-then-insert could store the same vote twice: keep the earliest
+    duplicated = await dedupe_for_unique_index(
+        db, "evaluations", ["evaluator_id", "photo_id"], [("created_at", 1), ("_id", 1)]
+    )
+    if duplicated:
+        from routes.evaluation import rebuild_evaluation_aggregates
+        await rebuild_evaluation_aggregates(db, list({key["photo_id"] for key in duplicated}))
+    await db.evaluations.create_index([("evaluator_id", 1), ("photo_id", 1)], unique=True)
+
+    # Evaluator history: newest-first pages with photo details joined by photo_id
+    await db.evaluations.create_index([("evaluator_id", 1), ("created_at", -1), ("evaluation_id", -1)])
+    await db.photos.create_index("photo_id")
+
+    # Near-duplicate checks scan photos created since the last index rebuild
+    await db.photos.create_index("created_at")
+
+    # One public rating per user and photo (rating is an upsert). The old
+    # read-then-write could insert a second rating; later changes went to the
+    # first one, so that is the one kept
+    duplicated = await dedupe_for_unique_index(
+        db, "public_ratings", ["photo_id", "user_id"], [("created_at", 1), ("_id", 1)]
+    )
+    if duplicated:
+        from reconcile_ratings import rebuild_rating_aggregates
+        from leaderboard import rebuild_leaderboard
+        from ranking_rollups import rebuild_rollups
+        # Aggregates, leaderboard and rollups were computed over the duplicates
+        photos = await db.photos.find(
+            {"photo_id": {"$in": list({key["photo_id"] for key in duplicated})}},
+            {"_id": 0, "photo_id": 1, "public_rating_sum": 1, "public_rating_count": 1, "public_rating": 1}
+        ).to_list(None)
+        await rebuild_rating_aggregates(db, photos)
+        await rebuild_leaderboard(db)
+        await rebuild_rollups(db)
+    await db.public_ratings.create_index([("photo_id", 1), ("user_id", 1)], unique=True)
+
+    # Materialized user leaderboard
+    await db.user_leaderboard.create_index("user_id", unique=True)
+    await db.user_leaderboard.create_index([("average_rating", -1), ("total_photos", -1)])
+
+    # Daily rollups for time-windowed rankings: upserts by key, window scans by day
+    await db.photo_daily_stats.create_index([("photo_id", 1), ("day", 1)], unique=True)
+    await db.photo_daily_stats.create_index("day")
+    await db.author_daily_stats.create_index([("author_id", 1), ("day", 1)], unique=True)
+    await db.author_daily_stats.create_index("day")
+
+    # Comment threads: newest-first cursor pages per photo
+    await db.comments.create_index([("photo_id", 1), ("created_at", -1), ("comment_id", -1)])
+
+    logger.info("MongoDB indexes ensured")
@@ -0,0 +1,125 @@
+"""
+Materialized user leaderboard (user_leaderboard collection)
+- One document per author: approved photo count, sum of their photos' public
+  ratings and number of rated photos, plus the average used for sorting
+- Maintained with $inc deltas when a photo is approved, leaves "approved"
+  (deleted/resubmitted) or its public rating changes
+- Served from the (average_rating, total_photos) index
+- rebuild_leaderboard recomputes everything from photos (drift correction)
+
+Usage: python leaderboard.py   (rebuild)
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime, timezone
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument, UpdateOne
+
+logger = logging.getLogger(__name__)
+
+MONGO_URL = os.environ.get("MONGO_URL", "mongodb://localhost:27017")
+DB_NAME = os.environ.get("DB_NAME", "spotters_cxj")
+
+def average(rating_sum: float, rated_photos: int) -> float:
+    return round(rating_sum / rated_photos, 2) if rated_photos > 0 else 0.0
+
+async def apply_leaderboard_delta(db, author_id: str, author_name: str = None,
+                                  photos: int = 0, rating: float = 0.0, rated: int = 0):
+    """Add deltas to an author's entry and refresh its average"""
+    if not author_id or not (photos or rating or rated):
+        return
+    update = {
+        "$inc": {"total_photos": photos, "rating_sum": rating, "rated_photos": rated},
+        "$set": {"updated_at": datetime.now(timezone.utc)}
+    }
+    if author_name:
+        update["$set"]["author_name"] = author_name
+    entry = await db.user_leaderboard.find_one_and_update(
+        {"user_id": author_id},
+        update,
+        projection={"_id": 0, "rating_sum": 1, "rated_photos": 1},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    # Average for exactly these totals: a concurrent delta writes its own
+    await db.user_leaderboard.update_one(
+        {"user_id": author_id, "rating_sum": entry["rating_sum"], "rated_photos": entry["rated_photos"]},
+        {"$set": {"average_rating": average(entry["rating_sum"], entry["rated_photos"])}}
+    )
+
+async def leaderboard_photo_approved(db, photo: dict):
+    rating = photo.get("public_rating") or 0
+    await apply_leaderboard_delta(
+        db, photo.get("author_id"), photo.get("author_name"),
+        photos=1, rating=rating, rated=1 if rating > 0 else 0
+    )
+
+async def leaderboard_photo_removed(db, photo: dict):
+    """An approved photo was deleted or sent back to evaluation"""
+    rating = photo.get("public_rating") or 0
+    await apply_leaderboard_delta(
+        db, photo.get("author_id"),
+        photos=-1, rating=-rating, rated=-1 if rating > 0 else 0
+    )
+
+async def leaderboard_rating_changed(db, photo: dict, old_rating: float, new_rating: float):
+    """An approved photo's public_rating went from old_rating to new_rating"""
+    old_rating, new_rating = old_rating or 0, new_rating or 0
+    await apply_leaderboard_delta(
+        db, photo.get("author_id"),
+        rating=new_rating - old_rating,
+        rated=(new_rating > 0) - (old_rating > 0)
+    )
+
+async def rebuild_leaderboard(db) -> int:
+    """Recompute every entry from approved photos; returns the number of authors"""
+    started = datetime.now(timezone.utc)
+    totals = await db.photos.aggregate([
+        {"$match": {"status": "approved"}},
+        {"$group": {
+            "_id": "$author_id",
+            "author_name": {"$first": "$author_name"},
+            "total_photos": {"$sum": 1},
+            "rating_sum": {"$sum": {"$cond": [{"$gt": ["$public_rating", 0]}, "$public_rating", 0]}},
+            "rated_photos": {"$sum": {"$cond": [{"$gt": ["$public_rating", 0]}, 1, 0]}}
+        }}
+    ]).to_list(None)
+
+    operations = [
+        UpdateOne(
+            {"user_id": t["_id"]},
+            {"$set": {
+                "author_name": t["author_name"],
+                "total_photos": t["total_photos"],
+                "rating_sum": t["rating_sum"],
+                "rated_photos": t["rated_photos"],
+                "average_rating": average(t["rating_sum"], t["rated_photos"]),
+                "updated_at": started
+            }},
+            upsert=True
+        )
+        for t in totals if t["_id"]
+    ]
+    if operations:
+        await db.user_leaderboard.bulk_write(operations, ordered=False)
+    # Authors without approved photos any more
+    await db.user_leaderboard.delete_many({"updated_at": {"$lt": started}})
+    logger.info(f"Leaderboard rebuilt for {len(operations)} authors")
+    return len(operations)
+
+async def ensure_leaderboard(db):
+    """Build the leaderboard on first start"""
+    if not await db.user_leaderboard.count_documents({}, limit=1):
+        await rebuild_leaderboard(db)
+
+async def main():
+    client = AsyncIOMotorClient(MONGO_URL)
+    try:
+        await rebuild_leaderboard(client[DB_NAME])
+    finally:
+        client.close()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
@@ -0,0 +1,171 @@
+"""
+Online migration of legacy flat uploads to the sharded blob layout
+- Hashes every file stored directly in UPLOAD_DIR
+- Hard-links it to ab/cd/<sha256>.<ext> and registers the blob
+- Moves its derivatives along and rewrites variants/thumbnail_url on photos
+- Rewrites referencing URL fields in batches, then removes the flat files
+The old path keeps working until its URLs are rewritten, so the API can stay online.
+
+Usage: python migrate_uploads.py [--batch-size 200] [--dry-run] [--keep-old]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import shutil
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateMany
+
+from storage import UPLOAD_DIR, upload_url, is_temp_file, is_variant_file, hash_file
+from blob_store import BLOB_REFERENCES, register_blob, rebuild_blob_refcounts
+from image_pipeline import VARIANT_WIDTHS, VARIANT_FORMATS
+from workers import run_io, shutdown_workers
+
+logger = logging.getLogger(__name__)
+
+MONGO_URL = os.environ.get("MONGO_URL", "mongodb://localhost:27017")
+DB_NAME = os.environ.get("DB_NAME", "spotters_cxj")
+DEFAULT_BATCH_SIZE = 200
+
+# Fields rewritten by the migration (blob references plus profile pictures)
+MIGRATION_URL_FIELDS = BLOB_REFERENCES + [("users", "picture")]
+
+# Collections whose documents carry variants/thumbnail_url (see image_pipeline)
+VARIANT_COLLECTIONS = ["photos", "gallery"]
+
+def list_flat_files() -> list:
+    """Files stored directly in UPLOAD_DIR (the legacy, unsharded layout)"""
+    if not os.path.exists(UPLOAD_DIR):
+        return []
+    return sorted(
+        name for name in os.listdir(UPLOAD_DIR)
+        if os.path.isfile(os.path.join(UPLOAD_DIR, name))
+        and not is_temp_file(name)
+        # Derivatives move with their original, never on their own
+        and not is_variant_file(name)
+    )
+
+def link_into_place(src: str, dst: str):
+    """Make src also available at dst (hard link, falling back to a copy)"""
+    if os.path.exists(dst):
+        return
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+def link_variants(name: str, filename: str) -> list:
+    """
+    Link the flat derivatives of `name` next to its new `filename`.
+    Returns [(width, ext, old name, new name)] for the ones that exist.
+    """
+    old_stem, new_stem = os.path.splitext(name)[0], os.path.splitext(filename)[0]
+    moved = []
+    for width in VARIANT_WIDTHS:
+        for ext in VARIANT_FORMATS:
+            old_name = f"{old_stem}_w{width}.{ext}"
+            src = os.path.join(UPLOAD_DIR, old_name)
+            if os.path.isfile(src):
+                new_name = f"{new_stem}_w{width}.{ext}"
+                link_into_place(src, os.path.join(UPLOAD_DIR, new_name))
+                moved.append((width, ext, old_name, new_name))
+    return moved
+
+def remove_flat_file(name: str):
+    try:
+        os.remove(os.path.join(UPLOAD_DIR, name))
+    except OSError as e:
+        logger.warning(f"Could not remove migrated file {name}: {e}")
+
+async def migrate_batch(db, filenames: list, dry_run: bool = False, keep_old: bool = False) -> dict:
+    """Migrate one batch of flat files; returns {old_url: new_url}"""
+    mapping = {}
+    variants = []
+    for name in filenames:
+        src = os.path.join(UPLOAD_DIR, name)
+        hashed = await run_io(hash_file, src)
+        ext = name.rsplit(".", 1)[-1].lower() if "." in name else "jpg"
+
+        if dry_run:
+            mapping[upload_url(name)] = None
+            continue
+
+        blob = await register_blob(db, hashed["sha256"], hashed["size"], ext, refs=0)
+        await run_io(link_into_place, src, os.path.join(UPLOAD_DIR, blob["filename"]))
+        mapping[upload_url(name)] = blob["url"]
+        variants += await run_io(link_variants, name, blob["filename"])
+
+    if dry_run or not mapping:
+        return mapping
+
+    # Rewrite every referencing document in one unordered bulk per collection
+    for collection, field in MIGRATION_URL_FIELDS:
+        operations = [
+            UpdateMany({field: old_url}, {"$set": {field: new_url}})
+            for old_url, new_url in mapping.items()
+        ]
+        result = await db[collection].bulk_write(operations, ordered=False)
+        if result.modified_count:
+            logger.info(f"{collection}.{field}: rewrote {result.modified_count} URLs")
+
+    # Derivative URLs recorded by the image pipeline (thumbnail_url is the smallest WebP)
+    if variants:
+        smallest = str(min(VARIANT_WIDTHS))
+        for collection in VARIANT_COLLECTIONS:
+            operations = []
+            for width, ext, old_name, new_name in variants:
+                operations.append(UpdateMany(
+                    {f"variants.{width}.{ext}": upload_url(old_name)},
+                    {"$set": {f"variants.{width}.{ext}": upload_url(new_name)}}
+                ))
+                if str(width) == smallest and ext == "webp":
+                    operations.append(UpdateMany(
+                        {"thumbnail_url": upload_url(old_name)},
+                        {"$set": {"thumbnail_url": upload_url(new_name)}}
+                    ))
+            result = await db[collection].bulk_write(operations, ordered=False)
+            if result.modified_count:
+                logger.info(f"{collection}.variants: rewrote {result.modified_count} documents")
+
+    if not keep_old:
+        for name in filenames + [old_name for _, _, old_name, _ in variants]:
+            await run_io(remove_flat_file, name)
+
+    return mapping
+
+async def migrate_uploads(db, batch_size: int = DEFAULT_BATCH_SIZE, dry_run: bool = False, keep_old: bool = False) -> int:
+    """Migrate all flat files in batches and fix blob refcounts afterwards"""
+    filenames = await run_io(list_flat_files)
+    logger.info(f"Found {len(filenames)} legacy files in {UPLOAD_DIR}")
+
+    migrated = 0
+    for start in range(0, len(filenames), batch_size):
+        batch = filenames[start:start + batch_size]
+        await migrate_batch(db, batch, dry_run=dry_run, keep_old=keep_old)
+        migrated += len(batch)
+        logger.info(f"Processed {migrated}/{len(filenames)} files")
+
+    if not dry_run:
+        updated = await rebuild_blob_refcounts(db)
+        logger.info(f"Rebuilt refcounts for {updated} blobs")
+
+    return migrated
+
+async def main():
+    parser = argparse.ArgumentParser(description="Migrate flat uploads to the sharded blob layout")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--dry-run", action="store_true", help="Only hash and count files")
+    parser.add_argument("--keep-old", action="store_true", help="Keep the flat files after rewriting URLs")
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(MONGO_URL)
+    try:
+        await migrate_uploads(client[DB_NAME], args.batch_size, args.dry_run, args.keep_old)
+    finally:
+        client.close()
+        shutdown_workers()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
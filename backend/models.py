@@ -71,6 +71,22 @@ def can_access_level(user_tags: List[str], required_level: str) -> bool:
     required = HIERARCHY_LEVELS.get(required_level, 0)
     return user_level >= required
 
+# Photo fields only shown to the author and gestao+: GPS position, camera EXIF,
+# content and perceptual hashes
+PRIVATE_PHOTO_FIELDS = ["gps", "exif", "sha256", "dhash"]
+PUBLIC_PHOTO_PROJECTION = {"_id": 0, **{field: 0 for field in PRIVATE_PHOTO_FIELDS}}
+
+def hide_private_photo_fields(photo: dict, user: Optional[dict]) -> dict:
+    """Drop PRIVATE_PHOTO_FIELDS unless user is the photo's author or gestao+"""
+    if user and (
+        photo.get("author_id") == user.get("user_id")
+        or get_highest_role_level(user.get("tags", [])) >= HIERARCHY_LEVELS["gestao"]
+    ):
+        return photo
+    for field in PRIVATE_PHOTO_FIELDS:
+        photo.pop(field, None)
+    return photo
+
 # User Models
 class UserBase(BaseModel):
     email: str
@@ -145,6 +161,14 @@ class Photo(PhotoBase):
 class PhotoCreate(PhotoBase):
     pass
 
+class PhotoUploadMetadata(PhotoCreate):
+    credits: Optional[str] = None
+    is_own_photo: bool = True
+
+class ResumableUploadCreate(PhotoUploadMetadata):
+    filename: str
+    size: int  # Total file size in bytes
+
 # Evaluation Models
 class EvaluationCriteria(BaseModel):
     technical_quality: int = 0  # 0-5: Qualidade técnica (foco, nitidez, exposição)
@@ -0,0 +1,34 @@
+"""
+Cursor pagination for newest-first lists keyed by (created_at, <id>)
+The cursor is "<created_at iso>|<id>" of the last item of the previous page;
+the id breaks ties between items created in the same instant.
+"""
+from datetime import datetime
+from typing import Optional
+from fastapi import HTTPException
+
+def encode_time_cursor(created_at: datetime, item_id: str) -> str:
+    return f"{created_at.isoformat()}|{item_id}"
+
+def decode_time_cursor(cursor: str) -> Optional[tuple]:
+    """(created_at, id) from a cursor, or None when malformed"""
+    created_at, _, item_id = cursor.partition("|")
+    if not item_id:
+        return None
+    try:
+        return datetime.fromisoformat(created_at), item_id
+    except ValueError:
+        return None
+
+def older_than_cursor(cursor: Optional[str], id_field: str) -> dict:
+    """Query clause for items after the cursor in (created_at, id) descending order"""
+    if not cursor:
+        return {}
+    key = decode_time_cursor(cursor)
+    if key is None:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    created_at, item_id = key
+    return {"$or": [
+        {"created_at": {"$lt": created_at}},
+        {"created_at": created_at, id_field: {"$lt": item_id}}
+    ]}
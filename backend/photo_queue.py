@@ -0,0 +1,182 @@
+"""
+Persistent evaluation queue for pending photos
+- Order is (queue_class, queue_seq): colaborador photos in the priority class
+  (at most PRIORITY_POSITIONS at a time) come first, then everyone else in
+  arrival order
+- queue_seq comes from a counter document, so enqueueing is one atomic update
+- The counter also caches the pending / priority counts used for capacity checks
+- Live positions are index-backed counts over (status, queue_class, queue_seq)
+"""
+import logging
+from typing import Optional
+from pymongo import ReturnDocument, UpdateOne
+
+logger = logging.getLogger(__name__)
+
+MAX_QUEUE_SIZE = 50
+PRIORITY_POSITIONS = 10
+
+QUEUE_COUNTER_ID = "photo_queue"
+PRIORITY_CLASS = 0
+NORMAL_CLASS = 1
+QUEUE_SORT = [("queue_class", 1), ("queue_seq", 1)]
+
+def queue_key_filter(op: str, queue_class: int, queue_seq: int) -> dict:
+    """Compare (queue_class, queue_seq) against a key; op is $lt, $lte, $gt or $gte"""
+    class_op = "$lt" if op.startswith("$lt") else "$gt"
+    return {"$or": [
+        {"queue_class": {class_op: queue_class}},
+        {"queue_class": queue_class, "queue_seq": {op: queue_seq}},
+    ]}
+
+def encode_queue_cursor(photo: dict) -> str:
+    return f"{photo['queue_class']}.{photo['queue_seq']}"
+
+def decode_queue_cursor(cursor: str) -> Optional[tuple]:
+    """(queue_class, queue_seq) from a cursor, or None when malformed"""
+    parts = cursor.split(".")
+    if len(parts) != 2 or not all(part.isdigit() for part in parts):
+        return None
+    return int(parts[0]), int(parts[1])
+
+async def sync_queue(db) -> dict:
+    """
+    Rebuild the counter from the photos collection (startup/drift correction).
+    Pending photos from before the queue existed are given a class and sequence
+    in their old order.
+    """
+    counter = await db.counters.find_one({"_id": QUEUE_COUNTER_ID}) or {}
+    last = await db.photos.find_one(
+        {"queue_seq": {"$ne": None}}, {"_id": 0, "queue_seq": 1}, sort=[("queue_seq", -1)]
+    )
+    seq = max(counter.get("seq", 0), last["queue_seq"] if last else 0)
+
+    legacy = await db.photos.find(
+        {"status": "pending", "queue_seq": None},
+        {"_id": 0, "photo_id": 1, "priority": 1}
+    ).sort([("priority", -1), ("queue_position", 1), ("created_at", 1)]).to_list(None)
+    if legacy:
+        operations = []
+        for photo in legacy:
+            seq += 1
+            queue_class = PRIORITY_CLASS if photo.get("priority") else NORMAL_CLASS
+            operations.append(UpdateOne(
+                {"photo_id": photo["photo_id"]},
+                {"$set": {"queue_class": queue_class, "queue_seq": seq}}
+            ))
+        await db.photos.bulk_write(operations, ordered=False)
+        logger.info(f"Assigned queue sequence to {len(legacy)} pending photos")
+
+    counts = {
+        "pending": await db.photos.count_documents({"status": "pending"}),
+        "priority_pending": await db.photos.count_documents({"status": "pending", "queue_class": PRIORITY_CLASS}),
+    }
+    await db.counters.update_one(
+        {"_id": QUEUE_COUNTER_ID},
+        {"$set": counts, "$max": {"seq": seq}},
+        upsert=True
+    )
+    return counts
+
+async def get_queue_counts(db) -> dict:
+    """Cached {"pending", "priority_pending"} counts"""
+    counter = await db.counters.find_one({"_id": QUEUE_COUNTER_ID})
+    if counter is None:
+        return await sync_queue(db)
+    return {
+        "pending": max(0, counter.get("pending", 0)),
+        "priority_pending": max(0, counter.get("priority_pending", 0)),
+    }
+
+async def get_pending_count(db) -> int:
+    """Cached number of photos waiting for evaluation"""
+    return (await get_queue_counts(db))["pending"]
+
+async def _take_slots(db, count: int, queue_class: int, enforce_limit: bool) -> Optional[dict]:
+    query = {"_id": QUEUE_COUNTER_ID}
+    inc = {"pending": count, "seq": count}
+    if enforce_limit:
+        query["pending"] = {"$lte": MAX_QUEUE_SIZE - count}
+    if queue_class == PRIORITY_CLASS:
+        query["priority_pending"] = {"$lte": PRIORITY_POSITIONS - count}
+        inc["priority_pending"] = count
+
+    counter = await db.counters.find_one_and_update(
+        query, {"$inc": inc}, return_document=ReturnDocument.AFTER
+    )
+    if counter is None:
+        return None
+
+    ahead = counter["priority_pending"] if queue_class == PRIORITY_CLASS else counter["pending"]
+    return {
+        "queue_class": queue_class,
+        "first_seq": counter["seq"] - count + 1,
+        "first_position": ahead - count + 1,
+        "pending_count": counter["pending"] - count,
+    }
+
+async def enqueue(db, count: int = 1, priority: bool = False, enforce_limit: bool = True) -> Optional[dict]:
+    """
+    Atomically take `count` consecutive queue slots.
+    Returns {"queue_class", "first_seq", "first_position", "pending_count"}
+    (pending_count is the queue length before), or None when the queue is full.
+    """
+    for _ in range(2):
+        slots = None
+        if priority:
+            slots = await _take_slots(db, count, PRIORITY_CLASS, enforce_limit)
+        if slots is None:
+            slots = await _take_slots(db, count, NORMAL_CLASS, enforce_limit)
+        if slots is not None:
+            return slots
+        # Missing counter (first run): build it from the collection and retry once
+        if await db.counters.count_documents({"_id": QUEUE_COUNTER_ID}, limit=1):
+            return None
+        await sync_queue(db)
+    return None
+
+async def release_queue_slots(db, count: int = 1, queue_class: int = NORMAL_CLASS):
+    """Give back slots when photos leave "pending" (evaluated, deleted, failed upload)"""
+    if count <= 0:
+        return
+    inc = {"pending": -count}
+    if queue_class == PRIORITY_CLASS:
+        inc["priority_pending"] = -count
+    await db.counters.update_one({"_id": QUEUE_COUNTER_ID}, {"$inc": inc})
+
+async def dequeue(db, photo: dict):
+    """Release the slot held by a photo that just left "pending" """
+    await release_queue_slots(db, 1, photo.get("queue_class", NORMAL_CLASS))
+
+async def get_queue_position(db, photo: dict) -> Optional[int]:
+    """Current 1-based position of a pending photo"""
+    if photo.get("status") != "pending" or photo.get("queue_seq") is None:
+        return None
+    ahead = await db.photos.count_documents({
+        "status": "pending",
+        **queue_key_filter("$lt", photo.get("queue_class", NORMAL_CLASS), photo["queue_seq"])
+    })
+    return ahead + 1
+
+async def add_queue_positions(db, photos: list):
+    """
+    Set the live queue_position of a page of pending photos in queue order:
+    one count before the page plus one covered scan of the keys it spans.
+    """
+    if not photos:
+        return
+    first, last = photos[0], photos[-1]
+    ahead = await db.photos.count_documents({
+        "status": "pending",
+        **queue_key_filter("$lt", first["queue_class"], first["queue_seq"])
+    })
+    keys = await db.photos.find(
+        {"status": "pending", "$and": [
+            queue_key_filter("$gte", first["queue_class"], first["queue_seq"]),
+            queue_key_filter("$lte", last["queue_class"], last["queue_seq"]),
+        ]},
+        {"_id": 0, "queue_class": 1, "queue_seq": 1}
+    ).sort(QUEUE_SORT).to_list(None)
+    positions = {(k["queue_class"], k["queue_seq"]): ahead + i for i, k in enumerate(keys, start=1)}
+    for photo in photos:
+        photo["queue_position"] = positions.get((photo["queue_class"], photo["queue_seq"]))
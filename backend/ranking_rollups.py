@@ -0,0 +1,237 @@
+"""
+Daily rollup buckets for time-windowed rankings
+- photo_daily_stats:  {photo_id, author_id, day, rating_sum, rating_count}
+- author_daily_stats: {author_id, day, approved, rating_sum, rating_count}
+A public rating counts on the (UTC) day it was last set: changing a rating moves
+it from its old day to today. Approvals count on the day of approval.
+Windowed rankings merge the buckets of the window (at most 366 days) instead of
+scanning ratings. rebuild_rollups recomputes everything from public_ratings and
+photos (first start, drift correction); live writes stamp the buckets they
+create with created_at so a rebuild running at the same time keeps them.
+
+Usage: python ranking_rollups.py   (rebuild)
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime, timezone, timedelta
+from typing import Optional
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+MONGO_URL = os.environ.get("MONGO_URL", "mongodb://localhost:27017")
+DB_NAME = os.environ.get("DB_NAME", "spotters_cxj")
+
+RANKING_WINDOWS = ["week", "month", "year", "custom"]
+MAX_CUSTOM_WINDOW_DAYS = 366
+
+def day_bucket(moment: datetime) -> datetime:
+    """UTC midnight of the day containing moment"""
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc)
+    return datetime(moment.year, moment.month, moment.day, tzinfo=timezone.utc)
+
+def window_range(window: str, start: Optional[str] = None, end: Optional[str] = None,
+                 now: datetime = None) -> Optional[tuple]:
+    """
+    [first_day, end_day) for a window: week/month/year are the current calendar
+    period (weeks start on Monday); custom takes inclusive ISO dates.
+    Returns None when the window or dates are invalid.
+    """
+    today = day_bucket(now or datetime.now(timezone.utc))
+    if window == "week":
+        return today - timedelta(days=today.weekday()), today + timedelta(days=1)
+    if window == "month":
+        return today.replace(day=1), today + timedelta(days=1)
+    if window == "year":
+        return today.replace(month=1, day=1), today + timedelta(days=1)
+    if window == "custom" and start and end:
+        try:
+            first = day_bucket(datetime.fromisoformat(start))
+            last = day_bucket(datetime.fromisoformat(end))
+        except ValueError:
+            return None
+        if first > last or (last - first).days >= MAX_CUSTOM_WINDOW_DAYS:
+            return None
+        return first, last + timedelta(days=1)
+    return None
+
+def _created_now() -> dict:
+    return {"$setOnInsert": {"created_at": datetime.now(timezone.utc)}}
+
+def _bucket_inc(query: dict, inc: dict) -> UpdateOne:
+    return UpdateOne(query, {"$inc": inc, **_created_now()}, upsert=True)
+
+async def record_rating(db, photo: dict, rating: int, previous: Optional[dict]):
+    """A user set `rating` on an approved photo; `previous` is their earlier rating document"""
+    photo_ops, author_ops = [], []
+    if previous:
+        old_day = day_bucket(previous.get("updated_at") or previous["created_at"])
+        photo_ops.append(_bucket_inc(
+            {"photo_id": photo["photo_id"], "day": old_day},
+            {"rating_sum": -previous["rating"], "rating_count": -1}
+        ))
+        author_ops.append(_bucket_inc(
+            {"author_id": photo["author_id"], "day": old_day},
+            {"rating_sum": -previous["rating"], "rating_count": -1}
+        ))
+    today = day_bucket(datetime.now(timezone.utc))
+    photo_ops.append(UpdateOne(
+        {"photo_id": photo["photo_id"], "day": today},
+        {"$inc": {"rating_sum": rating, "rating_count": 1}, "$set": {"author_id": photo["author_id"]}, **_created_now()},
+        upsert=True
+    ))
+    author_ops.append(_bucket_inc(
+        {"author_id": photo["author_id"], "day": today},
+        {"rating_sum": rating, "rating_count": 1}
+    ))
+    await asyncio.gather(
+        db.photo_daily_stats.bulk_write(photo_ops, ordered=True),
+        db.author_daily_stats.bulk_write(author_ops, ordered=True)
+    )
+
+async def record_approval(db, photo: dict, delta: int = 1):
+    """Count (or, with delta=-1, uncount) a photo's approval on its approval day"""
+    approved_at = photo.get("approved_at") or datetime.now(timezone.utc)
+    await db.author_daily_stats.update_one(
+        {"author_id": photo["author_id"], "day": day_bucket(approved_at)},
+        {"$inc": {"approved": delta}, **_created_now()},
+        upsert=True
+    )
+
+async def remove_photo_rollups(db, photo: dict):
+    """A photo was deleted: drop its buckets and take them out of its author's"""
+    buckets = await db.photo_daily_stats.find(
+        {"photo_id": photo["photo_id"]},
+        {"_id": 0, "day": 1, "rating_sum": 1, "rating_count": 1}
+    ).to_list(None)
+    if buckets:
+        await db.author_daily_stats.bulk_write([
+            _bucket_inc(
+                {"author_id": photo["author_id"], "day": bucket["day"]},
+                {"rating_sum": -bucket["rating_sum"], "rating_count": -bucket["rating_count"]}
+            )
+            for bucket in buckets
+        ], ordered=False)
+        await db.photo_daily_stats.delete_many({"photo_id": photo["photo_id"]})
+    if photo.get("status") == "approved" and photo.get("approved_at"):
+        await record_approval(db, photo, -1)
+
+async def windowed_photo_totals(db, first_day: datetime, end_day: datetime, limit: int) -> list:
+    """[{photo_id, window_rating, window_votes}] best average first"""
+    return await db.photo_daily_stats.aggregate([
+        {"$match": {"day": {"$gte": first_day, "$lt": end_day}}},
+        {"$group": {"_id": "$photo_id", "rating_sum": {"$sum": "$rating_sum"}, "rating_count": {"$sum": "$rating_count"}}},
+        {"$match": {"rating_count": {"$gt": 0}}},
+        {"$project": {
+            "_id": 0,
+            "photo_id": "$_id",
+            "window_votes": "$rating_count",
+            "window_rating": {"$divide": ["$rating_sum", "$rating_count"]}
+        }},
+        {"$sort": {"window_rating": -1, "window_votes": -1}},
+        {"$limit": limit}
+    ]).to_list(limit)
+
+async def windowed_author_totals(db, first_day: datetime, end_day: datetime, limit: int) -> list:
+    """[{user_id, total_photos, average_rating, rating_count}] best average first"""
+    return await db.author_daily_stats.aggregate([
+        {"$match": {"day": {"$gte": first_day, "$lt": end_day}}},
+        {"$group": {
+            "_id": "$author_id",
+            "approved": {"$sum": "$approved"},
+            "rating_sum": {"$sum": "$rating_sum"},
+            "rating_count": {"$sum": "$rating_count"}
+        }},
+        {"$match": {"$or": [{"approved": {"$gt": 0}}, {"rating_count": {"$gt": 0}}]}},
+        {"$project": {
+            "_id": 0,
+            "user_id": "$_id",
+            "total_photos": "$approved",
+            "rating_count": 1,
+            "average_rating": {
+                "$cond": [{"$gt": ["$rating_count", 0]}, {"$divide": ["$rating_sum", "$rating_count"]}, 0]
+            }
+        }},
+        {"$sort": {"average_rating": -1, "total_photos": -1}},
+        {"$limit": limit}
+    ]).to_list(limit)
+
+async def rebuild_rollups(db) -> int:
+    """Recompute all buckets from public_ratings and approved photos; returns buckets written"""
+    started = datetime.now(timezone.utc)
+    photos = {
+        p["photo_id"]: p
+        for p in await db.photos.find(
+            {}, {"_id": 0, "photo_id": 1, "author_id": 1, "status": 1, "approved_at": 1}
+        ).to_list(None)
+    }
+
+    ratings = await db.public_ratings.aggregate([
+        {"$group": {
+            "_id": {
+                "photo_id": "$photo_id",
+                "day": {"$dateToString": {"format": "%Y-%m-%d", "date": {"$ifNull": ["$updated_at", "$created_at"]}}}
+            },
+            "rating_sum": {"$sum": "$rating"},
+            "rating_count": {"$sum": 1}
+        }}
+    ]).to_list(None)
+
+    photo_buckets, author_buckets = {}, {}
+    for r in ratings:
+        photo = photos.get(r["_id"]["photo_id"])
+        if not photo or not photo.get("author_id"):
+            continue
+        day = datetime.fromisoformat(r["_id"]["day"]).replace(tzinfo=timezone.utc)
+        photo_buckets[(photo["photo_id"], day)] = {
+            "author_id": photo["author_id"], "rating_sum": r["rating_sum"], "rating_count": r["rating_count"]
+        }
+        bucket = author_buckets.setdefault((photo["author_id"], day), {"approved": 0, "rating_sum": 0, "rating_count": 0})
+        bucket["rating_sum"] += r["rating_sum"]
+        bucket["rating_count"] += r["rating_count"]
+    for photo in photos.values():
+        if photo.get("status") == "approved" and photo.get("approved_at") and photo.get("author_id"):
+            key = (photo["author_id"], day_bucket(photo["approved_at"]))
+            author_buckets.setdefault(key, {"approved": 0, "rating_sum": 0, "rating_count": 0})["approved"] += 1
+
+    if photo_buckets:
+        await db.photo_daily_stats.bulk_write([
+            UpdateOne({"photo_id": photo_id, "day": day}, {"$set": {**fields, "rebuilt_at": started}}, upsert=True)
+            for (photo_id, day), fields in photo_buckets.items()
+        ], ordered=False)
+    if author_buckets:
+        await db.author_daily_stats.bulk_write([
+            UpdateOne({"author_id": author_id, "day": day}, {"$set": {**fields, "rebuilt_at": started}}, upsert=True)
+            for (author_id, day), fields in author_buckets.items()
+        ], ordered=False)
+    # Buckets with nothing left in them (deleted photos, moved ratings). Only
+    # buckets that existed before the rebuild: one a live write created since
+    # `started` is not in the data read above and must stay
+    stale = {"$or": [
+        {"rebuilt_at": {"$lt": started}},
+        {"rebuilt_at": {"$exists": False}, "created_at": {"$not": {"$gte": started}}}
+    ]}
+    await db.photo_daily_stats.delete_many(stale)
+    await db.author_daily_stats.delete_many(stale)
+    written = len(photo_buckets) + len(author_buckets)
+    logger.info(f"Ranking rollups rebuilt: {written} daily buckets")
+    return written
+
+async def ensure_rollups(db):
+    """Build the rollups on first start"""
+    if not await db.author_daily_stats.count_documents({}, limit=1):
+        await rebuild_rollups(db)
+
+async def main():
+    client = AsyncIOMotorClient(MONGO_URL)
+    try:
+        await rebuild_rollups(client[DB_NAME])
+    finally:
+        client.close()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
@@ -0,0 +1,80 @@
+"""
+Rebuild public rating aggregates (public_rating_sum / public_rating_count /
+public_rating) on photos from the public_ratings collection.
+- rate_photo keeps the aggregates up to date with delta $inc; this job repairs
+  drift and fills photos rated before the aggregates existed
+- Walks photos in batches: one $group over their ratings, one bulk_write for
+  the photos whose aggregates changed
+
+Usage: python reconcile_ratings.py [--batch-size 500]
+"""
+import argparse
+import asyncio
+import logging
+import os
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+MONGO_URL = os.environ.get("MONGO_URL", "mongodb://localhost:27017")
+DB_NAME = os.environ.get("DB_NAME", "spotters_cxj")
+DEFAULT_BATCH_SIZE = 500
+
+def rating_fields(total: float, count: int) -> dict:
+    return {
+        "public_rating_sum": total,
+        "public_rating_count": count,
+        "public_rating": round(total / count, 2) if count else 0.0
+    }
+
+async def rebuild_rating_aggregates(db, photos: list) -> int:
+    """Recompute aggregates for photos ({photo_id, current fields}); returns photos changed"""
+    totals = await db.public_ratings.aggregate([
+        {"$match": {"photo_id": {"$in": [p["photo_id"] for p in photos]}}},
+        {"$group": {"_id": "$photo_id", "total": {"$sum": "$rating"}, "count": {"$sum": 1}}}
+    ]).to_list(None)
+    by_photo = {t["_id"]: t for t in totals}
+
+    operations = []
+    for photo in photos:
+        total = by_photo.get(photo["photo_id"], {})
+        fields = rating_fields(total.get("total", 0), total.get("count", 0))
+        if any(photo.get(key) != value for key, value in fields.items()):
+            operations.append(UpdateOne({"photo_id": photo["photo_id"]}, {"$set": fields}))
+    if operations:
+        await db.photos.bulk_write(operations, ordered=False)
+    return len(operations)
+
+async def reconcile_public_ratings(db, batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+    """Rebuild aggregates for every photo; returns photos changed"""
+    changed = 0
+    last_id = None
+    while True:
+        query = {"_id": {"$gt": last_id}} if last_id is not None else {}
+        photos = await db.photos.find(
+            query,
+            {"_id": 1, "photo_id": 1, "public_rating_sum": 1, "public_rating_count": 1, "public_rating": 1}
+        ).sort("_id", 1).to_list(batch_size)
+        if not photos:
+            break
+        changed += await rebuild_rating_aggregates(db, [p for p in photos if p.get("photo_id")])
+        last_id = photos[-1]["_id"]
+    if changed:
+        logger.info(f"Reconciled public rating aggregates on {changed} photos")
+    return changed
+
+async def main():
+    parser = argparse.ArgumentParser(description="Rebuild public rating aggregates")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(MONGO_URL)
+    try:
+        await reconcile_public_ratings(client[DB_NAME], args.batch_size)
+    finally:
+        client.close()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
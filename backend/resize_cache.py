@@ -0,0 +1,185 @@
+"""
+On-demand image resizing with a bounded disk LRU cache
+- /api/uploads/{file}?w=640&fmt=webp resizes once in the image process pool
+- Results are kept under RESIZE_CACHE_DIR, evicting least recently used files
+- Concurrent first requests for the same variant share a single resize
+- The LRU index is per process but the directory is shared: a hit is checked on
+  disk (another worker may have evicted it) and a miss adopts a file another
+  worker already rendered
+- Hits touch the file on disk, and files used in the last EVICT_GRACE_SECONDS
+  are never evicted (by any worker): their path may be about to be served
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Optional
+from fastapi import HTTPException
+from workers import run_io, run_image
+
+from storage import UPLOAD_DIR
+from image_pipeline import resize_image, VARIANT_FORMATS
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+RESIZE_CACHE_DIR = os.environ.get("RESIZE_CACHE_DIR", os.path.join(UPLOAD_DIR, ".resized"))
+RESIZE_CACHE_MAX_BYTES = int(os.environ.get("RESIZE_CACHE_MAX_MB", "512")) * 1024 * 1024
+MIN_WIDTH = 16
+MAX_WIDTH = 2560
+WIDTH_STEP = 16  # Widths are rounded up to a multiple of this to bound the cache key space
+RESIZABLE_EXTENSIONS = {"jpg", "jpeg", "png", "webp"}
+EVICT_GRACE_SECONDS = 60
+
+# key -> size in bytes, least recently used first
+_entries: "OrderedDict[str, int]" = OrderedDict()
+_total_bytes = 0
+_loaded = False
+_load_lock = asyncio.Lock()
+_inflight = {}
+
+def normalize_request(width: Optional[int], fmt: Optional[str], source_ext: str):
+    """Validate and normalize resize parameters"""
+    fmt = (fmt or ("webp" if source_ext == "webp" else "jpg")).lower()
+    if fmt == "jpeg":
+        fmt = "jpg"
+    if fmt not in VARIANT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Formato inválido. Use: {list(VARIANT_FORMATS)}")
+
+    width = width or MAX_WIDTH
+    if width < MIN_WIDTH or width > MAX_WIDTH:
+        raise HTTPException(status_code=400, detail=f"Largura deve estar entre {MIN_WIDTH} e {MAX_WIDTH}")
+    width = -(-width // WIDTH_STEP) * WIDTH_STEP
+    return min(width, MAX_WIDTH), fmt
+
+def _cache_key(source_path: str, stat_result: os.stat_result, width: int, fmt: str) -> str:
+    raw = f"{source_path}:{stat_result.st_size}:{stat_result.st_mtime_ns}:{width}"
+    return f"{hashlib.sha1(raw.encode()).hexdigest()}.{fmt}"
+
+def _cache_path(key: str) -> str:
+    return os.path.join(RESIZE_CACHE_DIR, key[:2], key)
+
+def _scan_cache_dir() -> list:
+    """List (mtime, key, size) for files already cached on disk"""
+    found = []
+    if not os.path.exists(RESIZE_CACHE_DIR):
+        return found
+    for root, dirs, files in os.walk(RESIZE_CACHE_DIR):
+        for name in files:
+            if name.endswith(".part"):
+                continue
+            stat_result = os.stat(os.path.join(root, name))
+            found.append((stat_result.st_mtime, name, stat_result.st_size))
+    found.sort()
+    return found
+
+async def _ensure_loaded():
+    """Rebuild the in-memory LRU index from disk once per process"""
+    global _loaded, _total_bytes
+    if _loaded:
+        return
+    async with _load_lock:
+        if _loaded:
+            return
+        for _, key, size in await run_io(_scan_cache_dir):
+            _entries[key] = size
+            _total_bytes += size
+        _loaded = True
+        await _evict()
+
+def _touch(path: str) -> Optional[os.stat_result]:
+    """Mark a cached file as recently used; returns its stat, None when it no longer exists"""
+    try:
+        os.utime(path)
+        return os.stat(path)
+    except OSError:
+        return None
+
+def _remove_if_idle(path: str, cutoff: float) -> bool:
+    """Remove a cached file not used since cutoff; False when it was used since"""
+    try:
+        if os.stat(path).st_mtime >= cutoff:
+            return False
+        os.remove(path)
+    except OSError:
+        pass
+    return True
+
+async def _evict():
+    """
+    Drop least recently used entries until the cache fits its budget, keeping
+    files used in the last EVICT_GRACE_SECONDS (here or by another worker)
+    """
+    global _total_bytes
+    cutoff = time.time() - EVICT_GRACE_SECONDS
+    for _ in range(len(_entries)):
+        if _total_bytes <= RESIZE_CACHE_MAX_BYTES or not _entries:
+            break
+        key, size = _entries.popitem(last=False)
+        if await run_io(_remove_if_idle, _cache_path(key), cutoff):
+            _total_bytes -= size
+        elif key in _entries:
+            # Re-indexed by a concurrent request while the file was checked
+            _total_bytes -= size
+        else:
+            # Recently used (possibly by another worker): now the most recent entry
+            _entries[key] = size
+
+def _forget(key: str):
+    """Drop an entry whose file is gone from disk"""
+    global _total_bytes
+    _total_bytes -= _entries.pop(key, 0)
+
+async def _render(source_path: str, key: str, width: int, fmt: str) -> str:
+    global _total_bytes
+    dst_path = _cache_path(key)
+    # Rendered by another worker since this process indexed the cache (touched,
+    # so no worker evicts it before it is served)
+    stat_result = await run_io(_touch, dst_path)
+    if stat_result is None:
+        await run_io(os.makedirs, os.path.dirname(dst_path), exist_ok=True)
+        await run_image(resize_image, source_path, dst_path, width, fmt)
+        stat_result = await run_io(os.stat, dst_path)
+
+    _forget(key)
+    size = stat_result.st_size
+    _entries[key] = size
+    _total_bytes += size
+    await _evict()
+    return dst_path
+
+async def get_resized(source_path: str, width: Optional[int], fmt: Optional[str]) -> str:
+    """Return the path of a cached resized copy of source_path, rendering it if needed"""
+    source_ext = source_path.rsplit(".", 1)[-1].lower()
+    if source_ext not in RESIZABLE_EXTENSIONS:
+        raise HTTPException(status_code=400, detail="Arquivo não pode ser redimensionado")
+    width, fmt = normalize_request(width, fmt, source_ext)
+
+    await _ensure_loaded()
+    stat_result = await run_io(os.stat, source_path)
+    key = _cache_key(source_path, stat_result, width, fmt)
+
+    # Cache hit: mark as most recently used (unless another worker evicted it)
+    if key in _entries:
+        _entries.move_to_end(key)
+        path = _cache_path(key)
+        if await run_io(_touch, path) is not None:
+            return path
+        _forget(key)
+
+    # Coalesce concurrent misses for the same variant into one resize
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_render(source_path, key, width, fmt))
+        _inflight[key] = task
+        task.add_done_callback(lambda _: _inflight.pop(key, None))
+
+    try:
+        return await asyncio.shield(task)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.warning(f"Resize failed for {source_path}: {e}")
+        raise HTTPException(status_code=400, detail="Arquivo de imagem inválido")
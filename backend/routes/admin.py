@@ -2,6 +2,7 @@ from fastapi import APIRouter, HTTPException, Request, Depends
 from typing import List
 from models import User, UserUpdate, HIERARCHY_LEVELS, get_highest_role_level
 from routes.logs import create_audit_log, get_client_ip
+from routes.evaluation import invalidate_evaluator_count
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
@@ -57,6 +58,7 @@ async def update_user_role(request: Request, user_id: str):
     new_tags = body.get("tags", old_tags)
     
     await db.users.update_one({"user_id": user_id}, {"$set": {"tags": new_tags}})
+    await invalidate_evaluator_count(db)
     
     # Log the action
     await create_audit_log(
@@ -133,6 +135,7 @@ async def delete_user(request: Request, user_id: str):
     
     await db.users.delete_one({"user_id": user_id})
     await db.user_sessions.delete_many({"user_id": user_id})
+    await invalidate_evaluator_count(db)
     
     # Log the action
     await create_audit_log(
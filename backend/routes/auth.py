@@ -3,6 +3,7 @@ from datetime import datetime, timezone, timedelta
 import httpx
 import uuid
 from models import User, Notification, NotificationType
+from routes.evaluation import is_evaluator, invalidate_evaluator_count
 import logging
 
 logger = logging.getLogger(__name__)
@@ -141,6 +142,8 @@ async def create_session(request: Request, response: Response):
             "last_login": datetime.now(timezone.utc)
         }
         await db.users.insert_one(new_user)
+        if is_evaluator(tags):
+            await invalidate_evaluator_count(db)
         
         # Welcome notification
         await create_notification(
@@ -237,6 +240,8 @@ async def register_email(request: Request):
         "created_at": datetime.now(timezone.utc)
     }
     await db.users.insert_one(new_user)
+    if is_evaluator(tags):
+        await invalidate_evaluator_count(db)
     
     await create_notification(
         db, user_id, "tag_assigned",
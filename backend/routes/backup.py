@@ -2,10 +2,9 @@ from fastapi import APIRouter, HTTPException, Request, BackgroundTasks
 from fastapi.responses import FileResponse, JSONResponse
 from datetime import datetime, timezone
 import os
-import json
-import zipfile
-import shutil
 import asyncio
+from backup_archive import create_backup_zip, discard_backup
+from workers import run_io
 
 router = APIRouter(prefix="/backup", tags=["backup"])
 
@@ -17,6 +16,16 @@ LOCAL_BACKUP_DIR = "/app/backend/backups"
 async def get_db(request: Request):
     return request.app.state.db
 
+def scan_local_backups() -> list:
+    """(filename, full path, stat) for every local backup zip. Blocking: call via run_io"""
+    backups = []
+    if os.path.exists(LOCAL_BACKUP_DIR):
+        for f in os.listdir(LOCAL_BACKUP_DIR):
+            if f.endswith('.zip'):
+                full_path = os.path.join(LOCAL_BACKUP_DIR, f)
+                backups.append((f, full_path, os.stat(full_path)))
+    return backups
+
 async def require_gestao(request: Request):
     """Require gestao level or higher for backup operations"""
     from routes.auth import get_current_user
@@ -46,48 +55,6 @@ def get_google_drive_service():
     except Exception as e:
         raise Exception(f"Failed to initialize Google Drive: {str(e)}")
 
-async def export_database_to_json(db, dump_dir):
-    """Export all collections to JSON files"""
-    collections = await db.list_collection_names()
-    
-    for col_name in collections:
-        documents = await db[col_name].find({}, {"_id": 0}).to_list(10000)
-        json_path = os.path.join(dump_dir, f"{col_name}.json")
-        with open(json_path, 'w', encoding='utf-8') as f:
-            json.dump(documents, f, default=str, ensure_ascii=False, indent=2)
-    
-    return collections
-
-async def create_backup_zip(db):
-    """Create complete backup ZIP file"""
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    backup_name = f"spotters_backup_{timestamp}.zip"
-    backup_path = f"/tmp/{backup_name}"
-    dump_dir = f"/tmp/backup_dump_{timestamp}"
-    
-    os.makedirs(dump_dir, exist_ok=True)
-    
-    try:
-        collections = await export_database_to_json(db, dump_dir)
-        
-        with zipfile.ZipFile(backup_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            for col_name in collections:
-                json_path = os.path.join(dump_dir, f"{col_name}.json")
-                if os.path.exists(json_path):
-                    zipf.write(json_path, f"database/{col_name}.json")
-            
-            uploads_dir = "/app/backend/uploads"
-            if os.path.exists(uploads_dir):
-                for root, dirs, files in os.walk(uploads_dir):
-                    for file in files:
-                        file_path = os.path.join(root, file)
-                        arcname = os.path.relpath(file_path, uploads_dir)
-                        zipf.write(file_path, f"uploads/{arcname}")
-        
-        return backup_path, backup_name
-    finally:
-        shutil.rmtree(dump_dir, ignore_errors=True)
-
 def upload_to_google_drive(file_path: str, file_name: str):
     """Upload file to Google Drive"""
     from googleapiclient.http import MediaFileUpload
@@ -120,7 +87,7 @@ async def create_google_drive_backup(request: Request):
         backup_path, backup_name = await create_backup_zip(db)
         
         try:
-            drive_file = upload_to_google_drive(backup_path, backup_name)
+            drive_file = await run_io(upload_to_google_drive, backup_path, backup_name)
             
             await db.backup_logs.insert_one({
                 "backup_id": f"backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}",
@@ -140,8 +107,7 @@ async def create_google_drive_backup(request: Request):
                 "drive_link": drive_file.get('webViewLink')
             }
         finally:
-            if os.path.exists(backup_path):
-                os.remove(backup_path)
+            await discard_backup(backup_path)
                 
     except Exception as e:
         await db.backup_logs.insert_one({
@@ -201,17 +167,13 @@ async def list_local_backups(request: Request):
     await require_gestao(request)
     
     backups = []
-    if os.path.exists(LOCAL_BACKUP_DIR):
-        for f in os.listdir(LOCAL_BACKUP_DIR):
-            if f.endswith('.zip'):
-                full_path = os.path.join(LOCAL_BACKUP_DIR, f)
-                stat = os.stat(full_path)
-                backups.append({
-                    "filename": f,
-                    "size_mb": round(stat.st_size / (1024 * 1024), 2),
-                    "created_at": datetime.fromtimestamp(stat.st_mtime).isoformat(),
-                    "path": full_path
-                })
+    for f, full_path, stat in await run_io(scan_local_backups):
+        backups.append({
+            "filename": f,
+            "size_mb": round(stat.st_size / (1024 * 1024), 2),
+            "created_at": datetime.fromtimestamp(stat.st_mtime).isoformat(),
+            "path": full_path
+        })
     
     # Sort by date (newest first)
     backups.sort(key=lambda x: x['created_at'], reverse=True)
@@ -228,7 +190,7 @@ async def download_local_backup(request: Request, filename: str):
     
     file_path = os.path.join(LOCAL_BACKUP_DIR, filename)
     
-    if not os.path.exists(file_path):
+    if not await run_io(os.path.exists, file_path):
         raise HTTPException(status_code=404, detail="Arquivo não encontrado")
     
     return FileResponse(
@@ -247,10 +209,10 @@ async def delete_local_backup(request: Request, filename: str):
     
     file_path = os.path.join(LOCAL_BACKUP_DIR, filename)
     
-    if not os.path.exists(file_path):
+    if not await run_io(os.path.exists, file_path):
         raise HTTPException(status_code=404, detail="Arquivo não encontrado")
     
-    os.remove(file_path)
+    await run_io(os.remove, file_path)
     return {"success": True, "message": "Backup excluído"}
 
 @router.post("/test-email")
@@ -324,15 +286,11 @@ async def get_backup_status(request: Request):
     )
     
     # Count local backups
-    local_backup_count = 0
-    local_backup_size = 0
-    if os.path.exists(LOCAL_BACKUP_DIR):
-        for f in os.listdir(LOCAL_BACKUP_DIR):
-            if f.endswith('.zip'):
-                local_backup_count += 1
-                local_backup_size += os.path.getsize(os.path.join(LOCAL_BACKUP_DIR, f))
+    local_backups = await run_io(scan_local_backups)
+    local_backup_count = len(local_backups)
+    local_backup_size = sum(stat.st_size for _, _, stat in local_backups)
     
-    google_drive_configured = os.path.exists(GOOGLE_CREDENTIALS_PATH) and bool(GOOGLE_DRIVE_FOLDER_ID)
+    google_drive_configured = await run_io(os.path.exists, GOOGLE_CREDENTIALS_PATH) and bool(GOOGLE_DRIVE_FOLDER_ID)
     
     # Check email configuration
     smtp_password = os.environ.get('SMTP_PASSWORD', '')
@@ -1,12 +1,26 @@
 from fastapi import APIRouter, HTTPException, Request
-from datetime import datetime, timezone
+from typing import Optional
+from datetime import datetime, timezone, timedelta
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 from models import HIERARCHY_LEVELS, get_highest_role_level, can_access_level
+from leaderboard import leaderboard_photo_approved
+from ranking_rollups import record_approval
+from pagination import encode_time_cursor, older_than_cursor
+from duplicates import duplicate_index
+from photo_queue import QUEUE_SORT, queue_key_filter, encode_queue_cursor, decode_queue_cursor, add_queue_positions, dequeue
 import uuid
 
 router = APIRouter(prefix="/evaluation", tags=["evaluation"])
 
 MIN_EVALUATORS_PERCENT = 0.5  # 50%
 MIN_APPROVAL_SCORE = 3.0
+QUEUE_PAGE_SIZE = 50
+HISTORY_PAGE_SIZE = 50
+
+EVALUATOR_TAGS = ["avaliador", "produtor", "gestao", "admin", "lider"]
+EVALUATOR_COUNT_ID = "evaluators"
+EVALUATOR_COUNT_TTL = timedelta(hours=1)  # Safety net for changes made outside the API
 
 async def get_db(request: Request):
     return request.app.state.db
@@ -23,6 +37,30 @@ async def require_evaluator(request: Request):
         raise HTTPException(status_code=403, detail="Acesso restrito a avaliadores")
     return user
 
+def is_evaluator(tags: list) -> bool:
+    return any(tag in EVALUATOR_TAGS for tag in tags or [])
+
+async def get_evaluator_count(db) -> int:
+    """Number of users who can evaluate, cached in counters"""
+    now = datetime.now(timezone.utc)
+    cached = await db.counters.find_one({"_id": EVALUATOR_COUNT_ID})
+    if cached:
+        computed_at = cached["computed_at"].replace(tzinfo=cached["computed_at"].tzinfo or timezone.utc)
+        if now - computed_at < EVALUATOR_COUNT_TTL:
+            return cached["count"]
+    
+    count = await db.users.count_documents({"tags": {"$in": EVALUATOR_TAGS}})
+    await db.counters.update_one(
+        {"_id": EVALUATOR_COUNT_ID},
+        {"$set": {"count": count, "computed_at": now}},
+        upsert=True
+    )
+    return count
+
+async def invalidate_evaluator_count(db):
+    """Call after creating/deleting users or changing their tags"""
+    await db.counters.delete_one({"_id": EVALUATOR_COUNT_ID})
+
 async def create_notification(db, user_id: str, notif_type: str, message: str, data: dict = None):
     notification = {
         "notification_id": f"notif_{uuid.uuid4().hex[:8]}",
@@ -36,30 +74,57 @@ async def create_notification(db, user_id: str, notif_type: str, message: str, d
     await db.notifications.insert_one(notification)
 
 @router.get("/queue")
-async def get_evaluation_queue(request: Request):
-    """Get photos pending evaluation (avaliador+)"""
+async def get_evaluation_queue(request: Request, cursor: Optional[str] = None, limit: int = QUEUE_PAGE_SIZE):
+    """
+    Get photos pending evaluation (avaliador+), in queue order.
+    Excludes own photos and photos already evaluated by the user.
+    Pass `next_cursor` back as `cursor` for the next page.
+    """
     user = await require_evaluator(request)
     db = await get_db(request)
-    
-    # Get pending photos not authored by current user
-    photos = await db.photos.find(
-        {
-            "status": "pending",
-            "author_id": {"$ne": user["user_id"]}
-        },
-        {"_id": 0}
-    ).sort([("priority", -1), ("queue_position", 1)]).to_list(50)
-    
-    # Filter out already evaluated by this user using projection for efficiency
-    user_evals = await db.evaluations.find(
-        {"evaluator_id": user["user_id"]},
-        {"photo_id": 1, "_id": 0}
-    ).to_list(1000)
-    evaluated_ids = {ev["photo_id"] for ev in user_evals}
-    
-    photos = [p for p in photos if p["photo_id"] not in evaluated_ids]
-    
-    return photos
+    limit = max(1, min(limit, QUEUE_PAGE_SIZE))
+    
+    match = {"status": "pending", "author_id": {"$ne": user["user_id"]}}
+    if cursor:
+        key = decode_queue_cursor(cursor)
+        if key is None:
+            raise HTTPException(status_code=400, detail="Cursor inválido")
+        match.update(queue_key_filter("$gt", *key))
+    
+    # Anti-join against this evaluator's evaluations (index evaluator_id + photo_id)
+    photos = await db.photos.aggregate([
+        {"$match": match},
+        {"$sort": dict(QUEUE_SORT)},
+        {"$lookup": {
+            "from": "evaluations",
+            "let": {"photo_id": "$photo_id"},
+            "pipeline": [
+                {"$match": {"$expr": {"$and": [
+                    {"$eq": ["$evaluator_id", user["user_id"]]},
+                    {"$eq": ["$photo_id", "$$photo_id"]}
+                ]}}},
+                {"$limit": 1},
+                {"$project": {"_id": 1}}
+            ],
+            "as": "own_evaluation"
+        }},
+        {"$match": {"own_evaluation": {"$size": 0}}},
+        {"$limit": limit + 1},
+        {"$project": {"_id": 0, "own_evaluation": 0}}
+    ]).to_list(limit + 1)
+    
+    has_more = len(photos) > limit
+    photos = photos[:limit]
+    await add_queue_positions(db, photos)
+    
+    # Flag near-duplicates of approved/queued photos detected at upload
+    for photo in photos:
+        photo["possible_duplicate"] = bool(photo.get("near_duplicates"))
+    
+    return {
+        "photos": photos,
+        "next_cursor": encode_queue_cursor(photos[-1]) if has_more else None
+    }
 
 @router.get("/{photo_id}")
 async def get_photo_for_evaluation(request: Request, photo_id: str):
@@ -83,9 +148,7 @@ async def get_photo_for_evaluation(request: Request, photo_id: str):
     if existing:
         raise HTTPException(status_code=400, detail="Você já avaliou esta foto")
     
-    # Get current evaluations count
-    eval_count = await db.evaluations.count_documents({"photo_id": photo_id})
-    photo["evaluations_count"] = eval_count
+    photo["evaluations_count"] = photo.get("rating_count", 0)
     
     return photo
 
@@ -113,16 +176,8 @@ async def submit_evaluation(request: Request, photo_id: str):
     if photo["author_id"] == user["user_id"]:
         raise HTTPException(status_code=403, detail="Você não pode avaliar sua própria foto")
     
-    # Check if already evaluated
-    existing = await db.evaluations.find_one({
-        "photo_id": photo_id,
-        "evaluator_id": user["user_id"]
-    })
-    if existing:
-        raise HTTPException(status_code=400, detail="Você já avaliou esta foto")
-    
     # Calculate final score (average of criteria)
-    final_score = sum(criteria.values()) / len(criteria)
+    final_score = round(sum(criteria.values()) / len(criteria), 2)
     
     # Save evaluation
     evaluation = {
@@ -131,55 +186,64 @@ async def submit_evaluation(request: Request, photo_id: str):
         "evaluator_id": user["user_id"],
         "evaluator_name": user["name"],
         "criteria": criteria,
-        "final_score": round(final_score, 2),
+        "final_score": final_score,
         "comment": comment,
         "created_at": datetime.now(timezone.utc)
     }
-    await db.evaluations.insert_one(evaluation)
+    # The unique (evaluator_id, photo_id) index rejects a second vote
+    try:
+        await db.evaluations.insert_one(evaluation)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Você já avaliou esta foto")
     
-    # Update photo rating count
-    await db.photos.update_one(
-        {"photo_id": photo_id},
-        {"$inc": {"rating_count": 1}}
+    # Running aggregates on the photo
+    photo = await db.photos.find_one_and_update(
+        {"photo_id": photo_id, "status": "pending"},
+        {"$inc": {
+            "rating_count": 1,
+            "evaluation_score_sum": final_score,
+            "evaluation_approvals": 1 if final_score > MIN_APPROVAL_SCORE else 0
+        }},
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER
     )
+    if photo is None:
+        # Approved/rejected/deleted meanwhile: the vote does not count
+        await db.evaluations.delete_one({"evaluation_id": evaluation["evaluation_id"]})
+        raise HTTPException(status_code=404, detail="Foto não encontrada ou já processada")
     
     # Check if should process approval
-    await check_photo_approval(db, photo_id)
+    await check_photo_approval(db, photo)
     
-    return {"message": "Avaliação registrada", "score": round(final_score, 2)}
+    return {"message": "Avaliação registrada", "score": final_score}
 
-async def check_photo_approval(db, photo_id: str):
-    """Check if photo should be approved or rejected based on evaluations"""
-    # Get all evaluators count
-    total_evaluators = await db.users.count_documents({
-        "tags": {"$in": ["avaliador", "produtor", "gestao", "admin", "lider"]}
-    })
-    
+async def check_photo_approval(db, photo: dict):
+    """Approve or reject a pending photo from its running evaluation aggregates"""
+    total_evaluators = await get_evaluator_count(db)
     if total_evaluators == 0:
         return
     
-    # Get evaluations for this photo
-    evaluations = await db.evaluations.find({"photo_id": photo_id}).to_list(1000)
-    
     # Need at least 50% of evaluators
     min_evaluations = max(1, int(total_evaluators * MIN_EVALUATORS_PERCENT))
-    
-    if len(evaluations) < min_evaluations:
+    count = photo.get("rating_count", 0)
+    if count < min_evaluations:
         return  # Not enough evaluations yet
     
     # Check approval: >50% gave >3
-    scores_above_3 = sum(1 for e in evaluations if e["final_score"] > MIN_APPROVAL_SCORE)
-    approval_rate = scores_above_3 / len(evaluations)
+    approval_rate = photo.get("evaluation_approvals", 0) / count
     
     # Calculate final rating
-    final_rating = sum(e["final_score"] for e in evaluations) / len(evaluations)
+    final_rating = photo.get("evaluation_score_sum", 0) / count
+    photo_id = photo["photo_id"]
     
-    photo = await db.photos.find_one({"photo_id": photo_id}, {"_id": 0})
+    # Decided on this exact vote count: if another vote landed meanwhile, that
+    # vote's own check makes the decision (and only one update can succeed)
+    decision_query = {"photo_id": photo_id, "status": "pending", "rating_count": count}
     
     if approval_rate > 0.5:
         # APPROVED
-        await db.photos.update_one(
-            {"photo_id": photo_id},
+        result = await db.photos.update_one(
+            decision_query,
             {
                 "$set": {
                     "status": "approved",
@@ -188,6 +252,11 @@ async def check_photo_approval(db, photo_id: str):
                 }
             }
         )
+        if not result.modified_count:
+            return
+        await dequeue(db, photo)
+        await leaderboard_photo_approved(db, photo)
+        await record_approval(db, photo)
         await create_notification(
             db, photo["author_id"], "photo_approved",
             f"🎉 Sua foto '{photo['title']}' foi APROVADA!\nNota final: ⭐ {final_rating:.1f}\nEla já está publicada no site.",
@@ -195,8 +264,8 @@ async def check_photo_approval(db, photo_id: str):
         )
     else:
         # REJECTED
-        await db.photos.update_one(
-            {"photo_id": photo_id},
+        result = await db.photos.update_one(
+            decision_query,
             {
                 "$set": {
                     "status": "rejected",
@@ -205,12 +274,56 @@ async def check_photo_approval(db, photo_id: str):
                 }
             }
         )
+        if not result.modified_count:
+            return
+        await dequeue(db, photo)
+        duplicate_index.remove(photo_id)
         await create_notification(
             db, photo["author_id"], "photo_rejected",
             f"❌ Sua foto '{photo['title']}' não foi aprovada desta vez.\nNota final: ⭐ {final_rating:.1f}\nVocê pode reenviar após ajustes.",
             {"photo_id": photo_id, "rating": round(final_rating, 2)}
         )
 
+async def backfill_evaluation_aggregates(db) -> int:
+    """Fill running aggregates for pending photos evaluated before they existed"""
+    photos = await db.photos.find(
+        {"status": "pending", "evaluation_score_sum": {"$exists": False}},
+        {"_id": 0, "photo_id": 1}
+    ).to_list(None)
+    return await rebuild_evaluation_aggregates(db, [p["photo_id"] for p in photos])
+
+async def rebuild_evaluation_aggregates(db, photo_ids: list) -> int:
+    """Recompute running aggregates of pending photos from their evaluations"""
+    photos = await db.photos.find(
+        {"photo_id": {"$in": photo_ids}, "status": "pending"},
+        {"_id": 0, "photo_id": 1}
+    ).to_list(None)
+    if not photos:
+        return 0
+    
+    totals = await db.evaluations.aggregate([
+        {"$match": {"photo_id": {"$in": [p["photo_id"] for p in photos]}}},
+        {"$group": {
+            "_id": "$photo_id",
+            "count": {"$sum": 1},
+            "score_sum": {"$sum": "$final_score"},
+            "approvals": {"$sum": {"$cond": [{"$gt": ["$final_score", MIN_APPROVAL_SCORE]}, 1, 0]}}
+        }}
+    ]).to_list(None)
+    by_photo = {t["_id"]: t for t in totals}
+    
+    for photo in photos:
+        total = by_photo.get(photo["photo_id"], {})
+        await db.photos.update_one(
+            {"photo_id": photo["photo_id"]},
+            {"$set": {
+                "rating_count": total.get("count", 0),
+                "evaluation_score_sum": total.get("score_sum", 0),
+                "evaluation_approvals": total.get("approvals", 0)
+            }}
+        )
+    return len(photos)
+
 @router.get("/history/{photo_id}")
 async def get_evaluation_history(request: Request, photo_id: str):
     """Get evaluation history for a photo (gestao+)"""
@@ -226,8 +339,12 @@ async def get_evaluation_history(request: Request, photo_id: str):
     return evaluations
 
 @router.get("/evaluator/{evaluator_id}/history")
-async def get_evaluator_history(request: Request, evaluator_id: str):
-    """Get all evaluations by an evaluator (own history or gestao+ for antifraude)"""
+async def get_evaluator_history(request: Request, evaluator_id: str, cursor: Optional[str] = None,
+                                limit: int = HISTORY_PAGE_SIZE):
+    """
+    Evaluations by an evaluator, newest first (own history or gestao+ for antifraude).
+    The first page (no cursor) also carries the statistics over the whole history.
+    """
     user = await get_current_user(request)
     user_level = get_highest_role_level(user.get("tags", []))
     
@@ -236,16 +353,31 @@ async def get_evaluator_history(request: Request, evaluator_id: str):
         raise HTTPException(status_code=403, detail="Acesso restrito")
     
     db = await get_db(request)
-    evaluations = await db.evaluations.find(
-        {"evaluator_id": evaluator_id}, 
-        {"_id": 0}
-    ).sort("created_at", -1).to_list(500)
-    
-    # Enrich evaluations with photo data
-    enriched_evaluations = []
-    for evaluation in evaluations:
-        photo = await db.photos.find_one({"photo_id": evaluation["photo_id"]}, {"_id": 0})
-        enriched_evaluation = {
+    limit = max(1, min(limit, HISTORY_PAGE_SIZE))
+    
+    # Page: evaluator_id + cursor, sort and limit use the
+    # (evaluator_id, created_at, evaluation_id) index
+    page = await db.evaluations.aggregate([
+        {"$match": {"evaluator_id": evaluator_id, **older_than_cursor(cursor, "evaluation_id")}},
+        {"$sort": {"created_at": -1, "evaluation_id": -1}},
+        {"$limit": limit + 1},
+        # Photo fields in the same round trip (photos.photo_id index)
+        {"$lookup": {
+            "from": "photos",
+            "let": {"photo_id": "$photo_id"},
+            "pipeline": [
+                {"$match": {"$expr": {"$eq": ["$photo_id", "$$photo_id"]}}},
+                {"$limit": 1},
+                {"$project": {"_id": 0, "title": 1, "author_name": 1, "url": 1, "status": 1}}
+            ],
+            "as": "photo"
+        }}
+    ]).to_list(limit + 1)
+    
+    evaluations = []
+    for evaluation in page[:limit]:
+        photo = evaluation["photo"][0] if evaluation["photo"] else None
+        evaluations.append({
             "evaluation_id": evaluation["evaluation_id"],
             "photo_id": evaluation["photo_id"],
             "photo_title": photo.get("title") if photo else "Foto removida",
@@ -255,18 +387,41 @@ async def get_evaluator_history(request: Request, evaluator_id: str):
             "score": evaluation["final_score"],
             "comment": evaluation.get("comment"),
             "evaluated_at": evaluation["created_at"]
-        }
-        enriched_evaluations.append(enriched_evaluation)
-    
-    # Calculate statistics
-    if evaluations:
-        avg_score = sum(e["final_score"] for e in evaluations) / len(evaluations)
-        score_distribution = {}
-        for e in evaluations:
-            score = int(e["final_score"])
-            score_distribution[score] = score_distribution.get(score, 0) + 1
-    else:
-        avg_score = 0
-        score_distribution = {}
+        })
     
-    return enriched_evaluations
+    response = {
+        "evaluations": evaluations,
+        "next_cursor": (
+            encode_time_cursor(evaluations[-1]["evaluated_at"], evaluations[-1]["evaluation_id"])
+            if len(page) > limit else None
+        )
+    }
+    if not cursor:
+        # Statistics over the whole history, first page only
+        result = (await db.evaluations.aggregate([
+            {"$match": {"evaluator_id": evaluator_id}},
+            {"$facet": {
+                "stats": [
+                    {"$group": {
+                        "_id": None,
+                        "total": {"$sum": 1},
+                        "avg_score": {"$avg": "$final_score"},
+                        "approvals": {"$sum": {"$cond": [{"$gt": ["$final_score", MIN_APPROVAL_SCORE]}, 1, 0]}}
+                    }}
+                ],
+                "distribution": [
+                    {"$group": {"_id": {"$floor": "$final_score"}, "count": {"$sum": 1}}}
+                ]
+            }}
+        ]).to_list(1))[0]
+        stats = result["stats"][0] if result["stats"] else {}
+        response["stats"] = {
+            "total": stats.get("total", 0),
+            "avg_score": round(stats.get("avg_score") or 0, 2),
+            "above_min_score": stats.get("approvals", 0),
+            "score_distribution": {
+                str(int(bucket["_id"])): bucket["count"]
+                for bucket in sorted(result["distribution"], key=lambda b: b["_id"])
+            }
+        }
+    return response
@@ -1,10 +1,16 @@
 from fastapi import APIRouter, HTTPException, Request, UploadFile, File, Form
 from typing import Optional, List
 from datetime import datetime, timezone
-from models import Photo, PhotoCreate, HIERARCHY_LEVELS, get_highest_role_level
+from models import Photo, PhotoCreate, HIERARCHY_LEVELS, get_highest_role_level, PUBLIC_PHOTO_PROJECTION, hide_private_photo_fields
 from routes.logs import create_audit_log, get_client_ip
+from storage import receive_upload, get_file_extension
+from blob_store import store_blob, release_blob_ref
+from image_pipeline import schedule_derivatives, apply_variant
+from photo_queue import enqueue, dequeue, release_queue_slots
+from leaderboard import leaderboard_photo_removed
+from ranking_rollups import record_approval, remove_photo_rollups
+from duplicates import duplicate_index
 import uuid
-import os
 import base64
 
 router = APIRouter(prefix="/gallery", tags=["gallery"])
@@ -12,6 +18,9 @@ router = APIRouter(prefix="/gallery", tags=["gallery"])
 # Aircraft types for filtering
 AIRCRAFT_TYPES = ["Airbus", "Boeing", "Embraer", "ATR", "Aviação Geral"]
 
+# Gallery sort orders: field used (falls back to created_at when missing)
+SORT_FIELDS = {"recent": "created_at", "captured": "captured_at"}
+
 async def get_db(request: Request):
     return request.app.state.db
 
@@ -43,10 +52,16 @@ async def require_gestao(request: Request):
 @router.get("")
 async def list_photos(request: Request, aircraft_type: Optional[str] = None, 
                       registration: Optional[str] = None, author: Optional[str] = None,
-                      author_id: Optional[str] = None):
-    """List photos with optional filters (public) - from both gallery and approved photos"""
+                      author_id: Optional[str] = None, size: Optional[str] = "small",
+                      sort: str = "recent"):
+    """List photos with optional filters (public) - from both gallery and approved photos.
+    `sort` is "recent" (upload date) or "captured" (EXIF capture date)"""
     db = await get_db(request)
     
+    if sort not in SORT_FIELDS:
+        raise HTTPException(status_code=400, detail=f"Ordenação inválida. Use: {list(SORT_FIELDS)}")
+    sort_field = SORT_FIELDS[sort]
+    
     # Query for gallery collection (legacy)
     gallery_query = {"approved": True}
     
@@ -67,8 +82,8 @@ async def list_photos(request: Request, aircraft_type: Optional[str] = None,
         photos_query["author_id"] = author_id
     
     # Get photos from both collections
-    gallery_photos = await db.gallery.find(gallery_query, {"_id": 0}).sort("created_at", -1).to_list(500)
-    approved_photos = await db.photos.find(photos_query, {"_id": 0}).sort("created_at", -1).to_list(500)
+    gallery_photos = await db.gallery.find(gallery_query, PUBLIC_PHOTO_PROJECTION).sort(sort_field, -1).to_list(500)
+    approved_photos = await db.photos.find(photos_query, PUBLIC_PHOTO_PROJECTION).sort(sort_field, -1).to_list(500)
     
     # Merge and deduplicate by photo_id
     all_photos = {}
@@ -78,10 +93,14 @@ async def list_photos(request: Request, aircraft_type: Optional[str] = None,
         if photo.get("photo_id") not in all_photos:
             all_photos[photo["photo_id"]] = photo
     
-    # Sort by created_at descending
-    sorted_photos = sorted(all_photos.values(), key=lambda x: x.get("created_at", datetime.min), reverse=True)
+    # Sort descending; photos without EXIF capture date fall back to upload date
+    sorted_photos = sorted(
+        all_photos.values(),
+        key=lambda x: x.get(sort_field) or x.get("created_at") or datetime.min,
+        reverse=True
+    )
     
-    return sorted_photos
+    return [apply_variant(photo, size) for photo in sorted_photos]
 
 @router.get("/types")
 async def get_aircraft_types():
@@ -103,7 +122,12 @@ async def get_photo(request: Request, photo_id: str):
     if not photo:
         raise HTTPException(status_code=404, detail="Photo not found")
     
-    return photo
+    try:
+        from routes.auth import get_current_user_from_request
+        user = await get_current_user_from_request(request)
+    except HTTPException:
+        user = None
+    return hide_private_photo_fields(photo, user)
 
 @router.post("")
 async def upload_photo(
@@ -136,23 +160,18 @@ async def upload_photo(
                 detail=f"Limite de 5 fotos por autor por prefixo atingido para {registration}"
             )
     
-    # Read and save file
-    file_content = await file.read()
-    file_ext = file.filename.split(".")[-1] if "." in file.filename else "jpg"
+    # Stream file to uploads folder (size-capped)
+    file_ext = get_file_extension(file.filename)
     photo_id = f"photo_{uuid.uuid4().hex[:12]}"
-    
-    # Save to uploads folder
-    upload_dir = "/app/backend/uploads"
-    os.makedirs(upload_dir, exist_ok=True)
-    file_path = f"{upload_dir}/{photo_id}.{file_ext}"
-    
-    with open(file_path, "wb") as f:
-        f.write(file_content)
+    stored = await store_blob(db, await receive_upload(file), file_ext)
     
     # Create photo record
     photo_data = {
         "photo_id": photo_id,
-        "url": f"/api/uploads/{photo_id}.{file_ext}",
+        "url": stored["url"],
+        "file_size": stored["size"],
+        "sha256": stored["sha256"],
+        "variants_status": "pending",
         "description": description,
         "aircraft_model": aircraft_model,
         "aircraft_type": aircraft_type,
@@ -167,6 +186,9 @@ async def upload_photo(
     
     await db.gallery.insert_one(photo_data)
     
+    # Generate thumbnails/WebP variants in the background
+    schedule_derivatives(db, "gallery", photo_id, stored["path"])
+    
     return {"photo_id": photo_id, "url": photo_data["url"], "message": "Photo uploaded successfully"}
 
 @router.delete("/{photo_id}")
@@ -197,35 +219,39 @@ async def delete_photo(request: Request, photo_id: str):
     if not is_admin and not is_author:
         raise HTTPException(status_code=403, detail="Not authorized to delete this photo")
     
-    # Delete file
-    try:
-        file_path = f"/app/backend{photo['url'].replace('/api', '')}"
-        if os.path.exists(file_path):
-            os.remove(file_path)
-    except OSError as e:
-        print(f"Warning: Failed to delete file {file_path}: {e}")
-    
     if collection == "gallery":
-        await db.gallery.delete_one({"photo_id": photo_id})
+        deleted = await db.gallery.find_one_and_delete({"photo_id": photo_id}, {"_id": 0, "url": 1})
     else:
-        await db.photos.delete_one({"photo_id": photo_id})
+        deleted = await db.photos.find_one_and_delete({"photo_id": photo_id}, {"_id": 0})
+        duplicate_index.remove(photo_id)
+        if deleted and deleted["status"] == "pending":
+            await dequeue(db, deleted)
+        elif deleted and deleted["status"] == "approved":
+            await leaderboard_photo_removed(db, deleted)
+        if deleted:
+            await remove_photo_rollups(db, deleted)
+    
+    # Drop the file reference (unlinked with its variants when no longer used),
+    # only if this request removed the document: a concurrent delete already did
+    if deleted:
+        await release_blob_ref(db, deleted.get("url"))
     
     return {"message": "Photo deleted"}
 
 @router.get("/by-registration/{registration}")
-async def get_photos_by_registration(request: Request, registration: str):
+async def get_photos_by_registration(request: Request, registration: str, size: Optional[str] = "small"):
     """Get all photos for a specific registration/prefix"""
     db = await get_db(request)
     
     # Get from both collections
     gallery_photos = await db.gallery.find(
         {"registration": registration, "approved": True},
-        {"_id": 0}
+        PUBLIC_PHOTO_PROJECTION
     ).sort("created_at", -1).to_list(100)
     
     approved_photos = await db.photos.find(
         {"registration": registration, "status": "approved"},
-        {"_id": 0}
+        PUBLIC_PHOTO_PROJECTION
     ).sort("created_at", -1).to_list(100)
     
     # Merge
@@ -234,7 +260,46 @@ async def get_photos_by_registration(request: Request, registration: str):
         if p["photo_id"] not in all_photos:
             all_photos[p["photo_id"]] = p
     
-    return list(all_photos.values())
+    return [apply_variant(p, size) for p in all_photos.values()]
+
+async def move_to_queue(db, photo_id: str, source_collection: str, resubmit_data: dict,
+                        queue_fields: dict, user: dict, now: datetime) -> bool:
+    """Move a published photo back to "pending"; False if it is no longer published"""
+    # If photo was in gallery collection, we need to move it to photos collection
+    if source_collection == "gallery":
+        # Remove from gallery
+        result = await db.gallery.delete_one({"photo_id": photo_id})
+        if not result.deleted_count:
+            return False
+        # Insert into photos collection
+        await db.photos.insert_one(resubmit_data)
+        return True
+    
+    # Update existing record in photos collection
+    previous = await db.photos.find_one_and_update(
+        {"photo_id": photo_id, "status": "approved"},
+        {"$set": {
+            "status": "pending",
+            **queue_fields,
+            "final_rating": None,
+            "rating_count": 0,
+            "evaluation_score_sum": 0.0,
+            "evaluation_approvals": 0,
+            "resubmitted_at": now,
+            "resubmitted_by_id": user["user_id"],
+            "resubmitted_by_name": user["name"],
+            "original_status": "approved",
+            "approved_at": None,
+            "rejected_at": None
+        }},
+        projection={"_id": 0, "author_id": 1, "public_rating": 1, "approved_at": 1}
+    )
+    if not previous:
+        return False
+    await leaderboard_photo_removed(db, previous)
+    if previous.get("approved_at"):
+        await record_approval(db, previous, -1)
+    return True
 
 @router.post("/{photo_id}/resubmit")
 async def resubmit_photo_to_evaluation(request: Request, photo_id: str):
@@ -260,8 +325,15 @@ async def resubmit_photo_to_evaluation(request: Request, photo_id: str):
     if not photo:
         raise HTTPException(status_code=404, detail="Foto não encontrada ou já está em avaliação")
     
-    # Get pending count for queue position
-    pending_count = await db.photos.count_documents({"status": "pending"})
+    # Take a queue slot (management resubmissions are not capped by MAX_QUEUE_SIZE);
+    # it is given back below if the photo cannot be moved to the queue
+    slot = await enqueue(db, enforce_limit=False)
+    queue_fields = {
+        "queue_class": slot["queue_class"],
+        "queue_seq": slot["first_seq"],
+        "queue_position": slot["first_position"],
+        "priority": False
+    }
     
     # Prepare the photo data for resubmission
     now = datetime.now(timezone.utc)
@@ -279,11 +351,13 @@ async def resubmit_photo_to_evaluation(request: Request, photo_id: str):
         "author_id": photo.get("author_id"),
         "author_name": photo.get("author_name"),
         "status": "pending",  # Back to pending
-        "queue_position": pending_count + 1,
-        "priority": False,
+        **queue_fields,
         "final_rating": None,
         "rating_count": 0,
+        "evaluation_score_sum": 0.0,
+        "evaluation_approvals": 0,
         "public_rating": 0.0,
+        "public_rating_sum": 0,
         "public_rating_count": 0,
         "comments_count": 0,
         "views": photo.get("views", 0),
@@ -296,30 +370,15 @@ async def resubmit_photo_to_evaluation(request: Request, photo_id: str):
         "rejected_at": None
     }
     
-    # If photo was in gallery collection, we need to move it to photos collection
-    if source_collection == "gallery":
-        # Remove from gallery
-        await db.gallery.delete_one({"photo_id": photo_id})
-        # Insert into photos collection
-        await db.photos.insert_one(resubmit_data)
-    else:
-        # Update existing record in photos collection
-        await db.photos.update_one(
-            {"photo_id": photo_id},
-            {"$set": {
-                "status": "pending",
-                "queue_position": pending_count + 1,
-                "priority": False,
-                "final_rating": None,
-                "rating_count": 0,
-                "resubmitted_at": now,
-                "resubmitted_by_id": user["user_id"],
-                "resubmitted_by_name": user["name"],
-                "original_status": "approved",
-                "approved_at": None,
-                "rejected_at": None
-            }}
-        )
+    try:
+        moved = await move_to_queue(db, photo_id, source_collection, resubmit_data, queue_fields, user, now)
+    except BaseException:
+        await release_queue_slots(db, 1, slot["queue_class"])
+        raise
+    if not moved:
+        # Resubmitted, deleted or changed by someone else meanwhile
+        await release_queue_slots(db, 1, slot["queue_class"])
+        raise HTTPException(status_code=404, detail="Foto não encontrada ou já está em avaliação")
     
     # Delete existing evaluations for this photo
     await db.evaluations.delete_many({"photo_id": photo_id})
@@ -348,14 +407,14 @@ async def resubmit_photo_to_evaluation(request: Request, photo_id: str):
         entity_name=resubmit_data.get("title"),
         details=f"Foto reenviada para avaliação. Autor original: {photo.get('author_name')}",
         old_value={"status": "approved", "source": source_collection},
-        new_value={"status": "pending", "queue_position": pending_count + 1},
+        new_value={"status": "pending", "queue_position": slot["first_position"]},
         ip_address=get_client_ip(request)
     )
     
     return {
         "message": "Foto reenviada para avaliação com sucesso",
         "photo_id": photo_id,
-        "queue_position": pending_count + 1
+        "queue_position": slot["first_position"]
     }
 
 @router.get("/admin/all")
@@ -2,6 +2,7 @@ from fastapi import APIRouter, HTTPException, Request
 from typing import List
 from datetime import datetime, timezone
 from models import Leader, LeaderCreate, LeaderUpdate
+from blob_store import add_blob_ref, replace_blob_ref, release_blob_ref
 import uuid
 
 router = APIRouter(prefix="/leaders", tags=["leaders"])
@@ -36,6 +37,7 @@ async def create_leader(request: Request, leader: LeaderCreate):
     leader_data["created_at"] = datetime.now(timezone.utc)
     
     await db.leaders.insert_one(leader_data)
+    await add_blob_ref(db, leader_data.get("photo_url"))
     
     return {**leader_data, "_id": None}
 
@@ -52,6 +54,8 @@ async def update_leader(request: Request, leader_id: str, update: LeaderUpdate):
     update_data = update.dict(exclude_unset=True)
     if update_data:
         await db.leaders.update_one({"leader_id": leader_id}, {"$set": update_data})
+        if "photo_url" in update_data:
+            await replace_blob_ref(db, existing.get("photo_url"), update_data["photo_url"])
     
     updated = await db.leaders.find_one({"leader_id": leader_id}, {"_id": 0})
     return updated
@@ -62,8 +66,10 @@ async def delete_leader(request: Request, leader_id: str):
     await require_admin(request)
     db = await get_db(request)
     
-    result = await db.leaders.delete_one({"leader_id": leader_id})
-    if result.deleted_count == 0:
+    leader = await db.leaders.find_one_and_delete({"leader_id": leader_id}, {"_id": 0, "photo_url": 1})
+    if not leader:
         raise HTTPException(status_code=404, detail="Leader not found")
     
+    await release_blob_ref(db, leader.get("photo_url"))
+    
     return {"message": "Leader deleted"}
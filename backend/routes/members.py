@@ -1,7 +1,8 @@
 from fastapi import APIRouter, HTTPException, Request
 from datetime import datetime, timezone
-from models import HIERARCHY_LEVELS, get_highest_role_level
+from models import HIERARCHY_LEVELS, get_highest_role_level, PUBLIC_PHOTO_PROJECTION
 from routes.logs import create_audit_log, get_client_ip
+from routes.evaluation import invalidate_evaluator_count
 import uuid
 
 router = APIRouter(prefix="/members", tags=["members"])
@@ -111,7 +112,7 @@ async def get_member(request: Request, user_id: str):
     # Get member's approved photos
     photos = await db.photos.find(
         {"author_id": user_id, "status": "approved"},
-        {"_id": 0}
+        PUBLIC_PHOTO_PROJECTION
     ).sort("approved_at", -1).limit(20).to_list(20)
     
     # Get stats
@@ -167,6 +168,7 @@ async def update_member_tags(request: Request, user_id: str):
         {"user_id": user_id},
         {"$set": {"tags": new_tags, "is_vip": is_vip}}
     )
+    await invalidate_evaluator_count(db)
     
     # Send notification for new tags
     if new_added:
@@ -232,5 +234,6 @@ async def delete_member(request: Request, user_id: str):
     
     await db.users.delete_one({"user_id": user_id})
     await db.user_sessions.delete_many({"user_id": user_id})
+    await invalidate_evaluator_count(db)
     
     return {"message": "Membro excluído"}
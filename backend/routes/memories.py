@@ -2,6 +2,7 @@ from fastapi import APIRouter, HTTPException, Request
 from typing import List
 from datetime import datetime, timezone
 from models import Memory, MemoryCreate, MemoryUpdate
+from blob_store import add_blob_ref, replace_blob_ref, release_blob_ref
 import uuid
 
 router = APIRouter(prefix="/memories", tags=["memories"])
@@ -43,6 +44,7 @@ async def create_memory(request: Request, memory: MemoryCreate):
     memory_data["created_at"] = datetime.now(timezone.utc)
     
     await db.memories.insert_one(memory_data)
+    await add_blob_ref(db, memory_data.get("image_url"))
     
     return {**memory_data, "_id": None}
 
@@ -59,6 +61,8 @@ async def update_memory(request: Request, memory_id: str, update: MemoryUpdate):
     update_data = update.dict(exclude_unset=True)
     if update_data:
         await db.memories.update_one({"memory_id": memory_id}, {"$set": update_data})
+        if "image_url" in update_data:
+            await replace_blob_ref(db, existing.get("image_url"), update_data["image_url"])
     
     updated = await db.memories.find_one({"memory_id": memory_id}, {"_id": 0})
     return updated
@@ -69,8 +73,10 @@ async def delete_memory(request: Request, memory_id: str):
     await require_memories_editor(request)
     db = await get_db(request)
     
-    result = await db.memories.delete_one({"memory_id": memory_id})
-    if result.deleted_count == 0:
+    memory = await db.memories.find_one_and_delete({"memory_id": memory_id}, {"_id": 0, "image_url": 1})
+    if not memory:
         raise HTTPException(status_code=404, detail="Memory not found")
     
+    await release_blob_ref(db, memory.get("image_url"))
+    
     return {"message": "Memory deleted"}
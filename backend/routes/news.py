@@ -2,6 +2,7 @@ from fastapi import APIRouter, HTTPException, Request
 from datetime import datetime, timezone
 from models import HIERARCHY_LEVELS, get_highest_role_level, NewsStatus
 from routes.logs import create_audit_log, get_client_ip
+from blob_store import add_blob_ref, replace_blob_ref, release_blob_ref
 import uuid
 
 router = APIRouter(prefix="/news", tags=["news"])
@@ -173,6 +174,7 @@ async def create_news(request: Request):
     }
     
     await db.news.insert_one(news)
+    await add_blob_ref(db, news["image"])
     
     # Log the action
     status_text = "rascunho" if status == NewsStatus.DRAFT else "publicada"
@@ -235,6 +237,8 @@ async def update_news(request: Request, news_id: str):
     
     if update_data:
         await db.news.update_one({"news_id": news_id}, {"$set": update_data})
+        if "image" in update_data:
+            await replace_blob_ref(db, old_news.get("image"), update_data["image"])
         
         # Log the action
         await create_audit_log(
@@ -303,7 +307,10 @@ async def delete_news(request: Request, news_id: str):
     if not news:
         raise HTTPException(status_code=404, detail="Notícia não encontrada")
     
-    await db.news.delete_one({"news_id": news_id})
+    deleted = await db.news.find_one_and_delete({"news_id": news_id}, {"_id": 0, "image": 1})
+    if not deleted:
+        raise HTTPException(status_code=404, detail="Notícia não encontrada")
+    await release_blob_ref(db, deleted.get("image"))
     
     # Log the action
     await create_audit_log(
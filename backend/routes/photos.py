@@ -1,17 +1,44 @@
 from fastapi import APIRouter, HTTPException, Request, UploadFile, File, Form
+from fastapi.routing import APIRoute
 from typing import Optional
 from datetime import datetime, timezone, timedelta
-from models import Photo, PhotoStatus, PhotoCreate, HIERARCHY_LEVELS, get_highest_role_level, can_interact
-from PIL import Image
+from pydantic import ValidationError
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from models import (
+    Photo, PhotoStatus, PhotoCreate, PhotoUploadMetadata, HIERARCHY_LEVELS, get_highest_role_level, can_interact,
+    PUBLIC_PHOTO_PROJECTION, hide_private_photo_fields
+)
+from storage import receive_upload, discard_upload, get_file_extension, upload_path_from_url, MAX_PHOTO_SIZE
+from blob_store import store_blob, release_blob_ref
+from image_pipeline import schedule_derivatives, apply_variant, verify_image
+from workers import run_io, run_image
+from upload_quota import PHOTOS_PER_WEEK, QUOTA_WEEK, reserve_uploads, cancel_uploads
+from photo_queue import (
+    MAX_QUEUE_SIZE, PRIORITY_POSITIONS, PRIORITY_CLASS,
+    get_queue_counts, get_queue_position, dequeue
+)
+from view_counter import view_counter
+from leaderboard import leaderboard_rating_changed, leaderboard_photo_removed
+from ranking_rollups import record_rating, remove_photo_rollups
+from pagination import encode_time_cursor, older_than_cursor
+from reconcile_ratings import rebuild_rating_aggregates, rating_fields
+from duplicates import duplicate_index, get_dhash, find_near_duplicates, find_duplicate_clusters, INDEXED_STATUSES, DUPLICATE_MAX_DISTANCE
+import asyncio
+import json
+import logging
 import uuid
 import os
-import io
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/photos", tags=["photos"])
 
-MAX_QUEUE_SIZE = 50
-PRIORITY_POSITIONS = 10
-PHOTOS_PER_WEEK = 5
+UPLOAD_TICKET_MINUTES = 10
+MAX_UPLOAD_REQUEST_SIZE = MAX_PHOTO_SIZE + 1024 * 1024  # File plus form fields/multipart overhead
+MAX_BATCH_FILES = 20
+BATCH_WRITE_CONCURRENCY = 4
+COMMENTS_PAGE_SIZE = 20
 
 async def get_db(request: Request):
     return request.app.state.db
@@ -20,6 +47,13 @@ async def get_current_user(request: Request):
     from routes.auth import get_current_user_from_request
     return await get_current_user_from_request(request)
 
+async def get_current_user_optional(request: Request):
+    """Current user, or None when not authenticated"""
+    try:
+        return await get_current_user(request)
+    except HTTPException:
+        return None
+
 async def require_interactive_user(request: Request):
     """Require user to have interactive tags (not just visitante)"""
     user = await get_current_user(request)
@@ -30,8 +64,8 @@ async def require_interactive_user(request: Request):
         )
     return user
 
-async def create_notification(db, user_id: str, notif_type: str, message: str, data: dict = None):
-    notification = {
+def make_notification(user_id: str, notif_type: str, message: str, data: dict = None) -> dict:
+    return {
         "notification_id": f"notif_{uuid.uuid4().hex[:8]}",
         "user_id": user_id,
         "type": notif_type,
@@ -40,33 +74,36 @@ async def create_notification(db, user_id: str, notif_type: str, message: str, d
         "read": False,
         "created_at": datetime.now(timezone.utc)
     }
-    await db.notifications.insert_one(notification)
+
+async def create_notification(db, user_id: str, notif_type: str, message: str, data: dict = None):
+    await db.notifications.insert_one(make_notification(user_id, notif_type, message, data))
 
 @router.get("")
 async def list_photos(request: Request, status: Optional[str] = "approved", 
-                      aircraft_type: Optional[str] = None, limit: int = 50):
-    """List approved photos (public)"""
+                      aircraft_type: Optional[str] = None, limit: int = 50,
+                      size: Optional[str] = "small"):
+    """List approved photos (public). `size` selects the image variant (small/medium/large/original)"""
     db = await get_db(request)
     
     query = {"status": status}
     if aircraft_type:
         query["aircraft_type"] = aircraft_type
     
-    photos = await db.photos.find(query, {"_id": 0}).sort("approved_at", -1).limit(limit).to_list(limit)
-    return photos
+    photos = await db.photos.find(query, PUBLIC_PHOTO_PROJECTION).sort("approved_at", -1).limit(limit).to_list(limit)
+    return [apply_variant(photo, size) for photo in photos]
 
 @router.get("/queue")
 async def get_queue_status(request: Request):
     """Get current queue status"""
     db = await get_db(request)
     
-    pending_count = await db.photos.count_documents({"status": "pending"})
+    counts = await get_queue_counts(db)
     
     return {
-        "current": pending_count,
+        "current": counts["pending"],
         "max": MAX_QUEUE_SIZE,
-        "is_full": pending_count >= MAX_QUEUE_SIZE,
-        "priority_slots_used": min(pending_count, PRIORITY_POSITIONS)
+        "is_full": counts["pending"] >= MAX_QUEUE_SIZE,
+        "priority_slots_used": min(counts["priority_pending"], PRIORITY_POSITIONS)
     }
 
 @router.get("/my")
@@ -80,8 +117,10 @@ async def get_my_photos(request: Request):
         {"_id": 0}
     ).sort("created_at", -1).to_list(100)
     
-    # Add evaluation comments for each photo
+    # Add evaluation comments (and live queue position) for each photo
     for photo in photos:
+        if photo["status"] == "pending":
+            photo["queue_position"] = await get_queue_position(db, photo)
         # Get the latest evaluation for this photo
         evaluation = await db.evaluations.find_one(
             {"photo_id": photo["photo_id"]},
@@ -94,56 +133,32 @@ async def get_my_photos(request: Request):
     
     return photos
 
-@router.post("")
-async def upload_photo(
-    request: Request,
-    title: str = Form(...),
-    description: Optional[str] = Form(None),
-    aircraft_model: str = Form(...),
-    aircraft_type: str = Form(...),
-    registration: Optional[str] = Form(None),
-    airline: Optional[str] = Form(None),
-    location: Optional[str] = Form(None),
-    photo_date: str = Form(...),
-    credits: Optional[str] = Form(None),
-    is_own_photo: Optional[str] = Form("true"),
-    file: UploadFile = File(...)
-):
-    """Upload a new photo"""
-    user = await require_interactive_user(request)  # Verifica se não é visitante
-    db = await get_db(request)
-    
-    # Convert is_own_photo string to boolean
-    is_own = is_own_photo.lower() == "true" if is_own_photo else True
-    
+async def check_upload_quota(db, user: dict) -> dict:
+    """
+    Read-only check of approval, queue capacity and weekly limit (preflight).
+    Nothing is reserved: uploads reserve atomically with reserve_uploads.
+    """
     if not user.get("approved", False):
         raise HTTPException(status_code=403, detail="Usuário não aprovado para upload")
     
     # Check queue
-    pending_count = await db.photos.count_documents({"status": "pending"})
-    if pending_count >= MAX_QUEUE_SIZE:
-        await create_notification(
-            db, user["user_id"], "queue_full",
-            "⏳ A fila de aprovação está cheia no momento. Tente novamente mais tarde."
-        )
+    counts = await get_queue_counts(db)
+    if counts["pending"] >= MAX_QUEUE_SIZE:
         raise HTTPException(status_code=429, detail="Fila de aprovação cheia. Tente mais tarde.")
     
-    # Check weekly limit
-    user_data = await db.users.find_one({"user_id": user["user_id"]}, {"_id": 0})
-    is_colaborador = "colaborador" in user_data.get("tags", [])
-    is_unlimited = user_data.get("subscription_type") == "unlimited"
-    
-    # Reset weekly counter if needed
-    week_start = user_data.get("week_start")
-    now = datetime.now(timezone.utc)
-    if not week_start or (now - week_start.replace(tzinfo=timezone.utc if week_start.tzinfo is None else week_start.tzinfo)).days >= 7:
-        await db.users.update_one(
-            {"user_id": user["user_id"]},
-            {"$set": {"week_start": now, "photos_this_week": 0}}
-        )
-        user_data["photos_this_week"] = 0
+    # Check weekly limit (user document was already loaded by authentication)
+    is_colaborador = "colaborador" in user.get("tags", [])
+    if is_colaborador and counts["priority_pending"] < PRIORITY_POSITIONS:
+        next_position = counts["priority_pending"] + 1
+    else:
+        next_position = counts["pending"] + 1
+    is_unlimited = user.get("subscription_type") == "unlimited"
     
-    photos_this_week = user_data.get("photos_this_week", 0)
+    # An expired week counts as empty
+    week_start = user.get("week_start")
+    photos_this_week = user.get("photos_this_week", 0)
+    if not week_start or datetime.now(timezone.utc) - week_start.replace(tzinfo=week_start.tzinfo or timezone.utc) >= QUOTA_WEEK:
+        photos_this_week = 0
     
     if not is_unlimited and not is_colaborador:
         if photos_this_week >= PHOTOS_PER_WEEK:
@@ -152,89 +167,386 @@ async def upload_photo(
                 detail=f"Limite semanal de {PHOTOS_PER_WEEK} fotos atingido. Faça upgrade para enviar mais."
             )
     
-    # Save file
-    file_content = await file.read()
-    file_ext = file.filename.split(".")[-1] if "." in file.filename else "jpg"
-    photo_id = f"photo_{uuid.uuid4().hex[:12]}"
+    return {
+        "pending_count": counts["pending"],
+        "next_position": next_position,
+        "is_colaborador": is_colaborador,
+        "is_unlimited": is_unlimited,
+        "photos_this_week": photos_this_week
+    }
+
+async def upload_precheck(request: Request):
+    """
+    Authenticate and reserve quota/queue position from headers only, before the
+    multipart body is read. An X-Upload-Ticket from /preflight is single use.
+    """
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > MAX_UPLOAD_REQUEST_SIZE:
+        raise HTTPException(status_code=413, detail=f"Arquivo muito grande. Máximo {MAX_PHOTO_SIZE // (1024 * 1024)}MB")
     
-    upload_dir = "/app/backend/uploads"
-    os.makedirs(upload_dir, exist_ok=True)
-    file_path = f"{upload_dir}/{photo_id}.{file_ext}"
+    user = await require_interactive_user(request)  # Verifica se não é visitante
+    db = await get_db(request)
     
-    with open(file_path, "wb") as f:
-        f.write(file_content)
+    ticket_id = request.headers.get("x-upload-ticket")
+    if ticket_id:
+        # Single use: mark as used atomically
+        ticket = await db.upload_tickets.find_one_and_update(
+            {
+                "ticket_id": ticket_id,
+                "user_id": user["user_id"],
+                "used": False,
+                "expires_at": {"$gt": datetime.now(timezone.utc)}
+            },
+            {"$set": {"used": True}},
+            projection={"_id": 0}
+        )
+        if not ticket:
+            raise HTTPException(status_code=409, detail="Ticket de upload inválido ou expirado")
     
-    # Calculate queue position
-    if is_colaborador and pending_count < PRIORITY_POSITIONS:
-        queue_position = pending_count + 1
-        priority = True
-    else:
-        queue_position = pending_count + 1
-        priority = False
+    request.state.upload_user = user
+    request.state.upload_check = await reserve_uploads(db, user)
+
+class UploadPrecheckRoute(APIRoute):
+    """Route that runs upload_precheck before FastAPI parses the multipart form"""
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+        
+        async def prechecked_handler(request: Request):
+            await upload_precheck(request)
+            try:
+                return await handler(request)
+            except BaseException:
+                # Upload failed after the reservation: give the slot back
+                await cancel_uploads(
+                    request.app.state.db, request.state.upload_user["user_id"],
+                    1, request.state.upload_check["queue_class"]
+                )
+                raise
+        
+        return prechecked_handler
+
+@router.post("/preflight")
+async def upload_preflight(request: Request):
+    """Cheap pre-upload check (quota, queue, approval). Returns a short-lived upload ticket"""
+    user = await require_interactive_user(request)
+    db = await get_db(request)
     
-    # Create photo record
-    photo_data = {
-        "photo_id": photo_id,
-        "url": f"/api/uploads/{photo_id}.{file_ext}",
-        "title": title,
-        "description": description,
-        "aircraft_model": aircraft_model,
-        "aircraft_type": aircraft_type,
-        "registration": registration,
-        "airline": airline,
-        "location": location,
-        "photo_date": photo_date,
+    check = await check_upload_quota(db, user)
+    now = datetime.now(timezone.utc)
+    
+    ticket = {
+        "ticket_id": f"ticket_{uuid.uuid4().hex}",
+        "user_id": user["user_id"],
+        "used": False,
+        "created_at": now,
+        "expires_at": now + timedelta(minutes=UPLOAD_TICKET_MINUTES)
+    }
+    await db.upload_tickets.insert_one(ticket)
+    
+    remaining = None
+    if not check["is_unlimited"] and not check["is_colaborador"]:
+        remaining = PHOTOS_PER_WEEK - check["photos_this_week"]
+    
+    return {
+        "ticket": ticket["ticket_id"],
+        "expires_at": ticket["expires_at"],
+        "queue_position": check["next_position"],
+        "remaining_this_week": remaining,
+        "max_file_size": MAX_PHOTO_SIZE
+    }
+
+def build_photo_document(user: dict, stored: dict, data: dict, check: dict, offset: int,
+                         dhash: Optional[str], similar: list) -> dict:
+    """
+    Photo record for a stored upload entering the evaluation queue.
+    Takes the `offset`-th slot of the reservation in `check`.
+    """
+    is_own = data.get("is_own_photo", True)
+    return {
+        "photo_id": f"photo_{uuid.uuid4().hex[:12]}",
+        "url": stored["url"],
+        "file_size": stored["size"],
+        "sha256": stored["sha256"],
+        "dhash": dhash,
+        "near_duplicates": [{"photo_id": p["photo_id"], "distance": p["distance"]} for p in similar],
+        "variants_status": "pending",
+        "title": data["title"],
+        "description": data.get("description"),
+        "aircraft_model": data["aircraft_model"],
+        "aircraft_type": data["aircraft_type"],
+        "registration": data.get("registration"),
+        "airline": data.get("airline"),
+        "location": data.get("location"),
+        "photo_date": data["photo_date"],
         "author_id": user["user_id"],
         "author_name": user["name"],
         "status": "pending",
-        "queue_position": queue_position,
-        "priority": priority,
+        "queue_class": check["queue_class"],
+        "queue_seq": check["first_seq"] + offset,
+        "queue_position": check["first_position"] + offset,  # Position at upload time
+        "priority": check["queue_class"] == PRIORITY_CLASS,
         "final_rating": None,
         "rating_count": 0,
+        "evaluation_score_sum": 0.0,
+        "evaluation_approvals": 0,
         "public_rating": 0.0,
+        "public_rating_sum": 0,
         "public_rating_count": 0,
         "comments_count": 0,
         "views": 0,
-        "credits": credits if not is_own else None,
+        "credits": data.get("credits") if not is_own else None,
         "is_own_photo": is_own,
         "created_at": datetime.now(timezone.utc)
     }
-    
+
+def photo_sent_notification(photo: dict) -> dict:
+    return make_notification(
+        photo["author_id"], "photo_sent",
+        f"Sua foto '{photo['title']}' foi enviada com sucesso e está aguardando avaliação. Posição na fila: {photo['queue_position']}",
+        {"photo_id": photo["photo_id"]}
+    )
+
+async def create_photo(db, user: dict, check: dict, stored: dict, data: dict) -> dict:
+    """
+    Create the photo record for a stored upload and queue it for evaluation.
+    `check` is the reservation from reserve_uploads. Shared by the
+    single-request and resumable upload flows.
+    """
+    # Perceptual hash: flag near-duplicates of photos already approved/in the queue
+    dhash = await get_dhash(db, stored)
+    similar = await find_near_duplicates(db, dhash)
+    
+    photo_data = build_photo_document(user, stored, data, check, 0, dhash, similar)
+    photo_id = photo_data["photo_id"]
     await db.photos.insert_one(photo_data)
+    duplicate_index.add(photo_id, dhash)
     
-    # Update user's weekly count
-    await db.users.update_one(
-        {"user_id": user["user_id"]},
-        {"$inc": {"photos_this_week": 1}}
-    )
+    # Generate thumbnails/WebP variants in the background
+    schedule_derivatives(db, "photos", photo_id, stored["path"])
     
     # Send notification
-    await create_notification(
-        db, user["user_id"], "photo_sent",
-        f"Sua foto '{title}' foi enviada com sucesso e está aguardando avaliação. Posição na fila: {queue_position}",
-        {"photo_id": photo_id}
-    )
+    await db.notifications.insert_one(photo_sent_notification(photo_data))
+    
+    return {
+        "photo_id": photo_id,
+        "queue_position": photo_data["queue_position"],
+        "similar_photos": similar,
+        "message": "Foto enviada para avaliação"
+    }
+
+async def upload_photo(
+    request: Request,
+    title: str = Form(...),
+    description: Optional[str] = Form(None),
+    aircraft_model: str = Form(...),
+    aircraft_type: str = Form(...),
+    registration: Optional[str] = Form(None),
+    airline: Optional[str] = Form(None),
+    location: Optional[str] = Form(None),
+    photo_date: str = Form(...),
+    credits: Optional[str] = Form(None),
+    is_own_photo: Optional[str] = Form("true"),
+    file: UploadFile = File(...)
+):
+    """Upload a new photo (auth, queue and quota are checked before the body is read)"""
+    db = await get_db(request)
+    
+    # Save file (streamed to disk, size-capped)
+    file_ext = get_file_extension(file.filename)
+    stored = await store_blob(db, await receive_upload(file), file_ext)
+    
+    return await create_photo(db, request.state.upload_user, request.state.upload_check, stored, {
+        "title": title,
+        "description": description,
+        "aircraft_model": aircraft_model,
+        "aircraft_type": aircraft_type,
+        "registration": registration,
+        "airline": airline,
+        "location": location,
+        "photo_date": photo_date,
+        "credits": credits,
+        # Convert is_own_photo string to boolean
+        "is_own_photo": is_own_photo.lower() == "true" if is_own_photo else True
+    })
+
+router.add_api_route("", upload_photo, methods=["POST"], route_class_override=UploadPrecheckRoute)
+
+@router.post("/batch")
+async def upload_photo_batch(request: Request):
+    """
+    Upload several photos at once (multipart): repeated `files` plus a `metadata`
+    JSON array with one object per file (same fields as POST /photos).
+    Returns one result per file.
+    """
+    user = await require_interactive_user(request)
+    db = await get_db(request)
+    
+    # Quota and queue are checked before the body is read, and the body may only
+    # hold as many photos as the user can still queue
+    preflight = await check_upload_quota(db, user)
+    max_files = min(MAX_BATCH_FILES, MAX_QUEUE_SIZE - preflight["pending_count"])
+    if not preflight["is_unlimited"] and not preflight["is_colaborador"]:
+        max_files = min(max_files, PHOTOS_PER_WEEK - preflight["photos_this_week"])
+    
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > max_files * MAX_UPLOAD_REQUEST_SIZE:
+        raise HTTPException(status_code=413, detail=f"Lote muito grande. Máximo {max_files} foto(s) de {MAX_PHOTO_SIZE // (1024 * 1024)}MB")
+    
+    form = await request.form(max_files=max_files, max_fields=max_files + 10)
+    files = [f for f in form.getlist("files") if not isinstance(f, str)]
+    if not files:
+        raise HTTPException(status_code=400, detail="Nenhum arquivo enviado")
+    
+    try:
+        raw_metadata = json.loads(form.get("metadata") or "[]")
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Metadados inválidos")
+    if not isinstance(raw_metadata, list) or not all(isinstance(item, dict) for item in raw_metadata):
+        raise HTTPException(status_code=400, detail="Metadados devem ser uma lista de objetos")
+    if len(raw_metadata) != len(files):
+        raise HTTPException(status_code=400, detail="Envie um objeto de metadados para cada arquivo")
+    
+    items = []
+    for index, item in enumerate(raw_metadata):
+        try:
+            items.append(PhotoUploadMetadata(**item).dict())
+        except ValidationError:
+            raise HTTPException(status_code=400, detail=f"Metadados inválidos para a foto {index + 1}")
+    
+    # One atomic quota and queue reservation for the whole batch
+    check = await reserve_uploads(db, user, len(files))
+    
+    # Write files concurrently (bounded) and hash them
+    semaphore = asyncio.Semaphore(BATCH_WRITE_CONCURRENCY)
+    
+    async def store_item(file):
+        async with semaphore:
+            stored = await store_blob(db, await receive_upload(file), get_file_extension(file.filename))
+            try:
+                return stored, await get_dhash(db, stored)
+            except BaseException:
+                # No photo will point to the blob: drop the reference store_blob took
+                await release_blob_ref(db, stored["url"])
+                raise
+    
+    outcomes = await asyncio.gather(*(store_item(f) for f in files), return_exceptions=True)
+    
+    results = []
+    photos = []
+    for index, (file, data, outcome) in enumerate(zip(files, items, outcomes)):
+        if isinstance(outcome, BaseException):
+            if not isinstance(outcome, HTTPException):
+                logger.error(f"Batch upload failed for {file.filename}: {outcome}")
+            detail = outcome.detail if isinstance(outcome, HTTPException) else "Erro ao salvar arquivo"
+            results.append({"index": index, "filename": file.filename, "success": False, "error": detail})
+            continue
+        
+        stored, dhash = outcome
+        similar = await find_near_duplicates(db, dhash)
+        photo = build_photo_document(user, stored, data, check, len(photos), dhash, similar)
+        photos.append(photo)
+        results.append({
+            "index": index,
+            "filename": file.filename,
+            "success": True,
+            "photo_id": photo["photo_id"],
+            "queue_position": photo["queue_position"],
+            "similar_photos": similar
+        })
+    
+    # Give back quota and queue slots reserved for files that were not stored
+    failed = len(files) - len(photos)
+    await cancel_uploads(db, user["user_id"], failed, check["queue_class"])
+    
+    if photos:
+        try:
+            await db.photos.insert_many(photos)
+            await db.notifications.insert_many([photo_sent_notification(photo) for photo in photos])
+        except BaseException:
+            # Undo the stored part of the batch: records, reservation and blob references
+            await db.photos.delete_many({"photo_id": {"$in": [photo["photo_id"] for photo in photos]}})
+            await cancel_uploads(db, user["user_id"], len(photos), check["queue_class"])
+            for photo in photos:
+                await release_blob_ref(db, photo["url"])
+            raise
+        for photo in photos:
+            duplicate_index.add(photo["photo_id"], photo["dhash"])
+            schedule_derivatives(db, "photos", photo["photo_id"], upload_path_from_url(photo["url"]))
+    
+    return {"uploaded": len(photos), "failed": failed, "results": results}
+
+@router.get("/duplicates")
+async def list_duplicate_clusters(request: Request, max_distance: int = DUPLICATE_MAX_DISTANCE):
+    """List clusters of near-duplicate approved/pending photos (admin)"""
+    user = await get_current_user(request)
+    db = await get_db(request)
+    
+    user_tags = user.get("tags", [])
+    if not any(tag in user_tags for tag in ["admin", "gestao", "lider"]):
+        raise HTTPException(status_code=403, detail="Acesso negado")
     
-    return {"photo_id": photo_id, "queue_position": queue_position, "message": "Foto enviada para avaliação"}
+    clusters = await find_duplicate_clusters(db, max_distance)
+    
+    # Confirm current status (the in-memory index may lag behind other workers)
+    photo_ids = [photo_id for cluster in clusters for photo_id in cluster]
+    photos = await db.photos.find(
+        {"photo_id": {"$in": photo_ids}, "status": {"$in": INDEXED_STATUSES}},
+        {"_id": 0, "photo_id": 1, "title": 1, "url": 1, "thumbnail_url": 1, "status": 1,
+         "registration": 1, "author_id": 1, "author_name": 1, "created_at": 1}
+    ).to_list(len(photo_ids))
+    by_id = {p["photo_id"]: p for p in photos}
+    
+    result = []
+    for cluster in clusters:
+        members = [by_id[photo_id] for photo_id in cluster if photo_id in by_id]
+        if len(members) > 1:
+            result.append({"size": len(members), "photos": members})
+    result.sort(key=lambda c: c["size"], reverse=True)
+    
+    return {"total_clusters": len(result), "clusters": result}
 
 @router.get("/{photo_id}")
-async def get_photo(request: Request, photo_id: str):
+async def get_photo(request: Request, photo_id: str, comments_limit: int = COMMENTS_PAGE_SIZE):
     """Get single photo details"""
     db = await get_db(request)
     
     photo = await db.photos.find_one({"photo_id": photo_id}, {"_id": 0})
     if not photo:
         raise HTTPException(status_code=404, detail="Foto não encontrada")
+    hide_private_photo_fields(photo, await get_current_user_optional(request))
     
-    # Increment views
-    await db.photos.update_one({"photo_id": photo_id}, {"$inc": {"views": 1}})
+    # Count the view (buffered and written in batches)
+    view_counter.record(db, photo_id)
+    photo["views"] = photo.get("views", 0) + view_counter.pending(photo_id)
     
-    # Get comments
-    comments = await db.comments.find({"photo_id": photo_id}, {"_id": 0}).sort("created_at", -1).to_list(100)
-    photo["comments"] = comments
+    # First page of comments only (comments_count is on the photo); 0 skips them
+    if comments_limit > 0:
+        page = await get_comments_page(db, photo_id, None, comments_limit)
+        photo["comments"] = page["comments"]
+        photo["comments_next_cursor"] = page["next_cursor"]
     
     return photo
 
+async def get_comments_page(db, photo_id: str, cursor: Optional[str], limit: int) -> dict:
+    """Newest-first page of a photo's comments (index photo_id + created_at + comment_id)"""
+    limit = max(1, min(limit, COMMENTS_PAGE_SIZE))
+    comments = await db.comments.find(
+        {"photo_id": photo_id, **older_than_cursor(cursor, "comment_id")},
+        {"_id": 0}
+    ).sort([("created_at", -1), ("comment_id", -1)]).limit(limit + 1).to_list(limit + 1)
+    
+    next_cursor = None
+    if len(comments) > limit:
+        comments = comments[:limit]
+        next_cursor = encode_time_cursor(comments[-1]["created_at"], comments[-1]["comment_id"])
+    return {"comments": comments, "next_cursor": next_cursor}
+
+@router.get("/{photo_id}/comments")
+async def list_comments(request: Request, photo_id: str, cursor: Optional[str] = None, limit: int = COMMENTS_PAGE_SIZE):
+    """Comments of a photo, newest first. Pass `next_cursor` back as `cursor`"""
+    db = await get_db(request)
+    return await get_comments_page(db, photo_id, cursor, limit)
+
 @router.post("/{photo_id}/rate")
 async def rate_photo(request: Request, photo_id: str):
     """Public rating (1-5 stars)"""
@@ -246,42 +558,72 @@ async def rate_photo(request: Request, photo_id: str):
     if not rating or rating < 1 or rating > 5:
         raise HTTPException(status_code=400, detail="Rating deve ser entre 1 e 5")
     
-    photo = await db.photos.find_one({"photo_id": photo_id}, {"_id": 0})
+    photo = await db.photos.find_one(
+        {"photo_id": photo_id},
+        {"_id": 0, "photo_id": 1, "author_id": 1, "status": 1, "public_rating_sum": 1, "public_rating_count": 1, "public_rating": 1}
+    )
     if not photo or photo["status"] != "approved":
         raise HTTPException(status_code=404, detail="Foto não encontrada ou não aprovada")
     
-    # Check if already rated
-    existing = await db.public_ratings.find_one({
-        "photo_id": photo_id,
-        "user_id": user["user_id"]
-    })
+    # Insert or change this user's rating in one upsert (unique photo_id + user_id);
+    # the previous value gives the delta for the photo aggregates
+    previous = await upsert_public_rating(db, photo_id, user["user_id"], rating)
+    await record_rating(db, photo, rating, previous)
     
-    if existing:
-        # Update existing rating
-        await db.public_ratings.update_one(
-            {"rating_id": existing["rating_id"]},
-            {"$set": {"rating": rating}}
-        )
-    else:
-        # New rating
-        await db.public_ratings.insert_one({
-            "rating_id": f"rating_{uuid.uuid4().hex[:8]}",
-            "photo_id": photo_id,
-            "user_id": user["user_id"],
-            "rating": rating,
-            "created_at": datetime.now(timezone.utc)
-        })
+    if "public_rating_sum" not in photo:
+        # Rated before the aggregates existed: rebuild them from the ratings once
+        await rebuild_rating_aggregates(db, [photo])
+        updated = await db.photos.find_one({"photo_id": photo_id}, {"_id": 0, "author_id": 1, "public_rating": 1})
+        await leaderboard_rating_changed(db, updated, photo.get("public_rating"), updated["public_rating"])
+        return {"message": "Avaliação registrada", "new_average": updated["public_rating"]}
     
-    # Recalculate average
-    ratings = await db.public_ratings.find({"photo_id": photo_id}).to_list(1000)
-    avg = sum(r["rating"] for r in ratings) / len(ratings) if ratings else 0
-    
-    await db.photos.update_one(
+    updated = await db.photos.find_one_and_update(
         {"photo_id": photo_id},
-        {"$set": {"public_rating": round(avg, 2), "public_rating_count": len(ratings)}}
+        {"$inc": {
+            "public_rating_sum": rating - (previous["rating"] if previous else 0),
+            "public_rating_count": 0 if previous else 1
+        }},
+        projection={"_id": 0, "public_rating_sum": 1, "public_rating_count": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    if not updated:
+        raise HTTPException(status_code=404, detail="Foto não encontrada ou não aprovada")
+    
+    # Mean for exactly these totals: if another rating landed meanwhile, its own
+    # update writes the newer mean
+    fields = rating_fields(updated["public_rating_sum"], updated["public_rating_count"])
+    previous_mean = await db.photos.find_one_and_update(
+        {"photo_id": photo_id, "public_rating_sum": fields["public_rating_sum"], "public_rating_count": fields["public_rating_count"]},
+        {"$set": {"public_rating": fields["public_rating"]}},
+        projection={"_id": 0, "author_id": 1, "status": 1, "public_rating": 1}
     )
+    # The author's leaderboard entry moves by exactly the mean this write replaced
+    if previous_mean and previous_mean["status"] == "approved":
+        await leaderboard_rating_changed(db, previous_mean, previous_mean.get("public_rating"), fields["public_rating"])
     
-    return {"message": "Avaliação registrada", "new_average": round(avg, 2)}
+    return {"message": "Avaliação registrada", "new_average": fields["public_rating"]}
+
+async def upsert_public_rating(db, photo_id: str, user_id: str, rating: int) -> Optional[dict]:
+    """Set a user's rating for a photo; returns the previous rating document (None if new)"""
+    for attempt in range(2):
+        try:
+            return await db.public_ratings.find_one_and_update(
+                {"photo_id": photo_id, "user_id": user_id},
+                {
+                    "$set": {"rating": rating, "updated_at": datetime.now(timezone.utc)},
+                    "$setOnInsert": {
+                        "rating_id": f"rating_{uuid.uuid4().hex[:8]}",
+                        "created_at": datetime.now(timezone.utc)
+                    }
+                },
+                projection={"_id": 0, "rating": 1, "created_at": 1, "updated_at": 1},
+                upsert=True,
+                return_document=ReturnDocument.BEFORE
+            )
+        except DuplicateKeyError:
+            # Concurrent first rating by the same user: the retry updates it
+            if attempt:
+                raise
 
 @router.post("/{photo_id}/comment")
 async def add_comment(request: Request, photo_id: str):
@@ -294,10 +636,6 @@ async def add_comment(request: Request, photo_id: str):
     if not content or len(content.strip()) == 0:
         raise HTTPException(status_code=400, detail="Comentário não pode ser vazio")
     
-    photo = await db.photos.find_one({"photo_id": photo_id}, {"_id": 0})
-    if not photo or photo["status"] != "approved":
-        raise HTTPException(status_code=404, detail="Foto não encontrada")
-    
     comment = {
         "comment_id": f"comment_{uuid.uuid4().hex[:8]}",
         "photo_id": photo_id,
@@ -308,8 +646,20 @@ async def add_comment(request: Request, photo_id: str):
         "created_at": datetime.now(timezone.utc)
     }
     
-    await db.comments.insert_one(comment)
-    await db.photos.update_one({"photo_id": photo_id}, {"$inc": {"comments_count": 1}})
+    # Two sequential writes (count, then insert) rather than one concurrent round
+    # trip: the counter update only matches approved photos and doubles as the
+    # existence check, so a comment is never visible on a photo that did not
+    # count it. A failed insert takes the count back
+    counted = await db.photos.update_one(
+        {"photo_id": photo_id, "status": "approved"}, {"$inc": {"comments_count": 1}}
+    )
+    if not counted.matched_count:
+        raise HTTPException(status_code=404, detail="Foto não encontrada")
+    try:
+        await db.comments.insert_one(comment)
+    except BaseException:
+        await db.photos.update_one({"photo_id": photo_id}, {"$inc": {"comments_count": -1}})
+        raise
     
     return {"comment_id": comment["comment_id"], "message": "Comentário adicionado"}
 
@@ -330,15 +680,17 @@ async def delete_photo(request: Request, photo_id: str):
     if not is_author and not is_admin:
         raise HTTPException(status_code=403, detail="Sem permissão para excluir")
     
-    # Delete file
-    try:
-        file_path = f"/app/backend{photo['url'].replace('/api', '')}"
-        if os.path.exists(file_path):
-            os.remove(file_path)
-    except OSError as e:
-        print(f"Warning: Failed to delete file {file_path}: {e}")
-    
-    await db.photos.delete_one({"photo_id": photo_id})
+    deleted = await db.photos.find_one_and_delete({"photo_id": photo_id}, {"_id": 0})
+    duplicate_index.remove(photo_id)
+    if deleted and deleted["status"] == "pending":
+        await dequeue(db, deleted)
+    elif deleted and deleted["status"] == "approved":
+        await leaderboard_photo_removed(db, deleted)
+    if deleted:
+        await remove_photo_rollups(db, deleted)
+        # Drop the file reference (unlinked with its variants when no longer
+        # used), only if this request removed the photo
+        await release_blob_ref(db, deleted.get("url"))
     await db.comments.delete_many({"photo_id": photo_id})
     await db.public_ratings.delete_many({"photo_id": photo_id})
     await db.evaluations.delete_many({"photo_id": photo_id})
@@ -365,13 +717,14 @@ async def check_missing_files(request: Request):
     missing_files = []
     existing_files = []
     
-    for photo in photos:
+    # Check every file in one I/O worker call instead of stat-ing on the event loop
+    paths = [upload_path_from_url(photo.get("url", "")) for photo in photos]
+    exists = await run_io(lambda: [bool(path) and os.path.exists(path) for path in paths])
+    
+    for photo, file_path, file_exists in zip(photos, paths, exists):
         url = photo.get("url", "")
-        if url.startswith("/api/uploads/"):
-            filename = url.split("/")[-1]
-            file_path = f"/app/backend/uploads/{filename}"
-            
-            if not os.path.exists(file_path):
+        if file_path:
+            if not file_exists:
                 missing_files.append({
                     "photo_id": photo.get("photo_id"),
                     "title": photo.get("title"),
@@ -433,38 +786,45 @@ async def reupload_photo_file(
     if not photo:
         raise HTTPException(status_code=404, detail="Foto não encontrada")
     
-    # Read and validate file
-    file_content = await file.read()
-    
-    if len(file_content) > 15 * 1024 * 1024:
-        raise HTTPException(status_code=400, detail="Arquivo muito grande. Máximo 15MB")
+    # Receive file (streamed to a temp file, max 15MB)
+    staged = await receive_upload(file)
     
-    # Validate image
+    # Validate image before replacing the stored file
     try:
-        img = Image.open(io.BytesIO(file_content))
-        img.verify()
+        await run_image(verify_image, staged["tmp_path"])
     except Exception:
+        await discard_upload(staged)
         raise HTTPException(status_code=400, detail="Arquivo de imagem inválido")
     
-    # Save file
-    file_ext = file.filename.split(".")[-1].lower() if "." in file.filename else "jpg"
-    if file_ext not in ["jpg", "jpeg", "png", "webp"]:
-        file_ext = "jpg"
+    # Save file as a content-addressed blob
+    file_ext = get_file_extension(file.filename, ["jpg", "jpeg", "png", "webp"])
+    await store_blob(db, staged, file_ext)
+    file_path = staged["path"]
+    dhash = await get_dhash(db, staged)
     
-    new_filename = f"{photo_id}.{file_ext}"
-    upload_dir = "/app/backend/uploads"
-    os.makedirs(upload_dir, exist_ok=True)
-    file_path = f"{upload_dir}/{new_filename}"
-    
-    with open(file_path, "wb") as f:
-        f.write(file_content)
-    
-    # Update photo URL and remove dismissed flag
-    new_url = f"/api/uploads/{new_filename}"
+    # Update photo URL (and drop stale variants) and remove dismissed flag
+    new_url = staged["url"]
     await db.photos.update_one(
         {"photo_id": photo_id}, 
-        {"$set": {"url": new_url, "missing_dismissed": False, "updated_at": datetime.now(timezone.utc)}}
+        {"$set": {
+            "url": new_url,
+            "file_size": staged["size"],
+            "sha256": staged["sha256"],
+            "dhash": dhash,
+            "variants": None,
+            "thumbnail_url": None,
+            "variants_status": "pending",
+            "missing_dismissed": False,
+            "updated_at": datetime.now(timezone.utc)
+        }}
     )
     
+    if photo.get("status") in INDEXED_STATUSES:
+        duplicate_index.add(photo_id, dhash)
+    
+    # Release the previous file and regenerate variants from the new one
+    await release_blob_ref(db, photo.get("url"))
+    schedule_derivatives(db, "photos", photo_id, file_path)
+    
     return {"message": "Arquivo reenviado com sucesso", "photo_id": photo_id, "url": new_url}
 
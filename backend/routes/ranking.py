@@ -1,31 +1,73 @@
 from fastapi import APIRouter, HTTPException, Request
+from typing import Optional
 from datetime import datetime, timezone
-from models import HIERARCHY_LEVELS, get_highest_role_level
+from models import HIERARCHY_LEVELS, get_highest_role_level, PUBLIC_PHOTO_PROJECTION, PRIVATE_PHOTO_FIELDS
+from image_pipeline import apply_variant
+from ranking_rollups import window_range, windowed_photo_totals, windowed_author_totals
 
 router = APIRouter(prefix="/ranking", tags=["ranking"])
 
+DEFAULT_AUTHOR_NAME = "Usuário"  # Shown when the author has no (or a null) name
+
 async def get_db(request: Request):
     return request.app.state.db
 
+def resolve_window(window: Optional[str], start: Optional[str], end: Optional[str]) -> Optional[tuple]:
+    """(first_day, end_day) of a ranking window, None for all-time"""
+    if not window:
+        return None
+    days = window_range(window, start, end)
+    if days is None:
+        raise HTTPException(
+            status_code=400,
+            detail="Período inválido: use week, month, year ou custom com start e end (AAAA-MM-DD, até 366 dias)"
+        )
+    return days
+
+async def get_windowed_photo_ranking(db, days: tuple, limit: int, size: Optional[str]) -> list:
+    """Photos by average of the public ratings given within the window (daily rollups)"""
+    totals = await windowed_photo_totals(db, *days, limit)
+    photos = await db.photos.find(
+        {"photo_id": {"$in": [t["photo_id"] for t in totals]}, "status": "approved"},
+        PUBLIC_PHOTO_PROJECTION
+    ).to_list(None)
+    by_id = {p["photo_id"]: p for p in photos}
+    
+    ranking = []
+    for t in totals:
+        photo = by_id.get(t["photo_id"])
+        if not photo:
+            continue
+        photo["window_rating"] = round(t["window_rating"], 2)
+        photo["window_votes"] = t["window_votes"]
+        photo["position"] = len(ranking) + 1
+        ranking.append(apply_variant(photo, size))
+    return ranking
+
 @router.get("")
-async def get_ranking(request: Request, limit: int = 20):
-    """Get photo ranking by average rating"""
+async def get_ranking(request: Request, limit: int = 20, size: Optional[str] = "small",
+                      window: Optional[str] = None, start: Optional[str] = None, end: Optional[str] = None):
+    """Get photo ranking by average rating (all-time, or within window=week|month|year|custom)"""
     db = await get_db(request)
+    days = resolve_window(window, start, end)
+    if days:
+        return await get_windowed_photo_ranking(db, days, limit, size)
     
     # Get approved photos with ratings
     photos = await db.photos.find(
         {"status": "approved", "public_rating": {"$gt": 0}},
-        {"_id": 0}
+        PUBLIC_PHOTO_PROJECTION
     ).sort("public_rating", -1).limit(limit).to_list(limit)
     
     # Add position
     for i, photo in enumerate(photos):
         photo["position"] = i + 1
+        apply_variant(photo, size)
     
     return photos
 
 @router.get("/top3")
-async def get_top3(request: Request):
+async def get_top3(request: Request, size: Optional[str] = "medium"):
     """Get TOP 3 photos for podium"""
     db = await get_db(request)
     
@@ -57,62 +99,50 @@ async def get_top3(request: Request):
                 }
             }
         },
-        {"$project": {"_id": 0, "author_data": 0}}
+        {"$project": {"_id": 0, "author_data": 0, **{field: 0 for field in PRIVATE_PHOTO_FIELDS}}}
     ]
     
     photos = await db.photos.aggregate(pipeline).to_list(3)
-    return photos
+    return [apply_variant(photo, size) for photo in photos]
 
 @router.get("/photos")
-async def get_photo_ranking(request: Request, limit: int = 50):
-    """Get photo ranking by rating"""
+async def get_photo_ranking(request: Request, limit: int = 50, size: Optional[str] = "small",
+                            window: Optional[str] = None, start: Optional[str] = None, end: Optional[str] = None):
+    """Get photo ranking by rating (all-time, or within window=week|month|year|custom)"""
     db = await get_db(request)
+    days = resolve_window(window, start, end)
+    if days:
+        return await get_windowed_photo_ranking(db, days, limit, size)
     
     # Get approved photos sorted by rating
     photos = await db.photos.find(
         {"status": "approved"},
-        {"_id": 0}
+        PUBLIC_PHOTO_PROJECTION
     ).sort("public_rating", -1).limit(limit).to_list(limit)
     
     # Add position
     for i, photo in enumerate(photos):
         photo["position"] = i + 1
+        apply_variant(photo, size)
     
     return photos
 
 @router.get("/users")
-async def get_user_ranking(request: Request, limit: int = 20):
-    """Get user ranking by total approved photos and average rating"""
+async def get_user_ranking(request: Request, limit: int = 20,
+                           window: Optional[str] = None, start: Optional[str] = None, end: Optional[str] = None):
+    """
+    Get user ranking by total approved photos and average rating.
+    With window=week|month|year|custom: photos approved and ratings received in that period
+    """
     db = await get_db(request)
+    days = resolve_window(window, start, end)
+    if days:
+        return await get_windowed_user_ranking(db, days, limit)
     
-    # Aggregate user stats with $lookup to get user data in one query
+    # Materialized leaderboard, read in (average_rating, total_photos) index order;
+    # only the returned entries are joined with users
     pipeline = [
-        {"$match": {"status": "approved"}},
-        {
-            "$group": {
-                "_id": "$author_id",
-                "author_name": {"$first": "$author_name"},
-                "total_photos": {"$sum": 1},
-                "total_rating": {"$sum": "$public_rating"},
-                "rated_photos": {
-                    "$sum": {"$cond": [{"$gt": ["$public_rating", 0]}, 1, 0]}
-                }
-            }
-        },
-        {
-            "$project": {
-                "user_id": "$_id",
-                "author_name": 1,
-                "total_photos": 1,
-                "average_rating": {
-                    "$cond": [
-                        {"$gt": ["$rated_photos", 0]},
-                        {"$divide": ["$total_rating", "$rated_photos"]},
-                        0
-                    ]
-                }
-            }
-        },
+        {"$match": {"total_photos": {"$gt": 0}}},
         {"$sort": {"average_rating": -1, "total_photos": -1}},
         {"$limit": limit},
         {
@@ -124,15 +154,19 @@ async def get_user_ranking(request: Request, limit: int = 20):
             }
         },
         {
-            "$addFields": {
+            "$project": {
+                "_id": 0,
+                "user_id": 1,
+                "author_name": {"$ifNull": ["$author_name", DEFAULT_AUTHOR_NAME]},
+                "total_photos": 1,
+                "average_rating": 1,
                 "picture": {"$arrayElemAt": ["$user_data.picture", 0]},
                 "tags": {"$arrayElemAt": ["$user_data.tags", 0]}
             }
-        },
-        {"$project": {"user_data": 0}}
+        }
     ]
     
-    rankings = await db.photos.aggregate(pipeline).to_list(limit)
+    rankings = await db.user_leaderboard.aggregate(pipeline).to_list(limit)
     
     # Add position and round average rating
     for i, entry in enumerate(rankings):
@@ -141,15 +175,34 @@ async def get_user_ranking(request: Request, limit: int = 20):
     
     return rankings
 
+async def get_windowed_user_ranking(db, days: tuple, limit: int) -> list:
+    """Authors by the daily rollups of the window, joined with users for display"""
+    rankings = await windowed_author_totals(db, *days, limit)
+    users = await db.users.find(
+        {"user_id": {"$in": [r["user_id"] for r in rankings]}},
+        {"_id": 0, "user_id": 1, "name": 1, "picture": 1, "tags": 1}
+    ).to_list(None)
+    by_id = {u["user_id"]: u for u in users}
+    
+    for i, entry in enumerate(rankings):
+        user = by_id.get(entry["user_id"], {})
+        entry["author_name"] = user.get("name") or DEFAULT_AUTHOR_NAME
+        entry["picture"] = user.get("picture")
+        entry["tags"] = user.get("tags")
+        entry["position"] = i + 1
+        entry["average_rating"] = round(entry["average_rating"], 2)
+    return rankings
+
 @router.get("/podium")
-async def get_podium_users(request: Request):
-    """Get TOP 3 users for podium"""
-    rankings = await get_user_ranking(request, limit=3)
+async def get_podium_users(request: Request, window: Optional[str] = None,
+                           start: Optional[str] = None, end: Optional[str] = None):
+    """Get TOP 3 users for podium (all-time, or within window=week|month|year|custom)"""
+    rankings = await get_user_ranking(request, limit=3, window=window, start=start, end=end)
     
     return {
         "winners": [
             {
-                "name": r.get("author_name", "Usuário"),
+                "name": r.get("author_name") or DEFAULT_AUTHOR_NAME,
                 "photo": r.get("picture"),
                 "rating": r.get("average_rating", 0),
                 "total_photos": r.get("total_photos", 0),
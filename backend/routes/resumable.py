@@ -0,0 +1,225 @@
+"""
+Resumable (tus-style) photo uploads
+- POST   /photos/uploads                 create a session (metadata + total size)
+- PATCH  /photos/uploads/{id}            append bytes at Upload-Offset
+- HEAD   /photos/uploads/{id}            current Upload-Offset
+- POST   /photos/uploads/{id}/finalize   create the photo (same logic as upload_photo)
+- DELETE /photos/uploads/{id}            abort
+Bytes are appended to a partial file on disk, never held in memory.
+"""
+from fastapi import APIRouter, HTTPException, Request, Response
+from starlette.requests import ClientDisconnect
+from datetime import datetime, timezone, timedelta
+from models import ResumableUploadCreate
+from storage import MAX_PHOTO_SIZE, get_file_extension, resumable_path, open_at_offset, hash_file, discard_upload
+from blob_store import store_blob, take_back_blob_refs
+from image_pipeline import verify_image
+from workers import run_io, run_image
+from upload_quota import reserve_uploads, cancel_uploads
+from routes.photos import get_db, require_interactive_user, check_upload_quota, create_photo
+import uuid
+import logging
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/photos/uploads", tags=["photos"])
+
+TUS_VERSION = "1.0.0"
+UPLOAD_SESSION_HOURS = 24
+PATCH_LOCK_MINUTES = 5  # A crashed PATCH stops blocking the session after this
+
+def upload_headers(session: dict) -> dict:
+    return {
+        "Tus-Resumable": TUS_VERSION,
+        "Upload-Offset": str(session["offset"]),
+        "Upload-Length": str(session["size"]),
+        "Cache-Control": "no-store"
+    }
+
+async def get_session(db, upload_id: str, user_id: str) -> dict:
+    session = await db.upload_sessions.find_one(
+        {"upload_id": upload_id, "user_id": user_id}, {"_id": 0}
+    )
+    if not session:
+        raise HTTPException(status_code=404, detail="Upload não encontrado ou expirado")
+    return session
+
+async def lock_session(db, upload_id: str, user_id: str, query: dict = None) -> dict:
+    """Claim a session for one writer at a time; raises 409 when busy or out of sync"""
+    now = datetime.now(timezone.utc)
+    session = await db.upload_sessions.find_one_and_update(
+        {
+            "upload_id": upload_id,
+            "user_id": user_id,
+            "$or": [{"locked_until": None}, {"locked_until": {"$lt": now}}],
+            **(query or {})
+        },
+        {"$set": {"locked_until": now + timedelta(minutes=PATCH_LOCK_MINUTES)}},
+        projection={"_id": 0}
+    )
+    if not session:
+        current = await get_session(db, upload_id, user_id)
+        raise HTTPException(
+            status_code=409,
+            detail="Upload em andamento ou offset divergente",
+            headers=upload_headers(current)
+        )
+    return session
+
+async def delete_session(db, session: dict):
+    await db.upload_sessions.delete_one({"upload_id": session["upload_id"]})
+    await discard_upload({"tmp_path": resumable_path(session["upload_id"])})
+
+@router.post("", status_code=201)
+async def create_upload(data: ResumableUploadCreate, request: Request, response: Response):
+    """Start a resumable upload. Quota and queue are checked now and reserved on finalize"""
+    user = await require_interactive_user(request)
+    db = await get_db(request)
+
+    if data.size <= 0:
+        raise HTTPException(status_code=400, detail="Arquivo vazio")
+    if data.size > MAX_PHOTO_SIZE:
+        raise HTTPException(status_code=413, detail=f"Arquivo muito grande. Máximo {MAX_PHOTO_SIZE // (1024 * 1024)}MB")
+
+    await check_upload_quota(db, user)
+
+    now = datetime.now(timezone.utc)
+    session = {
+        "upload_id": f"upl_{uuid.uuid4().hex}",
+        "user_id": user["user_id"],
+        "filename": data.filename,
+        "size": data.size,
+        "offset": 0,
+        "metadata": data.dict(exclude={"filename", "size"}),
+        "locked_until": None,
+        "created_at": now,
+        "expires_at": now + timedelta(hours=UPLOAD_SESSION_HOURS)
+    }
+    await db.upload_sessions.insert_one(session)
+
+    response.headers.update(upload_headers(session))
+    response.headers["Location"] = f"{request.url.path}/{session['upload_id']}"
+    return {
+        "upload_id": session["upload_id"],
+        "offset": 0,
+        "size": session["size"],
+        "expires_at": session["expires_at"]
+    }
+
+@router.head("/{upload_id}")
+async def get_upload_offset(upload_id: str, request: Request):
+    """Current offset of a resumable upload"""
+    user = await require_interactive_user(request)
+    db = await get_db(request)
+    session = await get_session(db, upload_id, user["user_id"])
+    return Response(status_code=200, headers=upload_headers(session))
+
+@router.patch("/{upload_id}")
+async def append_upload_chunk(upload_id: str, request: Request):
+    """Append the request body at Upload-Offset. Progress is kept if the client disconnects"""
+    user = await require_interactive_user(request)
+    db = await get_db(request)
+
+    if request.headers.get("content-type", "").split(";")[0].strip() != "application/offset+octet-stream":
+        raise HTTPException(status_code=415, detail="Content-Type deve ser application/offset+octet-stream")
+    offset_header = request.headers.get("upload-offset", "")
+    if not offset_header.isdigit():
+        raise HTTPException(status_code=400, detail="Cabeçalho Upload-Offset inválido")
+
+    offset = int(offset_header)
+    session = await lock_session(db, upload_id, user["user_id"], {"offset": offset})
+
+    new_offset = offset
+    too_large = False
+    f = await run_io(open_at_offset, resumable_path(upload_id), offset)
+    try:
+        async for chunk in request.stream():
+            if new_offset + len(chunk) > session["size"]:
+                too_large = True
+                break
+            await run_io(f.write, chunk)
+            new_offset += len(chunk)
+    except ClientDisconnect:
+        logger.info(f"Upload {upload_id} interrupted at {new_offset}/{session['size']} bytes")
+    finally:
+        await run_io(f.close)
+        await db.upload_sessions.update_one(
+            {"upload_id": upload_id},
+            {"$set": {"offset": new_offset, "locked_until": None}}
+        )
+
+    session["offset"] = new_offset
+    if too_large:
+        raise HTTPException(
+            status_code=413,
+            detail="Dados excedem o tamanho declarado do upload",
+            headers=upload_headers(session)
+        )
+    return Response(status_code=204, headers=upload_headers(session))
+
+@router.post("/{upload_id}/finalize")
+async def finalize_upload(upload_id: str, request: Request):
+    """Turn a completed resumable upload into a photo"""
+    user = await require_interactive_user(request)
+    db = await get_db(request)
+
+    session = await lock_session(db, upload_id, user["user_id"])
+    if session["offset"] != session["size"]:
+        await db.upload_sessions.update_one({"upload_id": upload_id}, {"$set": {"locked_until": None}})
+        raise HTTPException(
+            status_code=409,
+            detail="Upload incompleto",
+            headers=upload_headers(session)
+        )
+
+    try:
+        # Quota and queue position are only reserved now that the file is complete
+        check = await reserve_uploads(db, user)
+    except HTTPException:
+        await db.upload_sessions.update_one({"upload_id": upload_id}, {"$set": {"locked_until": None}})
+        raise
+
+    path = resumable_path(upload_id)
+    try:
+        await run_image(verify_image, path)
+    except Exception:
+        await cancel_uploads(db, user["user_id"], 1, check["queue_class"])
+        await delete_session(db, session)
+        raise HTTPException(status_code=400, detail="Arquivo de imagem inválido")
+
+    stored = None
+    try:
+        staged = {"tmp_path": path, **(await run_io(hash_file, path))}
+        stored = await store_blob(db, staged, get_file_extension(session["filename"]))
+        result = await create_photo(db, user, check, stored, session["metadata"])
+    except BaseException:
+        # Give the reservation back and drop the session (its file was moved or discarded)
+        await cancel_uploads(db, user["user_id"], 1, check["queue_class"])
+        if stored:
+            await take_back_blob_refs(db, stored["url"])
+        await delete_session(db, session)
+        raise
+    await db.upload_sessions.delete_one({"upload_id": upload_id})
+
+    return result
+
+@router.delete("/{upload_id}", status_code=204)
+async def abort_upload(upload_id: str, request: Request):
+    """Abort a resumable upload and remove its partial file"""
+    user = await require_interactive_user(request)
+    db = await get_db(request)
+    session = await get_session(db, upload_id, user["user_id"])
+    await delete_session(db, session)
+    return Response(status_code=204)
+
+async def cleanup_expired_uploads(db) -> int:
+    """Remove sessions (and partial files) that were never finalized"""
+    expired = await db.upload_sessions.find(
+        {"expires_at": {"$lt": datetime.now(timezone.utc)}},
+        {"_id": 0, "upload_id": 1}
+    ).to_list(1000)
+    for session in expired:
+        await delete_session(db, session)
+    if expired:
+        logger.info(f"Removed {len(expired)} expired resumable uploads")
+    return len(expired)
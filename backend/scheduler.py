@@ -3,6 +3,8 @@ Scheduled Tasks for Spotters CXJ
 - Automatic backup every 12 hours
 - Weekly statistics report every Sunday
 - Scheduled news publication every 5 minutes
+- Orphan upload blob cleanup every 6 hours
+- Public rating aggregates, user leaderboard and ranking rollups reconciliation every 24 hours
 """
 import asyncio
 import os
@@ -10,6 +12,8 @@ import shutil
 import uuid
 from datetime import datetime, timezone, timedelta
 from motor.motor_asyncio import AsyncIOMotorClient
+from backup_archive import create_backup_zip, discard_backup
+from workers import run_io
 import logging
 
 logger = logging.getLogger(__name__)
@@ -29,51 +33,6 @@ async def get_db():
     client = AsyncIOMotorClient(MONGO_URL)
     return client[DB_NAME]
 
-async def export_database_to_json(db, dump_dir):
-    """Export all collections to JSON files"""
-    import json
-    collections = await db.list_collection_names()
-    
-    for col_name in collections:
-        documents = await db[col_name].find({}, {"_id": 0}).to_list(10000)
-        json_path = os.path.join(dump_dir, f"{col_name}.json")
-        with open(json_path, 'w', encoding='utf-8') as f:
-            json.dump(documents, f, default=str, ensure_ascii=False, indent=2)
-    
-    return collections
-
-async def create_backup_zip(db):
-    """Create complete backup ZIP file"""
-    import zipfile
-    
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    backup_name = f"spotters_auto_backup_{timestamp}.zip"
-    backup_path = f"/tmp/{backup_name}"
-    dump_dir = f"/tmp/backup_dump_{timestamp}"
-    
-    os.makedirs(dump_dir, exist_ok=True)
-    
-    try:
-        collections = await export_database_to_json(db, dump_dir)
-        
-        with zipfile.ZipFile(backup_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            for col_name in collections:
-                json_path = os.path.join(dump_dir, f"{col_name}.json")
-                if os.path.exists(json_path):
-                    zipf.write(json_path, f"database/{col_name}.json")
-            
-            uploads_dir = "/app/backend/uploads"
-            if os.path.exists(uploads_dir):
-                for root, dirs, files in os.walk(uploads_dir):
-                    for file in files:
-                        file_path = os.path.join(root, file)
-                        arcname = os.path.relpath(file_path, uploads_dir)
-                        zipf.write(file_path, f"uploads/{arcname}")
-        
-        return backup_path, backup_name
-    finally:
-        shutil.rmtree(dump_dir, ignore_errors=True)
-
 def save_backup_locally(backup_path: str, backup_name: str) -> str:
     """Save backup to local directory"""
     os.makedirs(LOCAL_BACKUP_DIR, exist_ok=True)
@@ -150,12 +109,12 @@ async def perform_automatic_backup():
     try:
         logger.info("Starting automatic backup...")
         
-        backup_path, backup_name = await create_backup_zip(db)
+        backup_path, backup_name = await create_backup_zip(db, prefix="spotters_auto_backup")
         logger.info(f"Backup created: {backup_name}")
         
         # Save locally first (always)
         try:
-            local_path = save_backup_locally(backup_path, backup_name)
+            local_path = await run_io(save_backup_locally, backup_path, backup_name)
             local_backup_saved = True
             logger.info(f"Backup saved locally: {local_path}")
         except Exception as e:
@@ -165,7 +124,7 @@ async def perform_automatic_backup():
         # Try Google Drive upload
         try:
             if GOOGLE_DRIVE_FOLDER_ID:
-                drive_file = upload_to_google_drive(backup_path, backup_name)
+                await run_io(upload_to_google_drive, backup_path, backup_name)
                 google_drive_success = True
                 logger.info(f"Backup uploaded to Google Drive")
         except Exception as e:
@@ -231,8 +190,7 @@ async def perform_automatic_backup():
         
         return False
     finally:
-        if backup_path and os.path.exists(backup_path):
-            os.remove(backup_path)
+        await discard_backup(backup_path)
 
 async def collect_weekly_stats():
     """Collect statistics for weekly report"""
@@ -437,13 +395,66 @@ async def news_scheduler():
         
         await asyncio.sleep(NEWS_CHECK_INTERVAL_MINUTES * 60)
 
+# ==================== BLOB GC SCHEDULER ====================
+
+BLOB_GC_INTERVAL_HOURS = 6
+
+async def blob_gc_scheduler():
+    """Storage housekeeping: orphan blobs, expired resumable uploads, perceptual hash backfill"""
+    from blob_store import collect_orphan_blobs
+    from routes.resumable import cleanup_expired_uploads
+    from duplicates import backfill_dhashes
+    logger.info(f"Blob GC scheduler started. Running every {BLOB_GC_INTERVAL_HOURS} hours.")
+    
+    # Wait 5 minutes before first sweep
+    await asyncio.sleep(300)
+    
+    while True:
+        try:
+            db = await get_db()
+            await collect_orphan_blobs(db)
+            await cleanup_expired_uploads(db)
+            while await backfill_dhashes(db):
+                pass
+        except Exception as e:
+            logger.error(f"Blob GC scheduler error: {str(e)}")
+        
+        await asyncio.sleep(BLOB_GC_INTERVAL_HOURS * 60 * 60)
+
+# ==================== RATINGS RECONCILIATION ====================
+
+RATINGS_RECONCILE_INTERVAL_HOURS = 24
+
+async def ratings_reconcile_scheduler():
+    """Rebuild photo public rating aggregates, the user leaderboard and ranking rollups (drift repair)"""
+    from reconcile_ratings import reconcile_public_ratings
+    from leaderboard import rebuild_leaderboard
+    from ranking_rollups import rebuild_rollups
+    logger.info(f"Ratings reconcile scheduler started. Running every {RATINGS_RECONCILE_INTERVAL_HOURS} hours.")
+    
+    # Wait 10 minutes before first run
+    await asyncio.sleep(600)
+    
+    while True:
+        try:
+            db = await get_db()
+            await reconcile_public_ratings(db)
+            await rebuild_leaderboard(db)
+            await rebuild_rollups(db)
+        except Exception as e:
+            logger.error(f"Ratings reconcile scheduler error: {str(e)}")
+        
+        await asyncio.sleep(RATINGS_RECONCILE_INTERVAL_HOURS * 60 * 60)
+
 def start_backup_scheduler():
     """Start all schedulers in background"""
     loop = asyncio.get_event_loop()
     loop.create_task(backup_scheduler())
     loop.create_task(weekly_report_scheduler())
     loop.create_task(news_scheduler())
-    logger.info("Backup, weekly report, and news schedulers created")
+    loop.create_task(blob_gc_scheduler())
+    loop.create_task(ratings_reconcile_scheduler())
+    logger.info("Backup, weekly report, news, blob GC and ratings reconcile schedulers created")
 
 # Function to manually trigger weekly report (for testing)
 async def trigger_weekly_report():
@@ -2,12 +2,13 @@
 Spotters CXJ Backend API
 FastAPI server with MongoDB database
 """
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, Request, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import JSONResponse
 from motor.motor_asyncio import AsyncIOMotorClient
 from contextlib import asynccontextmanager
+from typing import Optional
 import os
 import logging
 
@@ -22,11 +23,21 @@ logger = logging.getLogger(__name__)
 from routes import (
     auth, admin, gallery, leaders, memories, settings, pages,
     photos, evaluation, ranking, news, notifications, members,
-    logs, stats, events, aircraft, timeline, backup, upload
+    logs, stats, events, aircraft, timeline, backup, upload, resumable
 )
 
 # Import scheduler
 from scheduler import start_backup_scheduler
+from workers import shutdown_workers, run_io
+from view_counter import view_counter
+from file_serving import serve_file
+from indexes import ensure_indexes
+from photo_queue import sync_queue
+from routes.evaluation import backfill_evaluation_aggregates
+from leaderboard import ensure_leaderboard
+from ranking_rollups import ensure_rollups
+from storage import UPLOAD_DIR, resolve_upload_path
+from resize_cache import get_resized
 
 # MongoDB URL from environment
 MONGO_URL = os.environ.get("MONGO_URL", "mongodb://localhost:27017")
@@ -65,6 +76,13 @@ async def lifespan(app: FastAPI):
         await client.admin.command("ping")
         logger.info(f"Connected to MongoDB: {DB_NAME}")
         
+        await ensure_indexes(app.state.db)
+        await sync_queue(app.state.db)
+        await backfill_evaluation_aggregates(app.state.db)
+        await ensure_leaderboard(app.state.db)
+        await ensure_rollups(app.state.db)
+        view_counter.start(app.state.db)
+        
         # Start scheduler (without db argument - it creates its own connection)
         start_backup_scheduler()
         logger.info("Background scheduler started")
@@ -77,6 +95,8 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     logger.info("Shutting down...")
+    await view_counter.stop()
+    shutdown_workers()
     if hasattr(app.state, 'mongo_client'):
         app.state.mongo_client.close()
         logger.info("MongoDB connection closed")
@@ -128,8 +148,13 @@ async def cors_handler(request: Request, call_next):
             response.headers["Access-Control-Allow-Headers"] = "Content-Type, Authorization, X-Requested-With, X-Session-ID, Accept, Origin"
             response.headers["Access-Control-Expose-Headers"] = "*"
     
-    # Add cache headers for API responses (no cache by default)
-    if "/api/" in str(request.url):
+    # Add cache headers for API responses (no cache by default).
+    # Served uploads carry their own long-lived caching headers.
+    is_cached_upload = (
+        request.url.path.startswith("/api/uploads/")
+        and response.status_code in (200, 206, 304)
+    )
+    if "/api/" in str(request.url) and not is_cached_upload:
         response.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
         response.headers["Pragma"] = "no-cache"
         response.headers["Expires"] = "0"
@@ -137,8 +162,9 @@ async def cors_handler(request: Request, call_next):
     return response
 
 # ========== MOUNT STATIC FILES ==========
-UPLOAD_DIR = os.path.join(os.path.dirname(__file__), "uploads")
+# Storage root comes from storage.UPLOAD_DIR (configurable via UPLOAD_DIR env var)
 os.makedirs(UPLOAD_DIR, exist_ok=True)
+UPLOAD_REAL_DIR = os.path.realpath(UPLOAD_DIR)
 
 # ========== INCLUDE ALL ROUTERS ==========
 # All routers have prefix="/api" already via their individual prefixes
@@ -152,6 +178,7 @@ app.include_router(memories.router, prefix="/api")
 app.include_router(settings.router, prefix="/api")
 app.include_router(pages.router, prefix="/api")
 app.include_router(photos.router, prefix="/api")
+app.include_router(resumable.router, prefix="/api")
 app.include_router(evaluation.router, prefix="/api")
 app.include_router(ranking.router, prefix="/api")
 app.include_router(news.router, prefix="/api")
@@ -166,19 +193,27 @@ app.include_router(backup.router, prefix="/api")
 app.include_router(upload.router, prefix="/api")
 
 # ========== SERVE UPLOADED FILES ==========
-@app.get("/api/uploads/{filename:path}")
-async def serve_upload(filename: str):
-    """Serve uploaded files with path traversal protection"""
-    from pathlib import Path
-    
-    upload_path = Path(UPLOAD_DIR).resolve()
-    file_path = (upload_path / filename).resolve()
+@app.api_route("/api/uploads/{filename:path}", methods=["GET", "HEAD"])
+async def serve_upload(request: Request, filename: str, w: Optional[int] = None, fmt: Optional[str] = None):
+    """
+    Serve uploaded files with path traversal protection, ETag/304 and Range support.
+    `w` / `fmt` return a resized copy from the on-demand resize cache.
+    """
+    # Path resolution and stat touch the disk: keep them off the event loop
+    file_path = await run_io(resolve_upload_path, filename)
     
-    if not str(file_path).startswith(str(upload_path)):
+    if file_path is None:
         return JSONResponse({"detail": "Invalid path"}, status_code=400)
     
-    if file_path.exists() and file_path.is_file():
-        return FileResponse(file_path)
+    if await run_io(file_path.is_file):
+        if w is not None or fmt is not None:
+            try:
+                file_path = await get_resized(str(file_path), w, fmt)
+            except HTTPException as e:
+                return JSONResponse({"detail": e.detail}, status_code=e.status_code)
+        # Offloaded to the proxy (X-Accel-Redirect/X-Sendfile) or served in-process
+        relative_name = os.path.relpath(await run_io(os.path.realpath, file_path), UPLOAD_REAL_DIR)
+        return await serve_file(request, relative_name, str(file_path))
     return JSONResponse({"detail": "File not found"}, status_code=404)
 
 # ========== ROOT API ENDPOINTS ==========
@@ -212,6 +247,13 @@ async def health_check():
         "version": "2.0.0"
     }
 
+@app.get("/api/health/metrics")
+async def health_metrics():
+    """In-process buffers (per worker)"""
+    return {
+        "view_counter": view_counter.metrics()
+    }
+
 # ========== ERROR HANDLERS ==========
 @app.exception_handler(404)
 async def not_found_handler(request: Request, exc):
@@ -0,0 +1,178 @@
+"""
+Upload storage for Spotters CXJ
+- Streams multipart uploads to a temp file in chunks (no full-file buffering)
+- Enforces the size limit while reading
+- Computes SHA-256 in the same pass
+- Atomically renames the temp file into place
+- Names stored files by content hash (ab/cd/<sha256>.<ext>) so URLs are immutable
+- Single source of truth for the storage root (UPLOAD_DIR env var)
+"""
+import hashlib
+import os
+import re
+import tempfile
+from pathlib import Path
+from typing import Optional
+from fastapi import HTTPException, UploadFile
+from workers import run_io
+
+UPLOAD_DIR = os.environ.get(
+    "UPLOAD_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "uploads")
+)
+UPLOAD_URL_PREFIX = "/api/uploads/"
+CHUNK_SIZE = 1024 * 1024  # 1MB
+MAX_PHOTO_SIZE = 15 * 1024 * 1024  # 15MB
+RESUMABLE_DIR = os.path.join(UPLOAD_DIR, ".resumable")  # Same filesystem, so finalize is a rename
+VARIANT_NAME_RE = re.compile(r"_w\d+\.(webp|jpg)$")  # <stem>_w<width>.<ext> derivatives
+
+def content_filename(sha256: str, ext: str) -> str:
+    """Content-addressed relative filename, e.g. ab/cd/abcd1234....jpg"""
+    return f"{sha256[:2]}/{sha256[2:4]}/{sha256}.{ext}"
+
+def upload_url(filename: str) -> str:
+    """Public URL for a file stored under UPLOAD_DIR"""
+    return f"{UPLOAD_URL_PREFIX}{filename}"
+
+def upload_path_from_url(url: Optional[str]) -> Optional[str]:
+    """Resolve an /api/uploads URL to its path on disk (None for external URLs)"""
+    if not url or not url.startswith(UPLOAD_URL_PREFIX):
+        return None
+    return os.path.join(UPLOAD_DIR, url[len(UPLOAD_URL_PREFIX):])
+
+def resolve_upload_path(filename: str) -> Optional[Path]:
+    """Resolve a relative upload filename, rejecting paths outside UPLOAD_DIR"""
+    upload_path = Path(UPLOAD_DIR).resolve()
+    file_path = (upload_path / filename).resolve()
+    if file_path != upload_path and upload_path not in file_path.parents:
+        return None
+    return file_path
+
+def is_temp_file(filename: str) -> bool:
+    """Partial files written during ingestion/derivative generation"""
+    return filename.startswith(".upload_") or filename.endswith(".part")
+
+def is_variant_file(filename: str) -> bool:
+    """Resized derivatives (<stem>_w<width>.<ext>) stored next to their original"""
+    return bool(VARIANT_NAME_RE.search(filename))
+
+def iter_stored_files():
+    """
+    Yield (absolute path, path relative to UPLOAD_DIR) for every stored file,
+    originals and their variants (photo documents link to both)
+    """
+    if not os.path.exists(UPLOAD_DIR):
+        return
+    for root, dirs, files in os.walk(UPLOAD_DIR):
+        # Hidden directories hold caches (e.g. .resized), not stored uploads
+        dirs[:] = [d for d in dirs if not d.startswith(".")]
+        for file in files:
+            if is_temp_file(file):
+                continue
+            file_path = os.path.join(root, file)
+            yield file_path, os.path.relpath(file_path, UPLOAD_DIR)
+
+def get_file_extension(filename: str, allowed: list = None, default: str = "jpg") -> str:
+    """Extract extension from an uploaded filename, falling back to default"""
+    file_ext = filename.split(".")[-1].lower() if filename and "." in filename else default
+    if allowed is not None and file_ext not in allowed:
+        return default
+    return file_ext
+
+def _open_temp_file(directory: str):
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".upload_", suffix=".part")
+    return os.fdopen(fd, "wb"), tmp_path
+
+def _remove_quietly(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+async def receive_upload(file: UploadFile, max_size: int = MAX_PHOTO_SIZE) -> dict:
+    """
+    Stream an uploaded file to a temp file inside UPLOAD_DIR.
+    Returns {"tmp_path", "size", "sha256"}; the caller must commit or discard it.
+    """
+    tmp_file, tmp_path = await run_io(_open_temp_file, UPLOAD_DIR)
+    digest = hashlib.sha256()
+    size = 0
+
+    try:
+        while True:
+            chunk = await file.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_size:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Arquivo muito grande. Máximo {max_size // (1024 * 1024)}MB"
+                )
+            digest.update(chunk)
+            await run_io(tmp_file.write, chunk)
+
+        await run_io(tmp_file.close)
+    except BaseException:
+        await run_io(tmp_file.close)
+        await run_io(_remove_quietly, tmp_path)
+        raise
+
+    if size == 0:
+        await run_io(_remove_quietly, tmp_path)
+        raise HTTPException(status_code=400, detail="Arquivo vazio")
+
+    return {"tmp_path": tmp_path, "size": size, "sha256": digest.hexdigest()}
+
+def _move_into_place(tmp_path: str, file_path: str):
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    os.replace(tmp_path, file_path)
+
+async def commit_upload(staged: dict, ext: str) -> str:
+    """
+    Atomically move a received upload to its content-addressed location.
+    Sets staged["filename"], staged["path"] and staged["url"]; returns the path.
+    """
+    filename = content_filename(staged["sha256"], ext)
+    file_path = os.path.join(UPLOAD_DIR, filename)
+    await run_io(_move_into_place, staged["tmp_path"], file_path)
+    staged.update({"filename": filename, "path": file_path, "url": upload_url(filename)})
+    return file_path
+
+async def discard_upload(staged: dict):
+    """Remove a received upload that will not be stored"""
+    await run_io(_remove_quietly, staged["tmp_path"])
+
+def resumable_path(upload_id: str) -> str:
+    """Path of the partial file for a resumable upload"""
+    return os.path.join(RESUMABLE_DIR, f"{upload_id}.part")
+
+def open_at_offset(path: str, offset: int):
+    """
+    Open a partial file for appending at offset.
+    Bytes past offset (from an interrupted, unacknowledged write) are discarded.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    f = open(path, "r+b" if os.path.exists(path) else "wb")
+    f.truncate(offset)
+    f.seek(offset)
+    return f
+
+def hash_file(path: str) -> dict:
+    """Size and SHA-256 of a file on disk, read in chunks"""
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            digest.update(chunk)
+    return {"size": size, "sha256": digest.hexdigest()}
+
+async def save_upload(file: UploadFile, ext: str, max_size: int = MAX_PHOTO_SIZE) -> dict:
+    """Receive and store an upload in one step"""
+    staged = await receive_upload(file, max_size)
+    await commit_upload(staged, ext)
+    return staged
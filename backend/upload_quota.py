@@ -0,0 +1,111 @@
+"""
+Atomic upload reservations
+- Weekly quota: conditional find_one_and_update on the user document
+  (photos_this_week / week_start), rolling the week over in the same update
+- Evaluation queue: slots and sequence numbers from photo_queue, capped at
+  MAX_QUEUE_SIZE; slots are released when a photo leaves "pending"
+A reservation is one or two round trips and concurrent uploads can no longer
+share a queue position or overshoot the weekly limit.
+"""
+import logging
+from datetime import datetime, timezone, timedelta
+from fastapi import HTTPException
+from pymongo import ReturnDocument
+
+from photo_queue import MAX_QUEUE_SIZE, NORMAL_CLASS, enqueue, release_queue_slots, get_pending_count
+
+logger = logging.getLogger(__name__)
+
+PHOTOS_PER_WEEK = 5
+QUOTA_WEEK = timedelta(days=7)
+
+def has_unlimited_uploads(user: dict) -> bool:
+    return "colaborador" in user.get("tags", []) or user.get("subscription_type") == "unlimited"
+
+async def reserve_weekly_quota(db, user: dict, count: int = 1) -> int:
+    """
+    Atomically add `count` uploads to the user's week, rolling the week over when
+    it has expired. Returns photos_this_week after the reservation, or None when
+    the weekly limit would be exceeded.
+    """
+    now = datetime.now(timezone.utc)
+    unlimited = has_unlimited_uploads(user)
+    if not unlimited and count > PHOTOS_PER_WEEK:
+        return None
+
+    # Current week still running
+    query = {"user_id": user["user_id"], "week_start": {"$gt": now - QUOTA_WEEK}}
+    if not unlimited:
+        query["photos_this_week"] = {"$lte": PHOTOS_PER_WEEK - count}
+    updated = await db.users.find_one_and_update(
+        query,
+        {"$inc": {"photos_this_week": count}},
+        projection={"_id": 0, "photos_this_week": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    if updated is not None:
+        return updated["photos_this_week"]
+
+    # Week expired (or never started): start a new one with this reservation
+    updated = await db.users.find_one_and_update(
+        {
+            "user_id": user["user_id"],
+            "$or": [{"week_start": {"$lte": now - QUOTA_WEEK}}, {"week_start": None}]
+        },
+        {"$set": {"week_start": now, "photos_this_week": count}},
+        projection={"_id": 0, "photos_this_week": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    return updated["photos_this_week"] if updated is not None else None
+
+async def refund_weekly_quota(db, user_id: str, count: int = 1):
+    if count > 0:
+        await db.users.update_one({"user_id": user_id}, {"$inc": {"photos_this_week": -count}})
+
+async def reserve_uploads(db, user: dict, count: int = 1) -> dict:
+    """
+    Reserve weekly quota and consecutive queue slots for `count` uploads.
+    Raises 403 (not approved / weekly limit) or 429 (queue full).
+    Returns {"pending_count", "queue_class", "first_seq", "first_position",
+    "is_colaborador", "is_unlimited", "photos_this_week"}.
+    """
+    if not user.get("approved", False):
+        raise HTTPException(status_code=403, detail="Usuário não aprovado para upload")
+
+    photos_this_week = await reserve_weekly_quota(db, user, count)
+    if photos_this_week is None:
+        if count == 1:
+            detail = f"Limite semanal de {PHOTOS_PER_WEEK} fotos atingido. Faça upgrade para enviar mais."
+        else:
+            remaining = max(0, PHOTOS_PER_WEEK - user.get("photos_this_week", 0))
+            detail = f"Limite semanal de {PHOTOS_PER_WEEK} fotos. Você ainda pode enviar {remaining} esta semana."
+        raise HTTPException(status_code=403, detail=detail)
+
+    is_colaborador = "colaborador" in user.get("tags", [])
+    slots = await enqueue(db, count, priority=is_colaborador)
+    if slots is None:
+        await refund_weekly_quota(db, user["user_id"], count)
+        from routes.photos import create_notification
+        await create_notification(
+            db, user["user_id"], "queue_full",
+            "⏳ A fila de aprovação está cheia no momento. Tente novamente mais tarde."
+        )
+        if count == 1:
+            raise HTTPException(status_code=429, detail="Fila de aprovação cheia. Tente mais tarde.")
+        available = max(0, MAX_QUEUE_SIZE - await get_pending_count(db))
+        raise HTTPException(
+            status_code=429,
+            detail=f"A fila de aprovação não comporta {count} fotos. Vagas disponíveis: {available}"
+        )
+
+    return {
+        **slots,
+        "is_colaborador": is_colaborador,
+        "is_unlimited": user.get("subscription_type") == "unlimited",
+        "photos_this_week": photos_this_week
+    }
+
+async def cancel_uploads(db, user_id: str, count: int = 1, queue_class: int = NORMAL_CLASS):
+    """Undo a reservation for uploads that were not created"""
+    await refund_weekly_quota(db, user_id, count)
+    await release_queue_slots(db, count, queue_class)
@@ -0,0 +1,114 @@
+"""
+Write-coalescing photo view counter
+- Page views are accumulated per photo_id in process memory
+- A background task flushes them with one unordered bulk_write of $inc
+  every VIEW_FLUSH_SECONDS, or sooner once VIEW_FLUSH_MAX_EVENTS views are buffered
+- The lifespan hook flushes whatever is left on shutdown
+- Views that fail to flush are put back and retried on the next flush
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import Counter
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+VIEW_FLUSH_SECONDS = float(os.environ.get("VIEW_FLUSH_SECONDS", "5"))
+VIEW_FLUSH_MAX_EVENTS = int(os.environ.get("VIEW_FLUSH_MAX_EVENTS", "500"))
+
+class ViewCounter:
+    """Per-process view buffer flushed to photos.views"""
+
+    def __init__(self):
+        self._buffer = Counter()
+        self._events = 0
+        self._db = None
+        self._task = None
+        self._wake = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._stats = {
+            "flushes": 0,
+            "failed_flushes": 0,
+            "views_flushed": 0,
+            "last_flush_ms": None,
+            "max_flush_ms": None,
+            "last_flush_at": None
+        }
+
+    def start(self, db):
+        if self._task is None:
+            self._db = db
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Stop the background task and flush the remaining views"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def record(self, db, photo_id: str):
+        self.start(db)
+        self._buffer[photo_id] += 1
+        self._events += 1
+        if self._events >= VIEW_FLUSH_MAX_EVENTS:
+            self._wake.set()
+
+    def pending(self, photo_id: str) -> int:
+        """Views of a photo not yet written to the database"""
+        return self._buffer.get(photo_id, 0)
+
+    async def flush(self) -> int:
+        """Write buffered views; returns the number of photos updated"""
+        async with self._flush_lock:
+            if not self._buffer or self._db is None:
+                return 0
+            batch, self._buffer = self._buffer, Counter()
+            self._events = 0
+
+            started = time.perf_counter()
+            try:
+                await self._db.photos.bulk_write([
+                    UpdateOne({"photo_id": photo_id}, {"$inc": {"views": count}})
+                    for photo_id, count in batch.items()
+                ], ordered=False)
+            except Exception as e:
+                self._buffer.update(batch)
+                self._events += sum(batch.values())
+                self._stats["failed_flushes"] += 1
+                logger.error(f"View counter flush failed ({len(batch)} photos): {e}")
+                return 0
+
+            elapsed_ms = round((time.perf_counter() - started) * 1000, 2)
+            self._stats["flushes"] += 1
+            self._stats["views_flushed"] += sum(batch.values())
+            self._stats["last_flush_ms"] = elapsed_ms
+            self._stats["max_flush_ms"] = max(self._stats["max_flush_ms"] or 0, elapsed_ms)
+            self._stats["last_flush_at"] = time.time()
+            return len(batch)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=VIEW_FLUSH_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    def metrics(self) -> dict:
+        return {
+            "buffer_photos": len(self._buffer),
+            "buffer_views": sum(self._buffer.values()),
+            "flush_interval_seconds": VIEW_FLUSH_SECONDS,
+            "flush_max_events": VIEW_FLUSH_MAX_EVENTS,
+            **self._stats
+        }
+
+view_counter = ViewCounter()
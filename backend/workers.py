@@ -0,0 +1,52 @@
+"""
+Worker pools for blocking work
+- Bounded thread pool for file I/O (stat, read/write, rename, unlink, directory scans)
+- Process pool for CPU-bound image decoding/encoding
+Keeps slow disks and large images off the event loop without competing with
+the default threadpool used for sync endpoints.
+"""
+import asyncio
+import functools
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional
+
+FILE_IO_WORKERS = int(os.environ.get("FILE_IO_WORKERS", "8"))
+IMAGE_WORKERS = int(os.environ.get("IMAGE_WORKERS", "2"))
+
+_io_pool: Optional[ThreadPoolExecutor] = None
+_image_pool: Optional[ProcessPoolExecutor] = None
+
+def get_io_pool() -> ThreadPoolExecutor:
+    """Get (lazily creating) the shared file I/O thread pool"""
+    global _io_pool
+    if _io_pool is None:
+        _io_pool = ThreadPoolExecutor(max_workers=FILE_IO_WORKERS, thread_name_prefix="file-io")
+    return _io_pool
+
+def get_image_pool() -> ProcessPoolExecutor:
+    """Get (lazily creating) the shared image process pool"""
+    global _image_pool
+    if _image_pool is None:
+        _image_pool = ProcessPoolExecutor(max_workers=IMAGE_WORKERS)
+    return _image_pool
+
+async def run_io(func, *args, **kwargs):
+    """Run a blocking file operation in the I/O thread pool"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_io_pool(), functools.partial(func, *args, **kwargs))
+
+async def run_image(func, *args):
+    """Run a picklable, module-level image function in the process pool"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_image_pool(), func, *args)
+
+def shutdown_workers():
+    """Shut down both pools (called on app shutdown)"""
+    global _io_pool, _image_pool
+    if _image_pool is not None:
+        _image_pool.shutdown(wait=False, cancel_futures=True)
+        _image_pool = None
+    if _io_pool is not None:
+        _io_pool.shutdown(wait=False, cancel_futures=True)
+        _io_pool = None
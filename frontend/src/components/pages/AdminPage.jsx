@@ -149,7 +149,7 @@ export const AdminPage = () => {
       if (results[8].status === 'fulfilled') setAuditLogs(results[8].value.data?.logs || []);
       if (results[9].status === 'fulfilled') setLogStats(results[9].value.data || {});
       if (results[10].status === 'fulfilled') setNews(results[10].value.data || []);
-      if (results[11].status === 'fulfilled') setEvaluationQueue(results[11].value.data || []);
+      if (results[11].status === 'fulfilled') setEvaluationQueue(results[11].value.data?.photos || []);
       if (results[12].status === 'fulfilled') setBackupStatus(results[12].value.data || {});
       if (results[13].status === 'fulfilled') setBackupHistory(results[13].value.data || []);
       if (results[14].status === 'fulfilled') setLocalBackups(results[14].value.data || []);
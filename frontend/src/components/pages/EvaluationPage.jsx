@@ -5,6 +5,7 @@ import { useAuth } from '../../contexts/AuthContext';
 import { evaluationApi, resolveImageUrl } from '../../services/api';
 import { Button } from '../ui/button';
 import { Textarea } from '../ui/textarea';
+import { LazyImage } from '../ui/LazyImage';
 import { toast } from 'sonner';
 
 const HIERARCHY_LEVELS = {
@@ -43,6 +44,7 @@ const criteriaInfo = {
 export const EvaluationPage = () => {
   const { user } = useAuth();
   const [queue, setQueue] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
   const [currentPhoto, setCurrentPhoto] = useState(null);
   const [loading, setLoading] = useState(true);
   const [submitting, setSubmitting] = useState(false);
@@ -72,10 +74,10 @@ export const EvaluationPage = () => {
     try {
       setLoading(true);
       const response = await evaluationApi.getQueue();
-      setQueue(response.data || []);
-      if (response.data?.length > 0) {
-        setCurrentPhoto(response.data[0]);
-      }
+      const photos = response.data?.photos || [];
+      setQueue(photos);
+      setNextCursor(response.data?.next_cursor || null);
+      setCurrentPhoto(photos[0] || null);
     } catch (error) {
       console.error('Error loading queue:', error);
       toast.error('Erro ao carregar fila de avaliação');
@@ -116,6 +118,11 @@ export const EvaluationPage = () => {
       setComment('');
       
       const newQueue = queue.filter(p => p.photo_id !== currentPhoto.photo_id);
+      if (newQueue.length === 0 && nextCursor) {
+        // Page finished: evaluated photos drop out, so reload from the start
+        await loadQueue();
+        return;
+      }
       setQueue(newQueue);
       setCurrentPhoto(newQueue[0] || null);
     } catch (error) {
@@ -191,10 +198,14 @@ export const EvaluationPage = () => {
           <div className="grid lg:grid-cols-2 gap-8">
             {/* Photo Display */}
             <div className="glass-card overflow-hidden">
-              <img
+              <LazyImage
+                key={currentPhoto.photo_id}
                 src={resolveImageUrl(currentPhoto.url)}
                 alt={currentPhoto.title}
-                className="w-full h-96 object-contain bg-black"
+                placeholder={currentPhoto.lqip}
+                placeholderColor="#000"
+                fit="contain"
+                className="w-full h-96"
               />
               <div className="p-6">
                 <h2 className="text-xl font-bold text-white mb-2">{currentPhoto.title}</h2>
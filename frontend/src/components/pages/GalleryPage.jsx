@@ -4,6 +4,7 @@ import { galleryApi, resolveImageUrl } from '../../services/api';
 import { useAuth } from '../../contexts/AuthContext';
 import { Button } from '../ui/button';
 import { Input } from '../ui/input';
+import { LazyImage } from '../ui/LazyImage';
 import { Dialog, DialogContent, DialogHeader, DialogTitle, DialogDescription } from '../ui/dialog';
 import { toast } from 'sonner';
 
@@ -147,6 +148,11 @@ export const GalleryPage = () => {
     return resolveImageUrl(photo?.url);
   };
 
+  // Lista retorna a variante pequena; o modal usa o arquivo original
+  const getFullPhotoUrl = (photo) => {
+    return resolveImageUrl(photo?.original_url || photo?.url);
+  };
+
   return (
     <div className="min-h-screen pt-20">
       {/* Hero Section */}
@@ -241,7 +247,12 @@ export const GalleryPage = () => {
                   className="photo-card cursor-pointer group"
                   onClick={() => setSelectedPhoto(photo)}
                 >
-                  <img src={getPhotoUrl(photo)} alt={photo.description} loading="lazy" />
+                  <LazyImage
+                    src={getPhotoUrl(photo)}
+                    alt={photo.description}
+                    placeholder={photo.lqip}
+                    className="w-full h-full"
+                  />
                   <div className="photo-overlay">
                     <div className="flex items-center gap-2 mb-2">
                       <Plane size={16} className="text-sky-400" />
@@ -273,7 +284,7 @@ export const GalleryPage = () => {
             <>
               <div className="relative aspect-video rounded-lg overflow-hidden mb-6">
                 <img
-                  src={getPhotoUrl(selectedPhoto)}
+                  src={getFullPhotoUrl(selectedPhoto)}
                   alt={selectedPhoto.description}
                   className="w-full h-full object-cover"
                 />
@@ -12,6 +12,8 @@ export const ProfilePage = () => {
   const [profile, setProfile] = useState(null);
   const [photos, setPhotos] = useState([]);
   const [evaluationHistory, setEvaluationHistory] = useState([]);
+  const [historyStats, setHistoryStats] = useState(null);
+  const [historyCursor, setHistoryCursor] = useState(null);
   const [loading, setLoading] = useState(true);
   const [activeTab, setActiveTab] = useState('photos');
 
@@ -45,7 +47,9 @@ export const ProfilePage = () => {
       if (profileRes.data?.tags?.some(t => ['avaliador', 'gestao', 'admin', 'lider'].includes(t))) {
         try {
           const historyRes = await evaluationApi.getEvaluatorHistory(userId);
-          setEvaluationHistory(historyRes.data || []);
+          setEvaluationHistory(historyRes.data?.evaluations || []);
+          setHistoryStats(historyRes.data?.stats || null);
+          setHistoryCursor(historyRes.data?.next_cursor || null);
         } catch (e) {
           console.error('Error loading evaluation history:', e);
           setEvaluationHistory([]);
@@ -58,6 +62,16 @@ export const ProfilePage = () => {
     }
   };
 
+  const loadMoreHistory = async () => {
+    try {
+      const historyRes = await evaluationApi.getEvaluatorHistory(userId, historyCursor);
+      setEvaluationHistory(prev => [...prev, ...(historyRes.data?.evaluations || [])]);
+      setHistoryCursor(historyRes.data?.next_cursor || null);
+    } catch (e) {
+      console.error('Error loading evaluation history:', e);
+    }
+  };
+
   // Get badge info based on tags
   const getBadgeInfo = (tags) => {
     if (tags?.includes('lider')) return { emoji: '👑', title: 'Líder', color: 'from-yellow-500 to-amber-600' };
@@ -184,7 +198,7 @@ export const ProfilePage = () => {
               {isEvaluator && (
                 <div className="glass-card p-4 col-span-2">
                   <CheckCircle className="w-6 h-6 text-green-400 mx-auto mb-2" />
-                  <div className="text-2xl font-bold text-white">{evaluationHistory.length}</div>
+                  <div className="text-2xl font-bold text-white">{historyStats?.total ?? evaluationHistory.length}</div>
                   <div className="text-gray-400 text-sm">Avaliações</div>
                 </div>
               )}
@@ -261,7 +275,7 @@ export const ProfilePage = () => {
           <div className="glass-card p-6">
             <h2 className="text-xl font-bold text-white mb-6 flex items-center gap-2">
               <CheckCircle className="text-green-400" />
-              Histórico de Avaliações ({evaluationHistory.length})
+              Histórico de Avaliações ({historyStats?.total ?? evaluationHistory.length})
             </h2>
 
             {evaluationHistory.length === 0 ? (
@@ -323,6 +337,11 @@ export const ProfilePage = () => {
                     </div>
                   </div>
                 ))}
+                {historyCursor && (
+                  <div className="text-center">
+                    <Button variant="outline" onClick={loadMoreHistory}>Carregar mais</Button>
+                  </div>
+                )}
               </div>
             )}
           </div>
@@ -5,7 +5,8 @@ import React, { useState, useRef, useEffect, memo } from 'react';
  * Features:
  * - Native lazy loading
  * - Intersection Observer fallback
- * - Placeholder blur effect
+ * - Placeholder blur effect (uses the photo's LQIP data URI when provided)
+ * - `fit` picks object-cover (grids) or object-contain (full photo views)
  * - Error handling with fallback
  */
 const LazyImage = memo(({ 
@@ -14,6 +15,8 @@ const LazyImage = memo(({
   className = '', 
   fallback = '/placeholder-image.png',
   placeholderColor = '#1a3a5c',
+  placeholder,
+  fit = 'cover',
   ...props 
 }) => {
   const [isLoaded, setIsLoaded] = useState(false);
@@ -60,8 +63,16 @@ const LazyImage = memo(({
       className={`relative overflow-hidden ${className}`}
       style={{ backgroundColor: placeholderColor }}
     >
-      {/* Placeholder skeleton */}
-      {!isLoaded && (
+      {/* Placeholder: blurred LQIP when available, skeleton otherwise */}
+      {!isLoaded && placeholder && (
+        <img
+          src={placeholder}
+          alt=""
+          aria-hidden="true"
+          className="absolute inset-0 w-full h-full object-cover blur-md scale-110"
+        />
+      )}
+      {!isLoaded && !placeholder && (
         <div className="absolute inset-0 animate-pulse bg-gradient-to-r from-transparent via-white/5 to-transparent" />
       )}
       
@@ -74,7 +85,7 @@ const LazyImage = memo(({
           decoding="async"
           onLoad={handleLoad}
           onError={handleError}
-          className={`w-full h-full object-cover transition-opacity duration-300 ${
+          className={`w-full h-full ${fit === 'contain' ? 'object-contain' : 'object-cover'} transition-opacity duration-300 ${
             isLoaded ? 'opacity-100' : 'opacity-0'
           }`}
           {...props}
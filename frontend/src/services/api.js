@@ -101,6 +101,7 @@ export const photosApi = {
   delete: (photoId) => api.delete(`/photos/${encodeURIComponent(photoId)}`),
   rate: (photoId, rating) => api.post(`/photos/${encodeURIComponent(photoId)}/rate`, { rating }),
   comment: (photoId, content) => api.post(`/photos/${encodeURIComponent(photoId)}/comment`, { content }),
+  getComments: (photoId, cursor) => api.get(`/photos/${encodeURIComponent(photoId)}/comments`, { params: cursor ? { cursor } : {} }),
 };
 
 // ====================== STATS ======================
@@ -110,9 +111,12 @@ export const statsApi = {
 
 // ====================== RANKING ======================
 export const rankingApi = {
-  getPodium: () => api.get(`/ranking/podium`),
-  getUsers: (limit = 50) => api.get(`/ranking/users`, { params: { limit } }),
-  getPhotos: (limit = 50) => api.get(`/ranking/photos`, { params: { limit } }),
+  // window: week | month | year | custom (with { start, end } as YYYY-MM-DD); omit for all-time
+  getPodium: (window, range = {}) => api.get(`/ranking/podium`, { params: { window, ...range } }),
+  getUsers: (limit = 50, window, range = {}) =>
+    api.get(`/ranking/users`, { params: { limit, window, ...range } }),
+  getPhotos: (limit = 50, window, range = {}) =>
+    api.get(`/ranking/photos`, { params: { limit, window, ...range } }),
   getTop3: () => api.get(`/ranking/top3`),
 };
 
@@ -219,10 +223,11 @@ export const logsApi = {
 
 // ====================== EVALUATION ======================
 export const evaluationApi = {
-  getQueue: () => api.get(`/evaluation/queue`),
+  getQueue: (cursor) => api.get(`/evaluation/queue`, { params: cursor ? { cursor } : {} }),
   getPhoto: (photoId) => api.get(`/evaluation/${encodeURIComponent(photoId)}`),
   submitEvaluation: (photoId, data) => api.post(`/evaluation/${encodeURIComponent(photoId)}`, data),
   skip: (photoId) => api.post(`/evaluation/${encodeURIComponent(photoId)}/skip`),
+  getEvaluatorHistory: (evaluatorId, cursor) => api.get(`/evaluation/evaluator/${encodeURIComponent(evaluatorId)}/history`, { params: cursor ? { cursor } : {} }),
 };
 
 // ====================== BACKUP ======================
@@ -0,0 +1,95 @@
+"""
+Resumable upload finalize: a failure after the quota/queue reservation must
+give the reservation back and drop the session.
+Runs against an in-memory MongoDB (mongomock-motor); skipped when it is missing.
+"""
+import asyncio
+import io
+import os
+import sys
+import tempfile
+
+import pytest
+
+os.environ.setdefault("UPLOAD_DIR", tempfile.mkdtemp(prefix="spotters_uploads_"))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+from datetime import datetime, timezone, timedelta
+from fastapi import FastAPI, APIRouter
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from routes import photos, resumable
+
+TOKEN = "finalize-test-token"
+HEADERS = {"Authorization": f"Bearer {TOKEN}"}
+PHOTO_FIELDS = {
+    "title": "Teste", "aircraft_model": "A320", "aircraft_type": "Airbus", "photo_date": "2024-01-01"
+}
+
+def jpeg_bytes() -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 48), (200, 30, 30)).save(buffer, "JPEG")
+    return buffer.getvalue()
+
+@pytest.fixture
+def client_and_db():
+    app = FastAPI()
+    db = mongomock_motor.AsyncMongoMockClient()["spotters_test"]
+    app.state.db = db
+    api = APIRouter(prefix="/api")
+    api.include_router(photos.router)
+    api.include_router(resumable.router)
+    app.include_router(api)
+
+    async def seed():
+        await db.users.insert_one({
+            "user_id": "user_1", "name": "Spotter", "email": "spotter@example.com",
+            "tags": ["spotter_cxj"], "approved": True,
+            "week_start": datetime.now(timezone.utc) - timedelta(days=1), "photos_this_week": 2
+        })
+        await db.user_sessions.insert_one({
+            "session_token": TOKEN, "user_id": "user_1",
+            "expires_at": datetime.now(timezone.utc) + timedelta(days=1)
+        })
+    run(seed())
+    return TestClient(app), db
+
+def run(coroutine):
+    return asyncio.new_event_loop().run_until_complete(coroutine)
+
+def counters(db) -> tuple:
+    user = run(db.users.find_one({"user_id": "user_1"}, {"_id": 0, "photos_this_week": 1}))
+    # The queue sequence only moves forward; the slot counts must come back
+    queue = run(db.counters.find_one({}, {"_id": 0, "pending": 1, "priority_pending": 1}))
+    return user["photos_this_week"], queue
+
+def test_finalize_gives_reservation_back_when_storing_fails(client_and_db, monkeypatch):
+    client, db = client_and_db
+    data = jpeg_bytes()
+
+    created = client.post("/api/photos/uploads", headers=HEADERS,
+                          json={**PHOTO_FIELDS, "filename": "photo.jpg", "size": len(data)})
+    assert created.status_code == 201
+    upload_id = created.json()["upload_id"]
+    appended = client.patch(
+        f"/api/photos/uploads/{upload_id}", content=data,
+        headers={**HEADERS, "Content-Type": "application/offset+octet-stream", "Upload-Offset": "0"}
+    )
+    assert appended.status_code == 204
+
+    before = counters(db)
+
+    async def failing_store_blob(*args, **kwargs):
+        raise OSError("disk full")
+    monkeypatch.setattr(resumable, "store_blob", failing_store_blob)
+
+    with pytest.raises(OSError):
+        client.post(f"/api/photos/uploads/{upload_id}/finalize", headers=HEADERS)
+
+    assert counters(db) == before
+    assert run(db.upload_sessions.count_documents({"upload_id": upload_id})) == 0
+    assert not os.path.exists(resumable.resumable_path(upload_id))
+    assert run(db.photos.count_documents({})) == 0